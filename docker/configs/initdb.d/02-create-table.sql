@@ -8,11 +8,19 @@ CREATE TABLE tb_concepts (
     summary             text,
     status              text,
     data_name           text,
-    source_num          integer,
-    target_num          integer,
+    source_num          integer default 0,
+    target_num          integer default 0,
     create_time         timestamp,
     update_time         timestamp,
-    embedding           vector(4096)
+    embedding           vector(4096),
+    pos_x               real,
+    pos_y               real,
+    -- 전문검색용 (search_tb_concepts_by_text_async), 한국어 형태소 사전이 없으므로 'simple' 설정으로 공백 단위 색인
+    search_tsv          tsvector generated always as (
+                            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+                            setweight(to_tsvector('simple', coalesce(keywords, '')), 'B') ||
+                            setweight(to_tsvector('simple', coalesce(summary, '')), 'C')
+                        ) stored
 );
 
 CREATE TABLE tb_networks (
@@ -27,4 +35,42 @@ CREATE TABLE tb_references (
     description         text
 );
 
+-- 2차원 배치(좌표) 이력, 가장 최근 행으로 새 개념을 배치한다
+-- pos = scale * ((embedding · axis) / |embedding| - offset)
+CREATE TABLE tb_layouts (
+    id                  serial primary key,
+    method              text,
+    axis_x              vector(4096),
+    axis_y              vector(4096),
+    offset_x            real,
+    offset_y            real,
+    scale               real,
+    create_time         timestamp default now()
+);
+
+-- 그래프(개념, 연결) 변경 버전, 읽기 API의 ETag와 응답 캐시 키로 사용한다
+-- 쓰기 트랜잭션을 커밋한 뒤 nextval로 올린다 (행 잠금이 없어 동시에 쓰는 트랜잭션끼리 기다리지 않는다)
+CREATE SEQUENCE tb_graph_version_seq;
+
+-- 웹검색 확장 진행상황, 개념마다 마지막 처리 결과 하나 (processing, succeeded, no_reference, failed)
+CREATE TABLE tb_reference_checkpoints (
+    concept_id          integer primary key,
+    run_id              text,
+    status              text not null,
+    reason              text,
+    attempts            integer default 0,
+    update_time         timestamp default now()
+);
+
+-- 웹검색 응답 캐시 (제공자, 정규화한 검색어)마다 마지막 응답 하나
+CREATE TABLE tb_websearch_cache (
+    provider            text not null,
+    query               text not null,
+    response            jsonb,
+    fetch_time          timestamp default now(),
+    last_hit_time       timestamp default now(),
+    hit_count           integer default 0,
+    primary key (provider, query)
+);
+
 END;
\ No newline at end of file
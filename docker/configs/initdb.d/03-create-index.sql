@@ -0,0 +1,32 @@
+BEGIN;
+
+-- 연결 수 상위 개념 조회 (read_tb_concepts_top_by_source_target_num)
+CREATE INDEX idx_tb_concepts_degree ON tb_concepts ((source_num + target_num) DESC NULLS LAST);
+
+-- 부분그래프 조회 (재귀 CTE 이웃 탐색, 유도 부분그래프)
+CREATE INDEX idx_tb_networks_source ON tb_networks (source_concept_id);
+CREATE INDEX idx_tb_networks_target ON tb_networks (target_concept_id);
+
+-- 배치 좌표 영역 조회 (사각형 선택, 화면 영역 샘플링)
+CREATE INDEX idx_tb_concepts_position ON tb_concepts USING gist (point(pos_x, pos_y));
+
+-- 좌표가 없는 개념 배치 (update_tb_concepts_positions_with_layout), 배치 전에 추가된 개념만 담기므로 작다
+CREATE INDEX idx_tb_concepts_unplaced ON tb_concepts (id) WHERE pos_x IS NULL;
+
+-- 텍스트 의미 검색 (search_tb_concepts_by_embedding_async)
+-- vector(4096)은 HNSW 한도(2000차원)를 넘으므로, 임베딩 모델 차원(SEARCH_INDEX_DIM)만큼 앞부분을 잘라 색인한다
+-- 임베딩은 뒤쪽이 0으로 채워져 있으므로 잘라낸 벡터의 코사인 거리는 원래 벡터와 같다
+-- 조회 쿼리도 같은 표현식으로 정렬해야 인덱스를 탄다
+CREATE INDEX idx_tb_concepts_embedding_hnsw ON tb_concepts
+    USING hnsw ((((embedding::real[])[1:1536])::vector(1536)) vector_cosine_ops);
+
+-- 전문검색 (제목/키워드/개요 tsvector)
+CREATE INDEX idx_tb_concepts_search_tsv ON tb_concepts USING gin (search_tsv);
+
+-- 레퍼런스가 있는 개념 조회 (웹검색 확장 재개시 건너뛸 개념)
+CREATE INDEX idx_tb_references_concept_id ON tb_references (concept_id);
+
+-- 웹검색 캐시 용량 초과시 오래 안 쓴 행부터 지우기 (delete_tb_websearch_cache_overflow)
+CREATE INDEX idx_tb_websearch_cache_last_hit ON tb_websearch_cache (last_hit_time DESC);
+
+END;
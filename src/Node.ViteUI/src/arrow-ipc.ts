@@ -0,0 +1,294 @@
+/*********************************************************************************************
+ *
+ * Arrow IPC stream reader
+ *
+ * /api/networks/snapshot 응답(Arrow IPC 스트림)을 행 객체 목록으로 읽는다
+ * - 서버 스냅샷이 쓰는 형식만 읽는다 : int, float, utf8, list, dictionary(utf8) 컬럼, 압축 없음
+ * - 스키마 > 사전 배치 > 레코드 배치 순서의 메시지(flatbuffers 메타데이터 + 본문)를 차례로 해석한다
+ *
+ *********************************************************************************************/
+
+type Row = Record<string, unknown>;
+
+interface Field {
+  name       :string,
+  typeId     :number,
+  bitWidth   :number, //Int 비트수, 사전 컬럼이면 인덱스 비트수
+  precision  :number, //FloatingPoint 정밀도 (0 half, 1 single, 2 double)
+  dictionary :number | null, //사전 id
+  children   :Field[],
+}
+
+interface RecordBatch {
+  length  :number,
+  nodes   :{length: number, nullCount: number}[],
+  buffers :{offset: number, length: number}[],
+  body    :Uint8Array,
+}
+
+// Schema.fbs Type union
+const TYPE_INT = 2;
+const TYPE_FLOAT = 3;
+const TYPE_UTF8 = 5;
+const TYPE_LIST = 12;
+// Message.fbs MessageHeader union
+const HEADER_SCHEMA = 1;
+const HEADER_DICTIONARY_BATCH = 2;
+const HEADER_RECORD_BATCH = 3;
+
+const CONTINUATION = 0xFFFFFFFF;
+const decoder = new TextDecoder();
+
+/*********************************************************************************************
+ * flatbuffers
+ *********************************************************************************************/
+
+class FlatTable {
+  constructor(private view: DataView, private pos: number) {}
+
+  static root(view: DataView): FlatTable {
+    return new FlatTable(view, view.getUint32(0, true));
+  }
+
+  // 필드가 있으면 테이블 안의 위치, 없으면 0
+  private field(index: number): number {
+    const vtable = this.pos - this.view.getInt32(this.pos, true);
+    if (4 + index * 2 >= this.view.getUint16(vtable, true)) {
+      return 0;
+    }
+    const offset = this.view.getUint16(vtable + 4 + index * 2, true);
+    return offset ? this.pos + offset : 0;
+  }
+
+  private deref(index: number): number {
+    const at = this.field(index);
+    return at ? at + this.view.getUint32(at, true) : 0;
+  }
+
+  uint8(index: number, fallback = 0): number {
+    const at = this.field(index);
+    return at ? this.view.getUint8(at) : fallback;
+  }
+
+  int16(index: number, fallback = 0): number {
+    const at = this.field(index);
+    return at ? this.view.getInt16(at, true) : fallback;
+  }
+
+  int32(index: number, fallback = 0): number {
+    const at = this.field(index);
+    return at ? this.view.getInt32(at, true) : fallback;
+  }
+
+  int64(index: number, fallback = 0): number {
+    const at = this.field(index);
+    return at ? Number(this.view.getBigInt64(at, true)) : fallback;
+  }
+
+  string(index: number): string {
+    const at = this.deref(index);
+    if (!at) {
+      return '';
+    }
+    const length = this.view.getUint32(at, true);
+    return decoder.decode(new Uint8Array(this.view.buffer, this.view.byteOffset + at + 4, length));
+  }
+
+  table(index: number): FlatTable | null {
+    const at = this.deref(index);
+    return at ? new FlatTable(this.view, at) : null;
+  }
+
+  tables(index: number): FlatTable[] {
+    const at = this.deref(index);
+    if (!at) {
+      return [];
+    }
+    const result: FlatTable[] = [];
+    for (let i = 0; i < this.view.getUint32(at, true); i++) {
+      const element = at + 4 + i * 4;
+      result.push(new FlatTable(this.view, element + this.view.getUint32(element, true)));
+    }
+    return result;
+  }
+
+  // 16바이트 구조체(int64 두 개) 벡터
+  int64Pairs(index: number): [number, number][] {
+    const at = this.deref(index);
+    if (!at) {
+      return [];
+    }
+    const result: [number, number][] = [];
+    for (let i = 0; i < this.view.getUint32(at, true); i++) {
+      const element = at + 4 + i * 16;
+      result.push([Number(this.view.getBigInt64(element, true)), Number(this.view.getBigInt64(element + 8, true))]);
+    }
+    return result;
+  }
+}
+
+/*********************************************************************************************
+ * messages
+ *********************************************************************************************/
+
+function readField(table: FlatTable): Field {
+  const type = table.table(3);
+  const dictionary = table.table(4);
+  const indexType = dictionary ? dictionary.table(1) : null;
+  return {
+    name       : table.string(0),
+    typeId     : table.uint8(2),
+    bitWidth   : dictionary ? (indexType ? indexType.int32(0) : 32) : (type ? type.int32(0) : 0),
+    precision  : type ? type.int16(0) : 0,
+    dictionary : dictionary ? dictionary.int64(0) : null,
+    children   : table.tables(5).map(readField),
+  };
+}
+
+function findDictionaryField(fields: Field[], id: number): Field | undefined {
+  for (const field of fields) {
+    const found = field.dictionary === id ? field : findDictionaryField(field.children, id);
+    if (found) {
+      return found;
+    }
+  }
+  return undefined;
+}
+
+function readRecordBatch(table: FlatTable, body: Uint8Array): RecordBatch {
+  if (table.table(3)) {
+    throw new Error('compressed Arrow IPC buffers are not supported');
+  }
+  return {
+    length  : table.int64(0),
+    nodes   : table.int64Pairs(1).map(([length, nullCount]) => ({length, nullCount})),
+    buffers : table.int64Pairs(2).map(([offset, length]) => ({offset, length})),
+    body,
+  };
+}
+
+/*********************************************************************************************
+ * columns
+ *********************************************************************************************/
+
+class ColumnReader {
+  private node = 0;
+  private buffer = 0;
+
+  constructor(private batch: RecordBatch, private dictionaries: Map<number, unknown[]>) {}
+
+  private nextBuffer(): DataView {
+    const {offset, length} = this.batch.buffers[this.buffer++];
+    return new DataView(this.batch.body.buffer, this.batch.body.byteOffset + offset, length);
+  }
+
+  // field의 값 목록 (null 포함), 노드/버퍼는 스키마의 깊이 우선 순서로 소비한다
+  read(field: Field): unknown[] {
+    const {length, nullCount} = this.batch.nodes[this.node++];
+    const validity = this.nextBuffer();
+    const isValid = (i: number) => nullCount === 0 || validity.byteLength === 0 || ((validity.getUint8(i >> 3) >> (i & 7)) & 1) === 1;
+
+    let values: unknown[];
+    if (field.dictionary !== null) {
+      const dictionary = this.dictionaries.get(field.dictionary) ?? [];
+      values = this.readNumbers(this.nextBuffer(), field.bitWidth, length).map(index => dictionary[index]);
+    } else if (field.typeId === TYPE_INT) {
+      values = this.readNumbers(this.nextBuffer(), field.bitWidth, length);
+    } else if (field.typeId === TYPE_FLOAT) {
+      const data = this.nextBuffer();
+      const double = field.precision === 2;
+      values = Array.from({length}, (_, i) => double ? data.getFloat64(i * 8, true) : data.getFloat32(i * 4, true));
+    } else if (field.typeId === TYPE_UTF8) {
+      const offsets = this.nextBuffer();
+      const data = this.nextBuffer();
+      values = Array.from({length}, (_, i) => {
+        const start = offsets.getInt32(i * 4, true);
+        return decoder.decode(new Uint8Array(data.buffer, data.byteOffset + start, offsets.getInt32(i * 4 + 4, true) - start));
+      });
+    } else if (field.typeId === TYPE_LIST) {
+      const offsets = this.nextBuffer();
+      const items = this.read(field.children[0]);
+      values = Array.from({length}, (_, i) => items.slice(offsets.getInt32(i * 4, true), offsets.getInt32(i * 4 + 4, true)));
+    } else {
+      throw new Error(`unsupported Arrow type ${field.typeId} (${field.name})`);
+    }
+    return values.map((value, i) => isValid(i) ? value : null);
+  }
+
+  private readNumbers(data: DataView, bitWidth: number, length: number): number[] {
+    return Array.from({length}, (_, i) => {
+      switch (bitWidth) {
+        case 8:  return data.getInt8(i);
+        case 16: return data.getInt16(i * 2, true);
+        case 64: return Number(data.getBigInt64(i * 8, true));
+        default: return data.getInt32(i * 4, true);
+      }
+    });
+  }
+}
+
+/*********************************************************************************************
+ * stream
+ *********************************************************************************************/
+
+export function readArrowIPCRows(bytes: Uint8Array): Row[] {
+  const stream = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const dictionaries = new Map<number, unknown[]>();
+  const rows: Row[] = [];
+  let fields: Field[] = [];
+  let pos = 0;
+
+  while (pos + 4 <= bytes.byteLength) {
+    // 메시지 : (0xFFFFFFFF) 메타데이터 길이, 메타데이터, 본문, 길이가 0이면 스트림 끝
+    let metadataLength = stream.getUint32(pos, true);
+    pos += 4;
+    if (metadataLength === CONTINUATION) {
+      metadataLength = stream.getUint32(pos, true);
+      pos += 4;
+    }
+    if (metadataLength === 0) {
+      break;
+    }
+    const view = new DataView(bytes.buffer, bytes.byteOffset + pos, metadataLength);
+    pos += metadataLength;
+
+    const message = FlatTable.root(view);
+    const bodyLength = message.int64(3);
+    const body = bytes.subarray(pos, pos + bodyLength);
+    pos += bodyLength;
+
+    const header = message.table(2);
+    if (!header) {
+      continue;
+    }
+    switch (message.uint8(1)) {
+      case HEADER_SCHEMA:
+        fields = header.tables(1).map(readField);
+        break;
+      case HEADER_DICTIONARY_BATCH: {
+        // 사전 컬럼의 Field 타입이 사전 값의 타입이다
+        const id = header.int64(0);
+        const field = findDictionaryField(fields, id);
+        if (!field) {
+          throw new Error(`unknown Arrow dictionary ${id}`);
+        }
+        const values = new ColumnReader(readRecordBatch(header.table(1)!, body), dictionaries).read({...field, dictionary: null});
+        const isDelta = header.uint8(2) === 1;
+        dictionaries.set(id, isDelta ? [...(dictionaries.get(id) ?? []), ...values] : values);
+        break;
+      }
+      case HEADER_RECORD_BATCH: {
+        const batch = readRecordBatch(header, body);
+        const reader = new ColumnReader(batch, dictionaries);
+        const columns = fields.map(field => reader.read(field));
+        for (let i = 0; i < batch.length; i++) {
+          const row: Row = {};
+          fields.forEach((field, j) => { row[field.name] = columns[j][i]; });
+          rows.push(row);
+        }
+        break;
+      }
+    }
+  }
+  return rows;
+}
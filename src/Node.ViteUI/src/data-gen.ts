@@ -1,5 +1,6 @@
 import axios from 'axios';
 import {PCA} from 'ml-pca';
+import {readArrowIPCRows} from './arrow-ipc';
 
 /*********************************************************************************************
  * 
@@ -18,8 +19,9 @@ interface Concept {
   source_num  :number,
   target_num  :number,
   create_time :string,
-  update_time :string,
-  embedding   :string, //split , and cast to number
+  x           :number, //서버에서 투영한 2차원 좌표
+  y           :number,
+  targets     :number[], //source인 연결의 target id 목록
 }
 
 //['#88C6FF', '#FF99D2', '#2748A4'];
@@ -33,19 +35,6 @@ function getRandom(min: number, max: number): number {
   return Math.random() * (max - min) + min;
 }
 
-function reduceVector(vector: number[]) {
-  vector = vector.slice(0, 1536) //openai embedding dimension
-  const projectionMatrix = new Array(vector.length).fill(0).map(() =>
-    [Math.random() * 2 - 1, Math.random() * 2 - 1]
-  );
-  const reduced = [0, 0];
-  for (let i = 0; i < vector.length; i++) {
-    reduced[0] += vector[i] * projectionMatrix[i][0];
-    reduced[1] += vector[i] * projectionMatrix[i][1];
-  }
-  return reduced;
-}
-
 /*********************************************************************************************
  * 
  * fetch, gen data
@@ -53,101 +42,97 @@ function reduceVector(vector: number[]) {
  * 
  *********************************************************************************************/
 
-async function fetchPointPositions() {
+async function fetchGraphSnapshot(): Promise<Concept[]> {
   try {
-    //const concepts_response = await axios.get('http://bws_backend:8112/api/concepts');
-    const concepts_response = await axios.get('http://localhost:8112/api/concepts');
-    if (concepts_response.data.status === 'success') {
-      const concepts: Concept[] = concepts_response.data.data;
-
-      const results = new Float32Array(concepts.length * 2);
-      for (let i = 0; i < concepts.length; i++) {
-        const concept = concepts[i];
-        const embedding_numarray = concept.embedding.split(",").map(parseFloat);
-        const coordinate = reduceVector(embedding_numarray);
-        results[concept.id * 2]     = coordinate[0] * 100 + 200;
-        results[concept.id * 2 + 1] = coordinate[1] * 100 + 200;
-        //console.log(coordinate[0], coordinate[1]);
-      }
-
-      // point
-      pointPositions = results;
-      // color, list
-      pointColors = fetchPointColors();
-      pointSizes  = fetchPointSizes(concepts_response.data.data);
-      // raw data
-      conceptsRawDataList = concepts_response.data.data;
-
-      // labels create
-      pointLabelToIndex = new Map<string, number>();
-      pointIndexToLabel = new Map<number, string>();
-      for (let i = 0; i < concepts.length; i++) {
-        const concept = concepts[i];
-        //pointLabelToIndex.set(`${concept.id}: ${concept.title}` , concept.id);
-        //pointIndexToLabel.set(concept.id, `${concept.id}: ${concept.title}`);
-        pointLabelToIndex.set(`${concept.id}:${concept.category}` , concept.id); // fix here for label text 1/3
-        pointIndexToLabel.set(concept.id, `${concept.id}:${concept.category}`);  // fix here for label text 2/3
-      }
-      // labels display
-      const concepts_sorted_desc = concepts.sort( (a, b) => { if (a.source_num + a.target_num > b.source_num + b.target_num) { return -1; } else if (a.source_num + a.target_num < b.source_num + b.target_num) { return 1; } return 0; });
-      for (let i = 0; i < concepts.length/100; i++) {
-        pointsToShowLabelsFor.push(`${concepts_sorted_desc[i].id}:${concepts_sorted_desc[i].category}`); // fix here for label text 3/3
-      }
-      const concepts_sorted_asc = concepts.sort( (a, b) => { if (a.source_num + a.target_num > b.source_num + b.target_num) { return 1; } else if (a.source_num + a.target_num < b.source_num + b.target_num) { return -1; } return 0; });
-      for (let i = 0; i < concepts.length/100; i++) {
-        pointsToShowLabelsFor.push(`${concepts_sorted_asc[i].id}:${concepts_sorted_asc[i].category}`); // fix here for label text 3/3
-      }
-
-    } else {
-      console.error('Failed to fetch concepts:', concepts_response.data.message);
-      return [];
+    //const snapshot_response = await axios.get('http://bws_backend:8112/api/networks/snapshot', { responseType: 'arraybuffer' });
+    // 노드 속성, 좌표, 연결 목록을 Arrow IPC 스트림 하나로 받는다 (임베딩 문자열 파싱, 브라우저 차원축소 없음)
+    const snapshot_response = await axios.get('http://localhost:8112/api/networks/snapshot', { responseType: 'arraybuffer' });
+    const concepts: Concept[] = [];
+    for (const row of readArrowIPCRows(new Uint8Array(snapshot_response.data))) {
+      const concept = row as unknown as Concept;
+      concept.x = concept.x ?? 0;
+      concept.y = concept.y ?? 0;
+      concept.targets = concept.targets ?? [];
+      concepts.push(concept);
     }
+    return concepts;
   } catch (error) {
-    console.error('Error fetching concepts:', error);
+    console.error('Error fetching graph snapshot:', error);
     return [];
   }
 }
 
-async function fetchLinks(){
-  try {
-    //const networks_response = await axios.get('http://bws_backend:8112/api/networks');
-    const networks_response = await axios.get('http://localhost:8112/api/networks');
-    if (networks_response.data.status === 'success') {
-      const networks = networks_response.data.data;
-      const results = new Float32Array(networks.length * 2);
-      for (let i = 0; i < networks.length; i++) {
-        const network = networks[i];
-        results[i * 2] = network.source_concept_id;
-        results[i * 2 + 1] = network.target_concept_id;
-      }
-
-      // links
-      links = results;
-
-      // link color, width
-      linkColors = fetchLinkColors();
-      linkWidths = fetchLinkWidths();
+function fetchPointPositions(concepts: Concept[]) {
+  const results = new Float32Array(concepts.length * 2);
+  for (let i = 0; i < concepts.length; i++) {
+    const concept = concepts[i];
+    results[concept.id * 2]     = concept.x * 100 + 200;
+    results[concept.id * 2 + 1] = concept.y * 100 + 200;
+  }
+
+  // point
+  pointPositions = results;
+  // color, list
+  pointColors = fetchPointColors();
+  pointSizes  = fetchPointSizes(concepts);
+  // raw data
+  conceptsRawDataList = concepts;
+
+  // labels create
+  pointLabelToIndex = new Map<string, number>();
+  pointIndexToLabel = new Map<number, string>();
+  for (let i = 0; i < concepts.length; i++) {
+    const concept = concepts[i];
+    //pointLabelToIndex.set(`${concept.id}: ${concept.title}` , concept.id);
+    //pointIndexToLabel.set(concept.id, `${concept.id}: ${concept.title}`);
+    pointLabelToIndex.set(`${concept.id}:${concept.category}` , concept.id); // fix here for label text 1/3
+    pointIndexToLabel.set(concept.id, `${concept.id}:${concept.category}`);  // fix here for label text 2/3
+  }
+  // labels display
+  const concepts_sorted_desc = concepts.sort( (a, b) => { if (a.source_num + a.target_num > b.source_num + b.target_num) { return -1; } else if (a.source_num + a.target_num < b.source_num + b.target_num) { return 1; } return 0; });
+  for (let i = 0; i < concepts.length/100; i++) {
+    pointsToShowLabelsFor.push(`${concepts_sorted_desc[i].id}:${concepts_sorted_desc[i].category}`); // fix here for label text 3/3
+  }
+  const concepts_sorted_asc = concepts.sort( (a, b) => { if (a.source_num + a.target_num > b.source_num + b.target_num) { return 1; } else if (a.source_num + a.target_num < b.source_num + b.target_num) { return -1; } return 0; });
+  for (let i = 0; i < concepts.length/100; i++) {
+    pointsToShowLabelsFor.push(`${concepts_sorted_asc[i].id}:${concepts_sorted_asc[i].category}`); // fix here for label text 3/3
+  }
+}
+
+function fetchLinks(concepts: Concept[]){
+  let link_num = 0;
+  for (let i = 0; i < concepts.length; i++) {
+    link_num += concepts[i].targets.length;
+  }
+
+  const results = new Float32Array(link_num * 2);
+  let link_index = 0;
+  for (let i = 0; i < concepts.length; i++) {
+    const source = concepts[i].id;
+    for (const target of concepts[i].targets) {
+      results[link_index * 2]     = source;
+      results[link_index * 2 + 1] = target;
+      link_index++;
 
       // fullyMappedNetwork
-      for(let i=0; i<networks.length; i++){
-        const source_key = `${networks[i].source_concept_id}`; //source->target
-        const source_element = fullyMappedNetwork.get(source_key) ?? new Array<number>();
-        source_element?.push(networks[i].target_concept_id);
-        fullyMappedNetwork.set(source_key, source_element);
-
-        const target_key = `${networks[i].target_concept_id}`; //target->source
-        const target_element = fullyMappedNetwork.get(target_key) ?? new Array<number>();
-        target_element?.push(networks[i].source_concept_id);
-        fullyMappedNetwork.set(target_key, target_element);
-      }
-
-    } else {
-      console.error('Failed to fetch concepts:', networks_response.data.message);
+      const source_key = `${source}`; //source->target
+      const source_element = fullyMappedNetwork.get(source_key) ?? new Array<number>();
+      source_element.push(target);
+      fullyMappedNetwork.set(source_key, source_element);
+
+      const target_key = `${target}`; //target->source
+      const target_element = fullyMappedNetwork.get(target_key) ?? new Array<number>();
+      target_element.push(source);
+      fullyMappedNetwork.set(target_key, target_element);
     }
-  } catch (error) {
-    console.error('Error fetching concepts:', error);
   }
 
+  // links
+  links = results;
+
+  // link color, width
+  linkColors = fetchLinkColors();
+  linkWidths = fetchLinkWidths();
 }
 
 function fetchPointColors(){
@@ -232,8 +217,9 @@ let pointsToShowLabelsFor: string[] = [];
 let fullyMappedNetwork : Map<string, Array<number>> = new Map<string, Array<number>>();
 
 (async () => {
-  await fetchPointPositions();
-  await fetchLinks();
+  const concepts = await fetchGraphSnapshot();
+  fetchLinks(concepts);
+  fetchPointPositions(concepts);
   notifyReady();
 })();
 
@@ -0,0 +1,62 @@
+def connected_components(edges) -> list[list[int]]:
+    """
+    (source, target) 연결 리스트를 무방향 그래프로 보고 연결요소 목록을 반환한다
+    - union-find(경로압축, 크기기준 병합)로 O(E α(N))에 계산한다
+    - 각 연결요소는 노드 id 리스트로 반환한다
+    """
+    parent = {}
+    size = {}
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root: # 경로압축
+            parent[x], x = root, parent[x]
+        return root
+
+    for source, target in edges:
+        for node in (source, target):
+            if node not in parent:
+                parent[node] = node
+                size[node] = 1
+        a, b = find(source), find(target)
+        if a == b:
+            continue
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        size[a] += size[b]
+
+    components = {}
+    for node in parent:
+        components.setdefault(find(node), []).append(node)
+    return list(components.values())
+
+
+def rank_components_by_density(edges) -> list[dict]:
+    """
+    연결요소별 노드 수, 연결 수, 평균차수(2E/V)를 계산하여 평균차수 내림차순으로 반환한다
+    - 노드 2개짜리 요소가 밀도 1.0으로 상위에 오르지 않도록 평균차수를 밀도 지표로 사용한다
+    """
+    edges = list(edges)
+    components = connected_components(edges)
+    component_index = {}
+    for i, nodes in enumerate(components):
+        for node in nodes:
+            component_index[node] = i
+
+    edge_count = [0] * len(components)
+    for source, _ in edges:
+        edge_count[component_index[source]] += 1
+
+    ranked = []
+    for i, nodes in enumerate(components):
+        ranked.append({
+            'nodes': sorted(nodes),
+            'node_count': len(nodes),
+            'edge_count': edge_count[i],
+            'density': 2 * edge_count[i] / len(nodes),
+        })
+    ranked.sort(key=lambda c: (c['density'], c['node_count']), reverse=True)
+    return ranked
@@ -0,0 +1,201 @@
+import time
+import numpy as np
+
+# 블록 단위 유사도 계산시 한 번에 만드는 (행, 후보, 차원) 텐서의 최대 바이트 수
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """
+    행 벡터를 L2 정규화하여 내적이 코사인 유사도가 되도록 한다
+    - 0벡터는 그대로 둔다
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def nn_descent(vectors, k: int = 3, max_iterations: int = 10, sample_rate: float = 0.5,
+               delta: float = 0.001, random_state=None) -> tuple[np.ndarray, np.ndarray, dict]:
+    """
+    NN-descent 방식으로 코사인 유사도 기준 근사 kNN 그래프를 만든다
+
+    - 이웃의 이웃은 이웃일 가능성이 높다는 가정으로, 무작위 초기 그래프를
+      (정방향+역방향) 이웃의 이웃 후보와 비교하며 반복 개선한다
+    - 직전 반복에서 바뀐 연결을 거치는 후보만 표본추출하므로 수렴할수록 반복이 빨라진다
+    - 전체쌍 비교 O(N²) 대신 반복당 O(N·k²·sample_rate)번의 내적만 계산한다
+
+    - param
+        vectors : (N, d) 배열
+        k : 노드별 이웃 수
+        max_iterations : 최대 반복 횟수
+        sample_rate : 반복마다 이웃의 이웃 후보 중 비교할 비율 (높을수록 정확, 느림)
+        delta : 갱신된 이웃 비율이 delta*N*k 미만이면 조기 종료
+        random_state : 난수 시드
+    - return
+        (indices, similarities, stats)
+        - indices : (N, k) 이웃 인덱스, 유사도 내림차순
+        - similarities : (N, k) 코사인 유사도, 이웃이 부족하면 -inf
+        - stats : 반복 횟수, 반복별 갱신 수, 소요시간
+    """
+    begin_time = time.time()
+    matrix = normalize_rows(vectors)
+    n, dim = matrix.shape
+    k = min(k, n - 1)
+    rng = np.random.default_rng(random_state)
+    stats = {'iterations': 0, 'updates': [], 'elapsed_sec': 0.0}
+    if k <= 0:
+        stats['elapsed_sec'] = time.time() - begin_time
+        return np.zeros((n, 0), dtype=np.int64), np.zeros((n, 0), dtype=np.float32), stats
+
+    # 무작위 초기 그래프 (자기 자신 제외)
+    indices = rng.integers(0, n - 1, size=(n, k))
+    indices += indices >= np.arange(n)[:, None]
+    similarities = np.empty((n, k), dtype=np.float32)
+    for rows in _row_blocks(n, k, dim):
+        similarities[rows] = np.matmul(matrix[indices[rows]], matrix[rows][:, :, None])[:, :, 0]
+    indices, similarities = _merge_candidates(np.arange(n), indices, similarities,
+                                              indices[:, :0], similarities[:, :0], k)
+
+    # 직전 반복에서 새로 들어온 이웃만 이웃의 이웃 후보를 만들 때 사용한다 (이미 비교한 쌍은 다시 보지 않음)
+    is_new = np.ones((n, k), dtype=bool)
+    local_size = 2 * k
+    sample_size = max(k, int(round(sample_rate * local_size * k)))
+    for iteration in range(max_iterations):
+        reverse, reverse_new = _reverse_neighbors(indices, is_new, k, rng)
+        updates = 0
+        for rows in _row_blocks(n, local_size + sample_size, dim):
+            # 정방향/역방향 이웃과, 새 연결을 거쳐 닿는 이웃의 이웃 중 일부를 후보로 삼는다
+            local = np.concatenate([indices[rows], reverse[rows]], axis=1)
+            local_new = np.concatenate([is_new[rows], reverse_new[rows]], axis=1) & (local >= 0)
+            local = np.where(local < 0, rows[:, None], local)
+            hop2 = indices[local].reshape(len(rows), local_size * k)
+            hop2_new = (is_new[local] | local_new[:, :, None]).reshape(len(rows), local_size * k)
+
+            block_sample_size = min(sample_size, int(hop2_new.sum(axis=1).max()))
+            if block_sample_size > 0:
+                keys = rng.random(hop2.shape)
+                keys[~hop2_new] = 2.0
+                pick = np.argpartition(keys, block_sample_size - 1, axis=1)[:, :block_sample_size]
+                sampled = np.take_along_axis(hop2, pick, axis=1)
+                sampled = np.where(np.take_along_axis(keys, pick, axis=1) < 2.0, sampled, rows[:, None])
+                candidates = np.concatenate([local, sampled], axis=1)
+            else:
+                candidates = local
+            candidate_sims = np.matmul(matrix[candidates], matrix[rows][:, :, None])[:, :, 0]
+
+            old = indices[rows]
+            new_indices, new_sims = _merge_candidates(rows, old, similarities[rows],
+                                                      candidates, candidate_sims, k)
+            inserted = ~(new_indices[:, :, None] == old[:, None, :]).any(axis=2)
+            updates += int(inserted.sum())
+            indices[rows] = new_indices
+            similarities[rows] = new_sims
+            is_new[rows] = inserted
+
+        stats['iterations'] = iteration + 1
+        stats['updates'].append(updates)
+        if updates < delta * n * k:
+            break
+
+    stats['elapsed_sec'] = time.time() - begin_time
+    return indices, similarities, stats
+
+
+def exact_knn(vectors, rows, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    rows에 해당하는 노드들의 정확한 코사인 kNN을 전체 탐색으로 구한다
+    - 열 방향 블록 단위로 계산하여 메모리를 (len(rows), 블록) 크기로 제한한다
+    """
+    matrix = normalize_rows(vectors)
+    rows = np.asarray(rows)
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    best_indices = np.zeros((len(rows), 0), dtype=np.int64)
+    best_sims = np.zeros((len(rows), 0), dtype=np.float32)
+    block = max(1, BLOCK_BYTES // (4 * max(1, len(rows))))
+    for start in range(0, n, block):
+        columns = np.arange(start, min(n, start + block))
+        sims = matrix[rows] @ matrix[columns].T
+        sims[rows[:, None] == columns[None, :]] = -np.inf
+        all_indices = np.concatenate([best_indices, np.broadcast_to(columns, sims.shape)], axis=1)
+        all_sims = np.concatenate([best_sims, sims], axis=1)
+        top = np.argpartition(-all_sims, k - 1, axis=1)[:, :k]
+        best_indices = np.take_along_axis(all_indices, top, axis=1)
+        best_sims = np.take_along_axis(all_sims, top, axis=1)
+    order = np.argsort(-best_sims, axis=1)
+    return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_sims, order, axis=1)
+
+
+def knn_recall(vectors, approx_indices, sample_size: int = 100, random_state=None) -> dict:
+    """
+    표본 노드에 대해 근사 kNN과 정확한 kNN을 비교하여 재현율을 계산한다
+    """
+    begin_time = time.time()
+    n, k = approx_indices.shape
+    rng = np.random.default_rng(random_state)
+    sample = rng.choice(n, size=min(sample_size, n), replace=False)
+    exact_indices, _ = exact_knn(vectors, sample, k)
+
+    hits = 0
+    for approx_row, exact_row in zip(approx_indices[sample], exact_indices):
+        hits += len(set(approx_row.tolist()) & set(exact_row.tolist()))
+    return {
+        'sample_size': int(len(sample)),
+        'k': int(k),
+        'recall': hits / max(1, len(sample) * k),
+        'elapsed_sec': time.time() - begin_time
+    }
+
+
+def _row_blocks(n: int, width: int, dim: int):
+    """
+    (행, width, dim) float32 텐서가 BLOCK_BYTES를 넘지 않도록 행 인덱스를 나눈다
+    """
+    block = max(1, BLOCK_BYTES // (4 * max(1, width) * max(1, dim)))
+    for start in range(0, n, block):
+        yield np.arange(start, min(n, start + block))
+
+
+def _reverse_neighbors(indices: np.ndarray, is_new: np.ndarray, k: int, rng) -> tuple[np.ndarray, np.ndarray]:
+    """
+    노드별로 자신을 이웃으로 가진 노드를 최대 k개까지 무작위로 고른다 (없으면 -1)
+    - 해당 역방향 연결이 새로 생긴 연결인지도 함께 반환한다
+    """
+    n = indices.shape[0]
+    targets = indices.ravel()
+    sources = np.repeat(np.arange(n), indices.shape[1])
+    flags = is_new.ravel()
+    shuffle = rng.permutation(len(targets))
+    targets, sources, flags = targets[shuffle], sources[shuffle], flags[shuffle]
+    order = np.argsort(targets, kind='stable')
+    targets, sources, flags = targets[order], sources[order], flags[order]
+    rank = np.arange(len(targets)) - np.searchsorted(targets, targets, side='left')
+    keep = rank < k
+
+    reverse = np.full((n, k), -1, dtype=np.int64)
+    reverse_new = np.zeros((n, k), dtype=bool)
+    reverse[targets[keep], rank[keep]] = sources[keep]
+    reverse_new[targets[keep], rank[keep]] = flags[keep]
+    return reverse, reverse_new
+
+
+def _merge_candidates(rows, indices, sims, candidates, candidate_sims, k):
+    """
+    현재 이웃과 후보를 합쳐 자기 자신과 중복을 제거한 뒤 유사도 상위 k개를 남긴다
+    """
+    all_indices = np.concatenate([indices, candidates], axis=1)
+    all_sims = np.concatenate([sims, candidate_sims], axis=1).astype(np.float32)
+    all_sims[all_indices == rows[:, None]] = -np.inf
+
+    order = np.argsort(all_indices, axis=1, kind='stable')
+    all_indices = np.take_along_axis(all_indices, order, axis=1)
+    all_sims = np.take_along_axis(all_sims, order, axis=1)
+    all_sims[:, 1:][all_indices[:, 1:] == all_indices[:, :-1]] = -np.inf
+
+    top = np.argpartition(-all_sims, k - 1, axis=1)[:, :k]
+    top_indices = np.take_along_axis(all_indices, top, axis=1)
+    top_sims = np.take_along_axis(all_sims, top, axis=1)
+    order = np.argsort(-top_sims, axis=1)
+    return np.take_along_axis(top_indices, order, axis=1), np.take_along_axis(top_sims, order, axis=1)
@@ -0,0 +1,101 @@
+import numpy as np
+
+# 시각화 좌표용 기본 난수 시드, 같은 시드면 요청마다 같은 배치가 나온다
+DEFAULT_PROJECTION_SEED = 0
+# 저장된 배치가 없을 때 무작위 투영 좌표에 곱하는 값
+# [-1, 1] 균등분포 축에 단위벡터를 투영하면 분산이 1/3이므로, 배치(tb_layouts)와 같은 표준편차 0.5가 되도록 맞춘다
+RANDOM_PROJECTION_SCALE = 0.5 * 3 ** 0.5
+
+
+def random_projection_axes(dim: int, n_components: int = 2, random_state=DEFAULT_PROJECTION_SEED) -> np.ndarray:
+    """
+    임베딩을 n_components차원으로 줄이는 무작위 투영축을 만든다
+    - 각 축은 [-1, 1] 균등분포 성분을 가지는 (n_components, dim) 배열
+    - 시드를 고정하므로 같은 임베딩은 항상 같은 좌표로 투영된다
+    """
+    rng = np.random.default_rng(random_state)
+    return rng.uniform(-1.0, 1.0, size=(n_components, dim)).astype(np.float32)
+
+
+def to_vector_literal(vector) -> str:
+    """
+    pgvector 파라미터로 넘길 수 있는 '[v1,v2,...]' 문자열로 바꾼다
+    """
+    return '[' + ','.join(map(str, np.asarray(vector, dtype=np.float32).tolist())) + ']'
+
+
+def fit_pca_axes(batches, n_components: int = 2) -> tuple[np.ndarray, np.ndarray]:
+    """
+    행 벡터 배치 이터레이터로 주성분 축을 구한다
+    - 배치마다 합과 XᵀX만 누적하므로 메모리는 행 수와 무관하게 (dim, dim)이다
+    - 각 행은 L2 정규화하여 코사인 유사도 기준의 배치가 되도록 한다
+    - 배치의 폭이 서로 다르면 뒤쪽을 0으로 채운 것으로 본다
+    - return : (mean (dim,), axes (n_components, dim)), dim은 가장 넓은 배치의 폭
+    """
+    count = 0
+    total = None
+    scatter = None
+    for batch in batches:
+        matrix = np.asarray(batch, dtype=np.float64)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+        if total is None:
+            total = np.zeros(0)
+            scatter = np.zeros((0, 0))
+        # 배치마다 폭(0 패딩을 뺀 차원)이 다를 수 있으므로 넓은 쪽에 맞춘다
+        dim = max(len(total), matrix.shape[1])
+        if dim > len(total):
+            total = np.pad(total, (0, dim - len(total)))
+            scatter = np.pad(scatter, ((0, dim - len(scatter)), (0, dim - len(scatter))))
+        if dim > matrix.shape[1]:
+            matrix = np.pad(matrix, ((0, 0), (0, dim - matrix.shape[1])))
+        count += matrix.shape[0]
+        total += matrix.sum(axis=0)
+        scatter += matrix.T @ matrix
+    if count == 0:
+        raise ValueError('no vectors to fit')
+
+    mean = total / count
+    covariance = scatter / count - np.outer(mean, mean)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    order = np.argsort(eigenvalues)[::-1][:n_components]
+    axes = eigenvectors[:, order].T
+    # 부호를 고정하여 같은 데이터면 항상 같은 방향으로 배치한다
+    signs = np.sign(axes[np.arange(len(axes)), np.abs(axes).argmax(axis=1)])
+    signs[signs == 0] = 1.0
+    return mean.astype(np.float32), (axes * signs[:, None]).astype(np.float32)
+
+
+def smooth_by_neighbors(positions: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+                        alpha: float = 0.5, iterations: int = 10) -> np.ndarray:
+    """
+    연결된 이웃의 평균 위치 쪽으로 좌표를 끌어당겨 이웃 관계가 화면에서도 가깝게 보이도록 한다
+    - p ← (1-alpha)·p₀ + alpha·mean(이웃의 p) 를 iterations번 반복한다
+    - 원래 투영 좌표 p₀에 묶어두므로 전체 배치가 한 점으로 수렴하지 않는다
+    - sources, targets : positions 행 인덱스로 된 무방향 연결 목록
+    """
+    base = np.asarray(positions, dtype=np.float64)
+    n = base.shape[0]
+    a = np.concatenate([sources, targets])
+    b = np.concatenate([targets, sources])
+    degree = np.bincount(a, minlength=n).astype(np.float64)
+    has_neighbor = degree > 0
+
+    current = base.copy()
+    for _ in range(iterations):
+        neighbor_sum = np.zeros_like(base)
+        np.add.at(neighbor_sum, a, current[b])
+        neighbor_mean = neighbor_sum[has_neighbor] / degree[has_neighbor, None]
+        current = base.copy()
+        current[has_neighbor] = (1 - alpha) * base[has_neighbor] + alpha * neighbor_mean
+    return current
+
+
+def layout_position_sql(embedding: str, axis: str, offset: str, scale: str) -> str:
+    """
+    배치(tb_layouts)의 투영식 scale * ((embedding · axis) / |embedding| - offset)을 SQL 식으로 만든다
+    - 개념 배치(ConceptsRepository)와 스냅샷의 미배치 개념 좌표(NetworksRepository)가 같은 식을 쓴다
+    - 임베딩이 없거나 0벡터이면 투영값을 0으로 보아 항상 같은 자리(-scale * offset)에 놓는다
+    """
+    return f"{scale} * (coalesce(-({embedding} <#> {axis}) / nullif(vector_norm({embedding}), 0), 0) - {offset})"
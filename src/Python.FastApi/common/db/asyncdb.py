@@ -0,0 +1,62 @@
+import asyncio
+import weakref
+from ..system.constants import Constants
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+class AsyncDB():
+    """
+    sqlalchemy 비동기(asyncpg) DB 세션을 관리하는 클래스
+
+    - 읽기 API를 이벤트 루프에서 바로 처리하여 스레드풀을 점유하지 않도록 한다
+    - 엔진(커넥션 풀)은 처음 세션을 요청할 때 만들며, 풀의 연결은 이벤트 루프에 묶이므로 루프마다 따로 만든다
+    """
+    _instance = None
+
+    def __init__(self):
+        if AsyncDB._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            AsyncDB._instance = self
+            self.sessionmakers = weakref.WeakKeyDictionary()
+        pass
+
+
+    @staticmethod
+    def get_instance():
+        if AsyncDB._instance is None:
+            AsyncDB()
+        return AsyncDB._instance
+
+
+    def get_session(self):
+        """
+        현재 이벤트 루프의 비동기 DB 세션을 반환.
+        """
+        loop = asyncio.get_running_loop()
+        sessionmaker = self.sessionmakers.get(loop)
+        if sessionmaker is None:
+            sessionmaker = self.load_db()
+            self.sessionmakers[loop] = sessionmaker
+        return sessionmaker()
+
+
+    def load_db(self):
+        """
+        설정파일의 DB 접속정보를 asyncpg 드라이버로 바꿔 비동기 세션 생성자를 만든다.
+        """
+        constants = Constants.get_instance()
+
+        engine = create_async_engine(
+            url = make_url(constants.db_connection_string).set(drivername='postgresql+asyncpg'),
+            echo = constants.db_echo_truefalse,
+            pool_size = constants.async_db_pool_size,
+            max_overflow = constants.async_db_max_overflow
+        )
+        print("LOG-DEBUG: async DB session created. (load_db)")
+        return async_sessionmaker(
+            bind=engine,
+            autoflush=False,
+            expire_on_commit=False
+        )
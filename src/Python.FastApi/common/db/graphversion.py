@@ -0,0 +1,48 @@
+import traceback
+from sqlalchemy import text
+from common.db.db import DB
+
+INCREASE_VERSION_SQL = text("SELECT nextval('tb_graph_version_seq')")
+# nextval을 한 번도 부르지 않은 시퀀스는 last_value가 1이므로 0으로 읽는다
+READ_VERSION_SQL = text("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM tb_graph_version_seq")
+
+class GraphVersionRepository():
+    """
+    그래프 버전(tb_graph_version_seq 시퀀스) 관련 함수
+
+    - 개념/연결을 쓰는 트랜잭션을 커밋한 뒤에 버전을 올린다
+      - 새 버전이 보일 때는 바뀐 데이터도 이미 보이므로, 새 버전으로 이전 데이터가 캐시되지 않는다
+      - 커밋과 버전 증가 사이에 읽은 새 데이터는 이전 버전으로 캐시되지만, 곧바로 버전이 올라 버려진다
+    - 한 행을 UPDATE하지 않고 시퀀스를 쓰므로 동시에 쓰는 트랜잭션끼리 행 잠금을 기다리지 않는다
+    """
+    def __init__(self):
+        self.db = DB.get_instance()
+        pass
+
+    def increase_tb_graph_version(self, session):
+        """
+        그래프 버전을 1 올린다
+        - 개념/연결을 쓴 트랜잭션을 커밋한 뒤에 같은 세션으로 호출한다
+        - 실패해도 이미 커밋된 데이터는 그대로 두고 로그만 남긴다 (다음 쓰기에서 버전이 다시 오른다)
+        """
+        try:
+            session.execute(INCREASE_VERSION_SQL)
+            session.commit()
+        except Exception as e:
+            print(f"LOG-ERROR: graph version increase failed - {str(e)}")
+            session.rollback()
+
+    def read_tb_graph_version(self) -> int:
+        """
+        현재 그래프 버전을 읽어온다
+        """
+        session = self.db.get_session()
+        rtndata = 0
+        try:
+            rtndata = session.execute(READ_VERSION_SQL).scalar() or 0
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
@@ -0,0 +1,147 @@
+import json
+import traceback
+from typing import Tuple
+from sqlalchemy import text
+from common.db.db import DB
+
+
+class WebSearchCacheRepository():
+    """
+    tb_websearch_cache 테이블 관련 함수
+
+    - (검색 제공자, 정규화한 검색어)마다 마지막 검색 응답 하나를 보관한다
+    - 만료 여부는 읽는 쪽에서 fetch_time으로 판단한다 (만료된 응답도 재검색 실패시 대신 쓰기 위해 남겨둔다)
+    - 행 수가 상한을 넘으면 가장 오래 안 쓴(last_hit_time) 행부터 지운다
+    """
+    def __init__(self):
+        self.db = DB.get_instance()
+        pass
+
+    def read_tb_websearch_cache(self, provider: str, query: str) -> Tuple[dict, float]:
+        """
+        캐시된 검색 응답과 그 응답의 나이(초)를 읽어온다, 없으면 None
+        - 읽은 행의 hit_count, last_hit_time을 함께 갱신한다
+        """
+        session = self.db.get_session()
+        rtndata = None
+        try:
+            row = session.execute(text("""
+                UPDATE tb_websearch_cache
+                   SET hit_count = hit_count + 1,
+                       last_hit_time = now()
+                 WHERE provider = :provider AND query = :query
+             RETURNING response, extract(epoch FROM now() - fetch_time) AS age_sec
+            """), {'provider': provider, 'query': query}).first()
+            session.commit()
+            if row is not None:
+                rtndata = (row.response, float(row.age_sec))
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    def upsert_tb_websearch_cache(self, provider: str, query: str, response: dict) -> Tuple[int, str]:
+        """
+        검색 응답을 저장한다, 이미 있으면 응답과 fetch_time을 새로 쓴다
+        """
+        rtncd = 900
+        rtnmsg = '실패'
+
+        session = self.db.get_session()
+        try:
+            session.execute(text("""
+                INSERT INTO tb_websearch_cache (provider, query, response, fetch_time, last_hit_time)
+                VALUES (:provider, :query, CAST(:response AS jsonb), now(), now())
+                ON CONFLICT (provider, query)
+                DO UPDATE SET response = EXCLUDED.response,
+                              fetch_time = EXCLUDED.fetch_time,
+                              last_hit_time = EXCLUDED.last_hit_time
+            """), {'provider': provider, 'query': query, 'response': json.dumps(response, ensure_ascii=False)})
+            session.commit()
+            rtncd = 200
+            rtnmsg = '성공'
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+            rtncd = 900
+            rtnmsg = '실패'
+        finally:
+            session.close()
+
+        return rtncd, rtnmsg
+
+    def delete_tb_websearch_cache_overflow(self, max_rows: int) -> int:
+        """
+        가장 최근에 쓴 max_rows개만 남기고 나머지를 지운다
+        - return : 지운 행 수
+        """
+        session = self.db.get_session()
+        rtndata = 0
+        try:
+            result = session.execute(text("""
+                DELETE FROM tb_websearch_cache
+                 WHERE (provider, query) IN (
+                        SELECT provider, query
+                          FROM tb_websearch_cache
+                         ORDER BY last_hit_time DESC
+                        OFFSET :max_rows
+                       )
+            """), {'max_rows': max_rows})
+            session.commit()
+            rtndata = result.rowcount
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+        finally:
+            session.close()
+        return rtndata
+
+    def read_tb_websearch_cache_summary(self) -> dict:
+        """
+        제공자별 행 수와 누적 적중 수를 읽어온다
+        """
+        session = self.db.get_session()
+        rtndata = {}
+        try:
+            result = session.execute(text("""
+                SELECT provider, count(*) AS row_count, coalesce(sum(hit_count), 0) AS hit_count
+                  FROM tb_websearch_cache
+                 GROUP BY provider
+            """))
+            rtndata = {row.provider: {'rows': row.row_count, 'hits': int(row.hit_count)} for row in result}
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    def delete_tb_websearch_cache_all(self) -> Tuple[int, str]:
+        rtncd = 900
+        rtnmsg = '실패'
+
+        session = self.db.get_session()
+        try:
+            session.execute(text("DELETE FROM tb_websearch_cache"))
+            session.commit()
+            rtncd = 200
+            rtnmsg = '성공'
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+            rtncd = 900
+            rtnmsg = '실패'
+        finally:
+            session.close()
+
+        return rtncd, rtnmsg
+
+
+def normalize_search_query(query: str) -> str:
+    """
+    캐시 키로 쓸 검색어, 소문자로 바꾸고 연속된 공백을 하나로 줄인다
+    """
+    return ' '.join(query.lower().split())
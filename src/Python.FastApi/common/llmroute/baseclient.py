@@ -1,3 +1,6 @@
+import asyncio
+import threading
+import weakref
 from abc import ABC, abstractmethod
 from common.models.responseDTO import ResponseDTO
 
@@ -13,18 +16,93 @@ class BaseClient(ABC):
     def embed(self, input: str, options: dict, operation: str) -> ResponseDTO:
         pass
 
-    @abstractmethod
+    async def agenerate(self, prompt: str, options: dict) -> ResponseDTO:
+        """
+        generate의 비동기 버전, 비동기 클라이언트가 없는 구현은 스레드에서 generate를 실행한다
+        """
+        return await asyncio.to_thread(self.generate, prompt, options)
+
+    async def aembed(self, input: str, options: dict, operation: str) -> ResponseDTO:
+        """
+        embed의 비동기 버전, 비동기 클라이언트가 없는 구현은 스레드에서 embed를 실행한다
+        """
+        return await asyncio.to_thread(self.embed, input, options, operation)
+
+    async def agenerate_stream(self, prompt: str, options: dict, on_field: callable = None) -> ResponseDTO:
+        """
+        스트리밍 생성, JSON 최상위 필드가 완성될 때마다 on_field(키, 값)을 부른다
+        - 스트리밍을 지원하지 않는 구현은 전체 생성이 끝난 뒤 필드마다 on_field를 부른다
+        """
+        response = await self.agenerate(prompt, options)
+        if on_field is not None and isinstance(response.data, dict):
+            for key, value in response.data.items():
+                on_field(key, value)
+        return response
+
+    @property
+    def currency_rates(self) -> float:
+        """
+        토큰당 비용의 원화 환율, 토큰당 비용을 원으로 매기는 구현(로컬 모델)은 1
+        """
+        return 1.0
+
+    def get_cost_by_tokens(self, tokens: int) -> float:
+        """
+        토큰 수에 대한 비용 (원), 입력과 출력을 같은 토큰 수로 어림한다
+        - 산식 : 토큰수 * 토큰당비용 * 환율 * 2 (input, output)
+        - 예산 추정(LLMRouter.estimate_cost)과 get_how_much_cost가 같이 쓴다
+        """
+        return tokens * self.get_cost_per_token() * self.currency_rates * 2
+
     def get_how_much_cost(self, text) -> float:
-        pass
+        """
+        text의 토큰 수로 계산한 비용 (원)
+        """
+        return self.get_cost_by_tokens(self.get_token_count(text) or 0)
 
     @abstractmethod
     def get_token_count(self, text) -> int:
         pass
 
+    def get_token_counts(self, texts: list[str]) -> list[int]:
+        """
+        여러 텍스트의 토큰 수, 한 번에 세는 토크나이저가 없는 구현은 하나씩 센다
+        """
+        return [self.get_token_count(text) for text in texts]
+
+    def split_by_tokens(self, text: str, max_tokens: int) -> list[str]:
+        """
+        text를 max_tokens개 토큰씩 나눈다, 토크나이저가 없는 구현은 한 토큰을 두 글자로 어림한다
+        """
+        size = max(1, max_tokens * 2)
+        return [text[i:i+size] for i in range(0, len(text), size)]
+
     @abstractmethod
     def get_cost_per_token(self) -> float:
         pass
 
     @abstractmethod
     def get_chunk_size(self) -> int:
-        pass
\ No newline at end of file
+        pass
+
+
+class LoopLocalClients:
+    """
+    이벤트 루프마다 비동기 API 클라이언트를 하나씩 만들어 재사용한다
+
+    - 비동기 HTTP 클라이언트의 연결 풀은 만든 이벤트 루프에서만 쓸 수 있어 루프별로 따로 둔다
+    - 같은 루프의 모든 요청이 연결 풀 하나를 공유한다 (LLMRouter 루프, FastAPI 루프는 프로세스 내내 유지된다)
+    - 루프가 없어지면 그 루프의 클라이언트도 버린다
+    """
+    def __init__(self, factory: callable):
+        self.factory = factory
+        self.clients = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self.clients.get(loop)
+            if client is None:
+                client = self.clients[loop] = self.factory()
+            return client
@@ -0,0 +1,82 @@
+import datetime
+import threading
+import time
+import numpy as np
+from common.system.constants import Constants
+
+DEFAULT_USD_KRW = 1500.0
+
+
+class ExchangeRate:
+    """
+    원/달러 환율을 백그라운드에서 조회하여 EXCHANGE_RATE_TTL_SEC 동안 보관하는 싱글톤
+
+    - get_usd_krw는 기다리지 않는다, 값이 없거나 만료되었으면 백그라운드 조회를 시작하고 가지고 있는 값을 반환한다
+    - 한 번도 조회하지 못했으면 1500원으로 가정한다
+    - 조회는 동시에 하나만 돈다
+    """
+    _instance = None
+
+    def __init__(self):
+        if ExchangeRate._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            ExchangeRate._instance = self
+            self.ttl_sec = Constants.get_instance().exchange_rate_ttl_sec
+            self.lock = threading.Lock()
+            self.usd_krw = None
+            self.fetch_time = None
+            self.refreshing = False
+
+    @staticmethod
+    def get_instance():
+        if ExchangeRate._instance is None:
+            ExchangeRate()
+        return ExchangeRate._instance
+
+    def get_usd_krw(self) -> float:
+        with self.lock:
+            rate = self.usd_krw
+            expired = self.fetch_time is None or time.monotonic() - self.fetch_time > self.ttl_sec
+        if expired:
+            self.refresh_in_background()
+        return rate if rate is not None else DEFAULT_USD_KRW
+
+    def refresh_in_background(self):
+        """
+        환율 조회 스레드를 띄운다, 이미 조회 중이면 아무것도 하지 않는다
+        """
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.refresh, name='exchange-rate', daemon=True).start()
+
+    def refresh(self):
+        try:
+            rate = fetch_usd_krw()
+            with self.lock:
+                self.usd_krw = rate
+                self.fetch_time = time.monotonic()
+        except Exception:
+            print(f"LOG-ERROR: 환율 조회 실패, {self.usd_krw or DEFAULT_USD_KRW:g}원으로 가정합니다!!")
+            with self.lock:
+                # 실패해도 TTL 동안은 다시 조회하지 않는다 (조회할 때마다 타임아웃을 기다리지 않도록)
+                self.fetch_time = time.monotonic()
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+
+def fetch_usd_krw() -> float:
+    """
+    오늘 최고가 혹은 전날 종가 기준 원/달러 환율
+    """
+    import FinanceDataReader as fdr # 임포트 자체가 느려 조회할 때 불러온다
+    df = fdr.DataReader('USD/KRW')[-7:] # 최근 7일 환율
+    today = datetime.datetime.today().strftime('%Y-%m-%d')
+    if today in df.index: # 오늘 최고가
+        today_row = df.loc[today]
+        return float(today_row['Close'] if np.isnan(today_row['Close']) else today_row['High'])
+    else: # 전날 종가
+        return float(df.iloc[-1]['Close'])
@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+from collections.abc import AsyncIterator
+
+# 스트림 통계의 첫 필드 도착 시간 지수이동평균 가중치
+TTFF_EWMA_ALPHA = 0.2
+
+
+class IncrementalJSONParser:
+    """
+    조각으로 도착하는 JSON 객체를 읽으면서 최상위 필드가 완성되는 대로 꺼내준다
+
+    - feed(text)는 이번 조각으로 완성된 (키, 값) 목록을 반환한다, 값이 객체나 배열이어도 닫히는 순간 한 번에 꺼낸다
+    - 최상위 값이 닫히면 done이 된다
+    - 문자열 안의 따옴표, 중괄호, 쉼표는 구조로 보지 않는다 (이스케이프 포함)
+    - close()는 전체를 json.loads하고, 뒷부분이 깨졌으면 그때까지 완성된 필드만 반환한다 (완성된 필드가 없으면 ValueError)
+    """
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.key_start = None
+        self.key = None
+        self.value_start = None
+        self.is_object = False
+        self.fields = {}
+        self.done = False
+        self.salvaged = False
+
+    def feed(self, text: str) -> list[tuple[str, object]]:
+        self.buffer += text
+        completed = []
+        while self.pos < len(self.buffer) and not self.done:
+            ch = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.depth += 1
+                if self.depth == 1:
+                    self.is_object = ch == '{' # 최상위가 객체가 아니면 필드를 꺼내지 않고 close()에 맡긴다
+                    self.key_start = self.pos + 1
+            elif ch in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete_field(completed)
+                    self.done = True
+            elif self.depth == 1 and self.is_object and ch == ':':
+                self.key = self.buffer[self.key_start:self.pos]
+                self.value_start = self.pos + 1
+            elif self.depth == 1 and self.is_object and ch == ',':
+                self.complete_field(completed)
+                self.key_start = self.pos + 1
+            self.pos += 1
+        return completed
+
+    def complete_field(self, completed: list):
+        """
+        key_start ~ 현재 위치의 '키: 값'을 읽어 fields에 넣는다
+        """
+        if self.key is None:
+            return
+        try:
+            key = json.loads(self.key)
+            value = json.loads(self.buffer[self.value_start:self.pos])
+        except ValueError:
+            return
+        finally:
+            self.key = None
+        self.fields[key] = value
+        completed.append((key, value))
+
+    def close(self) -> dict:
+        try:
+            # 최상위 값이 닫힌 뒤에 붙은 글자는 버린다
+            return json.loads(self.buffer[:self.pos] if self.done else self.buffer)
+        except ValueError:
+            if not self.fields:
+                raise
+            self.salvaged = True
+            return dict(self.fields)
+
+
+class StreamStats:
+    """
+    클라이언트별 스트리밍 생성 통계 (스레드 안전)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {'streams': 0, 'aborted': 0, 'interrupted': 0, 'salvaged': 0, 'tokens': 0, 'ttff_sec_ewma': None}
+
+    def record(self, result: dict):
+        with self.lock:
+            self.stats['streams'] += 1
+            self.stats['tokens'] += result['tokens']
+            self.stats['aborted'] += 1 if result['aborted'] else 0
+            self.stats['interrupted'] += 1 if result['interrupted'] else 0
+            self.stats['salvaged'] += 1 if result['salvaged'] else 0
+            ttff = result['ttff_sec']
+            if ttff is not None:
+                ewma = self.stats['ttff_sec_ewma']
+                self.stats['ttff_sec_ewma'] = ttff if ewma is None else TTFF_EWMA_ALPHA * ttff + (1 - TTFF_EWMA_ALPHA) * ewma
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        if stats['ttff_sec_ewma'] is not None:
+            stats['ttff_sec_ewma'] = round(stats['ttff_sec_ewma'], 4)
+        return stats
+
+
+async def open_stream(stream: AsyncIterator, to_text: callable) -> AsyncIterator[str]:
+    """
+    첫 조각을 받아 요청이 받아들여졌는지 확인한 뒤, 첫 조각부터 텍스트만 꺼내는 스트림을 반환한다
+    - 연결/과부하 오류가 첫 조각을 받을 때 나므로 ProviderGuard로 재시도할 때 여기까지를 감싼다
+    - 반환한 스트림을 닫으면 원래 스트림도 닫는다
+    """
+    iterator = stream.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def texts():
+        try:
+            if first is not None:
+                yield to_text(first)
+            async for item in iterator:
+                yield to_text(item)
+        finally:
+            close = getattr(stream, 'aclose', None) or getattr(stream, 'close', None)
+            if close is not None:
+                await close()
+    return texts()
+
+
+async def read_json_stream(chunks: AsyncIterator[str], on_field: callable = None, max_tokens: int = None, begin_time: float = None) -> dict:
+    """
+    생성 스트림을 읽어 JSON 객체를 만든다
+    - param
+        chunks : AsyncIterator[str] : 생성된 텍스트 조각 (조각 하나를 토큰 하나로 센다)
+        on_field : callable : 최상위 필드가 완성될 때마다 on_field(키, 값)을 부른다 (이벤트 루프에서 부르므로 막지 않아야 한다)
+        max_tokens : int : 이만큼 받고도 끝나지 않으면 스트림을 닫고 그때까지 완성된 필드만 쓴다
+        - 스트림 도중에 연결이 끊기는 등 오류가 나도 완성된 필드가 있으면 그것만 쓴다 (없으면 오류를 그대로 raise)
+        begin_time : float : 첫 필드 도착 시간의 기준 (time.perf_counter, 없으면 지금)
+    - return
+        dict
+        - data : 생성 결과
+        - tokens : 받은 조각 수
+        - ttff_sec : 첫 필드가 완성될 때까지 걸린 시간 (없으면 None)
+        - aborted : max_tokens를 넘어 중단했는지
+        - interrupted : 스트림 도중의 오류로 끊겼는지
+        - salvaged : JSON 전체를 읽지 못해 완성된 필드만 썼는지
+    """
+    parser = IncrementalJSONParser()
+    begin_time = begin_time if begin_time is not None else time.perf_counter()
+    ttff_sec = None
+    tokens = 0
+    aborted = False
+    interrupted = False
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            tokens += 1
+            for key, value in parser.feed(chunk):
+                if ttff_sec is None:
+                    ttff_sec = time.perf_counter() - begin_time
+                if on_field is not None:
+                    on_field(key, value)
+            if parser.done:
+                break
+            if max_tokens is not None and tokens >= max_tokens:
+                aborted = True
+                break
+    except Exception as e:
+        if not parser.fields:
+            raise
+        print(f"LOG-ERROR: stream interrupted after {tokens} tokens, keeping {len(parser.fields)} fields - {str(e)}")
+        interrupted = True
+    finally:
+        # 다 읽지 않고 나오면 연결을 닫아 서버의 생성도 멈춘다
+        close = getattr(chunks, 'aclose', None) or getattr(chunks, 'close', None)
+        if close is not None:
+            await close()
+
+    data = parser.close()
+    return {
+        'data': data,
+        'tokens': tokens,
+        'ttff_sec': ttff_sec,
+        'aborted': aborted,
+        'interrupted': interrupted,
+        'salvaged': parser.salvaged
+    }
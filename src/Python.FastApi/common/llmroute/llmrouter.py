@@ -1,74 +1,319 @@
+import asyncio
+import threading
+import time
 import traceback
+from contextlib import contextmanager
 import ollama
 from common.system.constants import Constants
 from common.llmroute.ollamaclient import OllamaClient
 from common.llmroute.openaiclient import OpenAIClient
+from common.llmroute.exchangerate import ExchangeRate
+
+# 토큰 수를 셀 때 한 번에 읽어 세는 항목(파일) 수
+TOKEN_COUNT_BATCH_SIZE = 32
+# 응답 시간을 재본 적 없는 클라이언트의 예상 응답 시간(초)
+DEFAULT_LATENCY_SEC = 2.0
+# 응답 시간 지수이동평균 가중치
+LATENCY_EWMA_ALPHA = 0.2
+# OpenAI 모델별 지원 기능
+OPENAI_GENERATE_MODELS = ['gpt-4o-mini']
+OPENAI_EMBED_MODELS = ['text-embedding-3-small']
 
 class LLMRouter:
     """
-    요청과 예산을 고려하여 적절한 API 클라이언트 선택
+    요청과 예산을 고려하여 적절한 API 클라이언트 선택 (프로세스 전체에서 하나를 공유하는 싱글톤)
+
+    - 생성시 네트워크 호출을 하지 않는다
+    - Ollama 모델 목록은 클라이언트를 처음 찾을 때 조회하고, LLM_MODEL_REFRESH_SEC가 지나면 다시 조회한다
+    - 모델 정보(ollama.show)와 환율은 각 클라이언트가 처음 필요할 때/백그라운드에서 조회한다
+    - 스레드에서 비동기 클라이언트(agenerate, aembed)를 쓸 수 있도록 LLM 전용 이벤트 루프 스레드를 하나 둔다 (run, submit)
     """
+    _instance = None
 
     def __init__(self):
-        constants = Constants.get_instance()
-        self.clients = {}
+        if LLMRouter._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            LLMRouter._instance = self
+            self.constants = Constants.get_instance()
+            self.lock = threading.Lock()
+            self.clients = {}
+            self.discover_time = None
+
+            # 클라이언트별 부하 (진행중 요청 수, 응답 시간 지수이동평균)
+            self.loads = {}
+            self.loads_lock = threading.Lock()
+
+            # LLM 전용 이벤트 루프, 이 루프의 요청은 클라이언트별 연결 풀 하나를 공유한다
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, daemon=True, name='llm-loop').start()
 
-        # ollama model client spawn
+            # 환율은 첫 비용 계산 전에 받아두도록 바로 백그라운드 조회를 시작한다
+            ExchangeRate.get_instance().refresh_in_background()
+
+    @staticmethod
+    def get_instance():
+        if LLMRouter._instance is None:
+            LLMRouter()
+        return LLMRouter._instance
+
+    def submit(self, coro):
+        """
+        코루틴을 LLM 전용 이벤트 루프에서 실행하고 concurrent.futures.Future를 반환한다 (스레드에서 호출)
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """
+        코루틴을 LLM 전용 이벤트 루프에서 실행하고 결과를 기다린다 (스레드에서 호출)
+        - timeout이 지나면 코루틴을 취소하고 TimeoutError
+        """
+        future = self.submit(coro)
         try:
-            for m in ollama.list().models:
-                model_name = m.model
-                self.clients[model_name] = OllamaClient(
-                    model_name = model_name,
-                    options = {}
-                )
-        except Exception as e:
-            #traceback.print_exc()
-            print("Ollama API Client Spawn Error")
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def discover_clients(self, force: bool = False) -> dict:
+        """
+        모델 목록을 조회하여 클라이언트를 만든다, 조회한지 LLM_MODEL_REFRESH_SEC가 지나지 않았으면 보관한 것을 쓴다
+        - 이미 있는 모델의 클라이언트는 그대로 두어 조회해둔 모델 정보를 다시 조회하지 않는다
+        - 목록에서 사라진 Ollama 모델은 뺀다
+        - 모델 목록 조회(LLM_DISCOVER_TIMEOUT_SEC)는 잠금 밖에서 하고, 결과를 바꿔 끼울 때만 잠근다
+        """
+        with self.lock:
+            if not force and self.discover_time is not None and time.monotonic() - self.discover_time < self.constants.llm_model_refresh_sec:
+                return self.clients
 
-        # openai api client spawn
+        # ollama model list
         try:
-            self.clients['gpt-4o-mini'] = OpenAIClient(
-                model_name = 'gpt-4o-mini',
-                options = {
-                    'api_key' : constants.openai_api_key,
-                    'context_length' : 128000,
-                    'embedding_length' : None,
-                    'cost_per_token' : 0.15/1000000
-                }
-            )
-            self.clients['text-embedding-3-small'] = OpenAIClient(
-                model_name = 'text-embedding-3-small',
-                options = {
-                    'api_key' : constants.openai_api_key,
-                    'context_length' : 8191,
-                    'embedding_length' : 1536,
-                    'cost_per_token' : 0.02/1000000
-                }
-            )
+            model_names = [m.model for m in ollama.Client(timeout=self.constants.llm_discover_timeout_sec).list().models]
         except Exception as e:
             #traceback.print_exc()
-            print("OpenAI API Client Spawn Error")
+            print("Ollama API Client Spawn Error")
+            model_names = None
+
+        with self.lock:
+            clients = dict(self.clients)
+
+            # ollama model client spawn (조회에 실패하면 있던 클라이언트를 그대로 둔다)
+            if model_names is not None:
+                for model_name in [name for name, client in clients.items() if isinstance(client, OllamaClient)]:
+                    if model_name not in model_names:
+                        del clients[model_name]
+                for model_name in model_names:
+                    if model_name not in clients:
+                        clients[model_name] = OllamaClient(
+                            model_name = model_name,
+                            options = {}
+                        )
+
+            # openai api client spawn
+            try:
+                if 'gpt-4o-mini' not in clients:
+                    clients['gpt-4o-mini'] = OpenAIClient(
+                        model_name = 'gpt-4o-mini',
+                        options = {
+                            'api_key' : self.constants.openai_api_key,
+                            'context_length' : 128000,
+                            'embedding_length' : None,
+                            'cost_per_token' : 0.15/1000000
+                        }
+                    )
+                if 'text-embedding-3-small' not in clients:
+                    clients['text-embedding-3-small'] = OpenAIClient(
+                        model_name = 'text-embedding-3-small',
+                        options = {
+                            'api_key' : self.constants.openai_api_key,
+                            'context_length' : 8191,
+                            'embedding_length' : 1536,
+                            'cost_per_token' : 0.02/1000000
+                        }
+                    )
+            except Exception as e:
+                #traceback.print_exc()
+                print("OpenAI API Client Spawn Error")
+
+            # 읽는 쪽이 잠금 없이 쓰도록 새 dict로 바꿔 끼운다
+            self.clients = clients
+            self.discover_time = time.monotonic()
+            return self.clients
 
     def get_client_by_modelname(self, model_name):
         """
         모델 이름에 해당하는 클라이언트 반환
+        - 목록에 없으면 모델이 새로 받아졌을 수 있으므로 한 번 다시 조회한다
         """
-        return self.clients[model_name]
+        clients = self.discover_clients()
+        if model_name not in clients:
+            clients = self.discover_clients(force=True)
+        return clients[model_name]
 
     def get_clients_all(self):
         """
         모든 클라이언트 반환
         """
-        return self.clients
+        return self.discover_clients()
 
-    def get_client_by_budget(self, budget, lazy_list):
+    def get_client_by_budget(self, budget, lazy_list, operation: str = 'generate', required_context: int = 0):
         """
-        TODO: 예산에 맞는 클라이언트 반환
+        예산에 맞는 클라이언트 반환
+        - param
+            budget : float : 남은 예산 (원)
+            lazy_list : list[(경로, 로더)] : 처리할 데이터 목록, 유료 모델을 고를 때 읽어서 모델의 토크나이저로 토큰 수를 센다
+            operation : str : 'generate' or 'embed'
+            required_context : int : 필요한 최소 컨텍스트 길이, 항목을 나누지 않고 한 번에 보내는 호출자는 가장 큰 항목의 토큰 수를 넘긴다 (0이면 확인하지 않음)
+        - 정책
+            - 로컬(Ollama) 모델이 대량 작업을 맡는다, 처리 슬롯(OLLAMA_NUM_PARALLEL)이 남은 모델 중 예상 응답 시간이 가장 짧은 모델
+            - 로컬 모델이 모두 포화되었거나 컨텍스트가 모자라면 예산 안에서 가장 싼 유료 모델
+            - 예산 안의 유료 모델도 없으면 포화되었더라도 가장 덜 붐비는 로컬 모델
+            - 회로가 열린(연달아 실패한) 모델은 쿨다운 동안 고르지 않는다, 모두 열렸으면 그대로 후보로 둔다
         """
-        raise NotImplementedError
+        candidates = skip_circuit_open([client for client in self.get_clients_all().values()
+                                        if supports_operation(client, operation) and fits_context(client, required_context)])
+
+        local = [client for client in candidates if isinstance(client, OllamaClient)]
+        available = [client for client in local if not self.is_saturated(client)]
+        if available:
+            return min(available, key=self.get_expected_latency)
+
+        # 유료 모델은 각자의 토크나이저로 센 토큰 수로 비용을 계산한다 (check_budget과 같은 값)
+        costs = {client: self.estimate_cost(client, count_lazy_list_tokens(client, lazy_list))
+                 for client in candidates if not isinstance(client, OllamaClient)}
+        paid = [client for client, cost in costs.items() if cost <= budget]
+        if paid:
+            return min(paid, key=lambda client: (costs[client], self.get_expected_latency(client)))
+        if local:
+            return min(local, key=self.get_expected_latency)
+        raise Exception(f'no {operation} client fits budget {budget} (costs {[round(cost, 2) for cost in costs.values()]}, context {required_context})')
 
     def get_client_by_category(self, input):
         """
-        TODO: 카테고리에 맞는 클라이언트 반환
+        카테고리에 맞는 클라이언트 반환
+        - 'bulk' : 대량 생성 작업, 예산 제한 없이 get_client_by_budget과 같은 정책 (로컬 우선)
+        - 'interactive' : 사용자가 기다리는 생성 요청, 비용과 관계없이 예상 응답 시간이 가장 짧은 모델
+        - 'embed' : 검색용 임베딩, 저장된 임베딩과 같은 모델(EMBED_MODEL_NAME)
+        """
+        if input == 'embed':
+            return self.get_client_by_modelname(self.constants.embed_model_name)
+        if input == 'bulk':
+            return self.get_client_by_budget(float('inf'), [])
+        if input == 'interactive':
+            candidates = skip_circuit_open([client for client in self.get_clients_all().values() if supports_operation(client, 'generate')])
+            if not candidates:
+                raise Exception('no generate client available')
+            return min(candidates, key=self.get_expected_latency)
+        raise ValueError(f'unknown category: {input}')
+
+    # --------------------------------------------------------------
+    # 부하 추적
+    @contextmanager
+    def track(self, client):
+        """
+        클라이언트 호출을 감싸 진행중 요청 수와 응답 시간을 기록한다
+        - with router.track(client): client.generate(...)
         """
-        raise NotImplementedError
+        load = self.get_load(client)
+        with self.loads_lock:
+            load['inflight'] += 1
+        begin_time = time.perf_counter()
+        try:
+            yield client
+        finally:
+            elapsed = time.perf_counter() - begin_time
+            with self.loads_lock:
+                load['inflight'] -= 1
+                load['calls'] += 1
+                load['latency_ewma'] = elapsed if load['latency_ewma'] is None else \
+                    LATENCY_EWMA_ALPHA * elapsed + (1 - LATENCY_EWMA_ALPHA) * load['latency_ewma']
+
+    def get_load(self, client) -> dict:
+        with self.loads_lock:
+            if client.model_name not in self.loads:
+                self.loads[client.model_name] = {'inflight': 0, 'calls': 0, 'latency_ewma': None}
+            return self.loads[client.model_name]
+
+    def get_loads_all(self) -> dict:
+        with self.loads_lock:
+            return {model_name: dict(load) for model_name, load in self.loads.items()}
+
+    def is_saturated(self, client) -> bool:
+        """
+        Ollama 모델은 진행중 요청이 서버 처리 슬롯(OLLAMA_NUM_PARALLEL)만큼 차면 포화로 본다
+        """
+        if not isinstance(client, OllamaClient):
+            return False
+        return self.get_load(client)['inflight'] >= self.constants.ollama_num_parallel
+
+    def get_expected_latency(self, client) -> float:
+        """
+        예상 응답 시간 = 응답 시간 지수이동평균 * (1 + 진행중 요청 수 / 처리 슬롯 수)
+        """
+        load = self.get_load(client)
+        latency = load['latency_ewma'] if load['latency_ewma'] is not None else DEFAULT_LATENCY_SEC
+        slots = self.constants.ollama_num_parallel if isinstance(client, OllamaClient) else float('inf')
+        return latency * (1 + load['inflight'] / slots)
+
+    def estimate_cost(self, client, tokens: int) -> float:
+        """
+        토큰 수에 대한 비용 (원), 클라이언트의 get_cost_by_tokens (get_how_much_cost와 같은 산식)
+        """
+        return client.get_cost_by_tokens(tokens)
+
+
+def read_lazy_list_batches(lazy_list, batch_size: int = TOKEN_COUNT_BATCH_SIZE):
+    """
+    lazy_list의 항목을 batch_size개씩 읽어 텍스트 목록으로 내준다, 읽지 못한 항목과 빈 항목은 건너뛴다
+    """
+    batch = []
+    for path, loader in lazy_list:
+        try:
+            text = loader()
+        except Exception as e:
+            print(f"LOG-ERROR: error reading {path} - {str(e)}")
+            continue
+        if text:
+            batch.append(text)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def count_lazy_list_tokens(client, lazy_list) -> int:
+    """
+    lazy_list의 전체 토큰 수를 client의 토크나이저(get_token_counts)로 센다
+    - 예산 추정(check_budget), 예산 안의 모델 선택, 남은 예산 차감이 모두 이 값을 쓴다
+    """
+    return sum(sum(client.get_token_counts(batch)) for batch in read_lazy_list_batches(lazy_list))
+
+
+def skip_circuit_open(clients: list) -> list:
+    """
+    회로가 열린 클라이언트를 뺀다, 모두 열렸으면 그대로 반환한다 (호출시 CircuitOpenError로 실패하도록)
+    """
+    available = [client for client in clients if not (hasattr(client, 'guard') and client.guard.breaker.is_open())]
+    return available if available else clients
+
+
+def supports_operation(client, operation: str) -> bool:
+    if isinstance(client, OpenAIClient):
+        return client.model_name in (OPENAI_EMBED_MODELS if operation == 'embed' else OPENAI_GENERATE_MODELS)
+    if isinstance(client, OllamaClient):
+        # Ollama는 모든 모델이 임베딩을 지원하지만 임베딩 전용 모델은 생성에 쓰지 않는다
+        return operation == 'embed' or 'embed' not in client.model_name
+    return False
+
+
+def fits_context(client, required_context: int) -> bool:
+    """
+    모델의 컨텍스트 길이가 required_context 이상인지, 모델 정보를 조회할 수 없으면 False
+    """
+    if not required_context:
+        return True
+    try:
+        return client.context_length >= required_context
+    except Exception:
+        return False
@@ -1,8 +1,16 @@
+import httpx
 import ollama
 import json
-from transformers import AutoTokenizer
-from common.llmroute.baseclient import BaseClient
+import threading
+import time
+from common.llmroute.baseclient import BaseClient, LoopLocalClients
+from common.system.constants import Constants
 from common.models.simpleDTO import SimpleDTO as ResponseDTO
+from common.llmroute.ollamascheduler import OllamaScheduler, DEFAULT_PRIORITY
+from common.llmroute.providerguard import ProviderGuard
+from common.llmroute.singleflight import SingleFlight
+from common.llmroute.jsonstream import StreamStats, open_stream, read_json_stream
+from common.llmroute.tokenizerregistry import TokenizerRegistry, split_by_tokens
 
 class OllamaClient(BaseClient):
     """
@@ -50,21 +58,56 @@ class OllamaClient(BaseClient):
     cost_per_token: float
 
     def __init__(self, model_name: str, options: dict):
-        model_details = ollama.show(model_name).modelinfo
-        architecture = model_details['general.architecture']
-        chunk_size = options['chunk_size'] if 'chunk_size' in options else 2048
-        cost_per_token = options['cost_per_token'] if 'cost_per_token' in options else 0.000
-
         self.model_name = model_name
-        self.mode_architecture = architecture
+        self.options = options
+        self.cost_per_token = options['cost_per_token'] if 'cost_per_token' in options else 0.000
+        self.tokenizer = None # 처음 토큰을 셀 때 TokenizerRegistry에서 받아온다
+
+        # 비동기 클라이언트는 이벤트 루프마다 하나, 연결 풀은 LLM_MAX_CONNECTIONS개까지 (OLLAMA_HOST를 따른다)
+        constants = Constants.get_instance()
+        self.async_clients = LoopLocalClients(lambda: ollama.AsyncClient(
+            timeout = constants.llm_timeout_sec,
+            limits = httpx.Limits(max_connections=constants.llm_max_connections, max_keepalive_connections=constants.llm_max_connections)
+        ))
+
+        # 과부하 재시도와 회로 차단 (로컬 서버라 분당 요청/토큰 제한은 두지 않는다)
+        self.guard = ProviderGuard(f'ollama:{model_name}')
+        # 스트리밍 생성의 첫 필드 도착 시간, 중단/복구 횟수
+        self.stream_stats = StreamStats()
+
+        # 모델 정보(ollama.show)는 처음 필요할 때 조회한다 (생성시 네트워크 호출 없음)
+        self.model_details = None
+        self.model_details_lock = threading.Lock()
+
+    def get_model_details(self) -> dict:
+        """
+        ollama.show로 모델 정보를 조회하고 보관한다
+        """
+        if self.model_details is None:
+            with self.model_details_lock:
+                if self.model_details is None:
+                    self.model_details = ollama.show(self.model_name).modelinfo
+        return self.model_details
 
-        self.context_length = model_details[architecture+'.context_length']
-        self.chunk_size = min(self.context_length, chunk_size)
-        self.embedding_length = model_details[architecture+'.embedding_length']
+    @property
+    def mode_architecture(self) -> str:
+        return self.get_model_details()['general.architecture']
 
-        self.tokenizer_type = model_details['tokenizer.ggml.model']
-        #self.tokenizer_callable = self.load_tokenizer()
-        self.cost_per_token = cost_per_token
+    @property
+    def context_length(self) -> int:
+        return self.get_model_details()[self.mode_architecture+'.context_length']
+
+    @property
+    def chunk_size(self) -> int:
+        return min(self.context_length, self.options['chunk_size'] if 'chunk_size' in self.options else 2048)
+
+    @property
+    def embedding_length(self) -> int:
+        return self.get_model_details()[self.mode_architecture+'.embedding_length']
+
+    @property
+    def tokenizer_type(self) -> str:
+        return self.get_model_details()['tokenizer.ggml.model']
 
 
     def generate(self, prompt: str, options: dict) -> ResponseDTO:
@@ -72,40 +115,83 @@ class OllamaClient(BaseClient):
         프롬프트 입력을 받아 텍스트 생성 결과 반환
         - param
             prompt : str : 프롬프트 텍스트
-            options : dict : 옵션
+            options : dict : 옵션 (options['priority']는 스케줄러 우선순위 'interactive' or 'bulk', 기본값 bulk)
+        - 같은 요청이 진행중이면 새로 호출하지 않고 그 결과를 받는다 (SingleFlight)
         - return
             ResponseDTO : 응답 객체
             - data: json : 생성 결과 (options['format']에 따라 다름)
         """
         try:
-            # refer to https://github.com/ollama/ollama/blob/main/docs/api.md#request-structured-outputs
-            default_format = {
-                "type" : "object",
-                "properties" : {
-                    "text" : {
-                        "type" : "string"
-                    }
-                },
-                "required" : ["text"]
-            }
-            response = ollama.generate(
-                    model = self.model_name, 
-                    prompt = prompt, 
-                    format = options['format'] if 'format' in options else default_format,
-                    stream = False,
-                    options = {k: v for k, v in options.items() if k != 'format'}
-                )
+            request = self.get_generate_request(prompt, options)
+            response = SingleFlight.get_instance().do('generate', request, lambda: self.call_scheduled(options, lambda: ollama.generate(**request)))
+            return ResponseDTO(status=100, message='Success', data=json.loads(response.response))
+        except Exception as e:
+            return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
 
+    async def agenerate(self, prompt: str, options: dict) -> ResponseDTO:
+        """
+        generate의 비동기 버전 (ollama.AsyncClient, 이벤트 루프별 연결 풀 재사용)
+        - 처리 슬롯은 스레드를 막지 않고 이벤트 루프에서 기다린다
+        - 요청 중에 취소되면 HTTP 요청도 함께 취소되고 슬롯을 반납한다 (같은 요청을 기다리는 다른 호출이 없을 때)
+        """
+        try:
+            request = self.get_generate_request(prompt, options)
+            response = await SingleFlight.get_instance().do_async('generate', request,
+                lambda: self.call_scheduled_async(options, lambda: self.async_clients.get().generate(**request)))
             return ResponseDTO(status=100, message='Success', data=json.loads(response.response))
         except Exception as e:
             return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
 
+    async def agenerate_stream(self, prompt: str, options: dict, on_field: callable = None) -> ResponseDTO:
+        """
+        생성 결과를 스트림으로 받으며 JSON 최상위 필드가 완성될 때마다 on_field(키, 값)을 부른다
+        - options['max_stream_tokens'] : 이만큼 생성하고도 끝나지 않으면 연결을 끊어 생성을 멈추고, 그때까지 완성된 필드만 반환한다 (기본값 LLM_STREAM_MAX_TOKENS)
+        - 뒷부분 JSON이 깨져도 완성된 필드는 살린다
+        - 호출마다 콜백이 달라 SingleFlight로 합치지 않는다, 처리 슬롯은 스트림을 다 읽을 때까지 쥐고 있다
+        - 첫 필드 도착 시간, 중단/복구 횟수는 stream_stats에 남는다
+        """
+        begin_time = time.perf_counter()
+        try:
+            request = self.get_generate_request(prompt, options)
+            request['stream'] = True
+            max_tokens = options['max_stream_tokens'] if 'max_stream_tokens' in options else Constants.get_instance().llm_stream_max_tokens
+            priority = options['priority'] if 'priority' in options else DEFAULT_PRIORITY
+            async with OllamaScheduler.get_instance().slot_async(self.model_name, priority):
+                chunks = await self.guard.call_async(lambda: self.open_generate_stream(request))
+                result = await read_json_stream(chunks, on_field, max_tokens, begin_time)
+            self.stream_stats.record(result)
+            return ResponseDTO(status=100, message='Success' if not result['salvaged'] else 'Success - partial', data=result['data'])
+        except Exception as e:
+            return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
+
+    async def open_generate_stream(self, request: dict):
+        return await open_stream(await self.async_clients.get().generate(**request), lambda part: part.response)
+
+    def get_generate_request(self, prompt: str, options: dict) -> dict:
+        # refer to https://github.com/ollama/ollama/blob/main/docs/api.md#request-structured-outputs
+        default_format = {
+            "type" : "object",
+            "properties" : {
+                "text" : {
+                    "type" : "string"
+                }
+            },
+            "required" : ["text"]
+        }
+        return {
+            'model' : self.model_name,
+            'prompt' : prompt,
+            'format' : options['format'] if 'format' in options else default_format,
+            'stream' : False,
+            'options' : {k: v for k, v in options.items() if k not in ('format', 'priority', 'max_stream_tokens')}
+        }
+
     def embed(self, input, options: dict, operation: str) -> ResponseDTO:
         """
         텍스트 입력을 받아 임베딩 결과 반환
         - param
             input : str : 입력 텍스트
-            options : dict : 옵션
+            options : dict : 옵션 (options['priority']는 스케줄러 우선순위)
             type : str : 'batch' or 'single'
         - return
             ResponseDTO : 응답 객체
@@ -114,11 +200,24 @@ class OllamaClient(BaseClient):
               - 그외 -> list[float]
         """
         try:
-            response = ollama.embed(
-                    model = self.model_name, 
-                    input = input, 
-                    options = options
-                )
+            request = self.get_embed_request(input, options)
+            response = SingleFlight.get_instance().do('embed', request, lambda: self.call_scheduled(options, lambda: ollama.embed(**request)))
+
+            if (operation is not None) and (operation == 'batch'):
+                return ResponseDTO(status=100, message='Success', data=response.embeddings)
+            else:
+                return ResponseDTO(status=100, message='Success', data=response.embeddings[0])
+        except Exception as e:
+            return ResponseDTO(900, f"Internal Server Error - {str(e)}", None)
+
+    async def aembed(self, input, options: dict, operation: str) -> ResponseDTO:
+        """
+        embed의 비동기 버전 (ollama.AsyncClient, 이벤트 루프별 연결 풀 재사용)
+        """
+        try:
+            request = self.get_embed_request(input, options)
+            response = await SingleFlight.get_instance().do_async('embed', request,
+                lambda: self.call_scheduled_async(options, lambda: self.async_clients.get().embed(**request)))
 
             if (operation is not None) and (operation == 'batch'):
                 return ResponseDTO(status=100, message='Success', data=response.embeddings)
@@ -127,35 +226,66 @@ class OllamaClient(BaseClient):
         except Exception as e:
             return ResponseDTO(900, f"Internal Server Error - {str(e)}", None)
 
+    def get_embed_request(self, input, options: dict) -> dict:
+        return {
+            'model' : self.model_name,
+            'input' : input,
+            'options' : {k: v for k, v in options.items() if k != 'priority'}
+        }
+
+    def call_scheduled(self, options: dict, request: callable):
+        """
+        OllamaScheduler의 처리 슬롯을 얻어 요청한다
+        - 서버가 과부하(429, 5xx)로 거절하거나 연결이 끊기면 ProviderGuard가 백오프 후 다시 요청한다
+        """
+        priority = options['priority'] if 'priority' in options else DEFAULT_PRIORITY
+        with OllamaScheduler.get_instance().slot(self.model_name, priority):
+            return self.guard.call(request)
+
+    async def call_scheduled_async(self, options: dict, request: callable):
+        """
+        call_scheduled의 비동기 버전, request는 코루틴을 반환하는 함수
+        """
+        priority = options['priority'] if 'priority' in options else DEFAULT_PRIORITY
+        async with OllamaScheduler.get_instance().slot_async(self.model_name, priority):
+            return await self.guard.call_async(request)
+
+    @property
+    def tokenizer_callable(self):
+        if self.tokenizer is None:
+            self.tokenizer = self.load_tokenizer()
+        return self.tokenizer
 
     def load_tokenizer(self):
         """
-        토크나이저 로드
-        """
-        #if "qwen" in [self.mode_architecture, self.tokenizer_type, self.model_name]:
-        #    self.tokenizer_callable = AutoTokenizer.from_pretrained("Qwen/Qwen-7B")
-        #elif "llama" in [self.mode_architecture, self.tokenizer_type, self.model_name]:
-        #    self.tokenizer_callable = AutoTokenizer.from_pretrained("meta-llama/Llama-2-7b-hf")
-        #elif "mistral" in [self.mode_architecture, self.tokenizer_type, self.model_name]:
-        #    self.tokenizer_callable = AutoTokenizer.from_pretrained("mistralai/Mistral-7B-v0.1")
-        #elif "gemma" in [self.mode_architecture, self.tokenizer_type, self.model_name]:
-        #    self.tokenizer_callable = AutoTokenizer.from_pretrained("google/gemma-7B")
-        #else:
-        #    print(f"LOG-ERROR Error during tokenizer loading. cannot find proper tokenizer")
-        pass
-
-    def get_how_much_cost(self, text) -> float:
-        #return self.get_token_count(text) * self.cost_per_token()
-        print("LOG-DEBUG : Ollama is free!! Fell free to use it.")
-        return 0.0
+        토크나이저 로드 (TokenizerRegistry가 프로세스 안에서 한 번만 로드한다)
+        - 아키텍처를 알 수 없으면(ollama show 실패) 모델 이름으로 찾는다
+        """
+        try:
+            architecture = self.mode_architecture
+        except Exception:
+            architecture = None
+        return TokenizerRegistry.get_instance().get_ollama_tokenizer(self.model_name, architecture)
 
     def get_token_count(self, text) -> int:
-        if self.tokenizer_callable is None:
-            raise Exception("Tokenizer is not loaded")
-        else:
-            return len(self.tokenizer_callable.tokenize(text))
+        return self.get_token_counts([text])[0]
+
+    def get_token_counts(self, texts: list[str]) -> list[int]:
+        """
+        여러 텍스트의 토큰 수를 한 번에 센다
+        """
+        return self.tokenizer_callable.count_batch(texts)
+
+    def split_by_tokens(self, text: str, max_tokens: int) -> list[str]:
+        """
+        text를 max_tokens개 토큰씩 나눈다
+        """
+        return split_by_tokens(self.tokenizer_callable, text, max_tokens)
 
     def get_cost_per_token(self) -> float:
+        """
+        토큰당 비용 (원), 로컬 모델은 기본 0원이고 옵션 cost_per_token으로 전기료 등을 매길 수 있다
+        """
         return self.cost_per_token
 
     def get_chunk_size(self) -> int:
@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from common.system.constants import Constants
+
+# 우선순위 (작을수록 먼저), 사용자가 기다리는 검색 요청이 대량 추출/확장보다 먼저 처리 슬롯을 얻는다
+PRIORITIES = {'interactive': 0, 'bulk': 1}
+DEFAULT_PRIORITY = 'bulk'
+
+
+class QueueFullError(Exception):
+    """
+    모델의 대기열이 OLLAMA_MAX_QUEUE만큼 차서 요청을 받지 않았다
+    """
+    pass
+
+
+class ModelQueue:
+    """
+    모델 하나의 처리 슬롯과 우선순위 대기열
+
+    - 동시에 slots개까지만 실행하고, 나머지는 max_queue개까지 우선순위 순서(같으면 먼저 온 순서)로 기다린다
+    - 슬롯이 비면 기다리던 요청에 바로 넘겨준다 (새로 온 요청이 끼어들지 않는다)
+    """
+    def __init__(self, slots: int, max_queue: int):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.active = 0
+        self.waiting = [] # heap of [priority, seq, wake, granted], wake는 슬롯을 넘겨받았을 때 부르는 함수
+        self.seq = itertools.count()
+        self.stats = {name: {'admitted': 0, 'rejected': 0, 'timeouts': 0, 'wait_sec_sum': 0.0, 'wait_sec_max': 0.0}
+                      for name in PRIORITIES}
+
+    def acquire(self, priority: str, timeout: float = None) -> float:
+        """
+        처리 슬롯을 얻을 때까지 기다리고, 기다린 시간(초)을 반환한다
+        - 대기열이 가득 찼으면 QueueFullError, timeout 안에 슬롯을 얻지 못하면 TimeoutError
+        """
+        begin_time = time.perf_counter()
+        event = threading.Event()
+        entry = self.enqueue(priority, event.set)
+        if entry is None:
+            return 0.0
+
+        event.wait(timeout)
+        with self.lock:
+            if not entry[3]:
+                self.remove_waiting(entry, priority)
+                raise TimeoutError(f'no ollama slot within {timeout}s')
+            wait_sec = time.perf_counter() - begin_time
+            self.record_admitted(priority, wait_sec)
+            return wait_sec
+
+    async def acquire_async(self, priority: str, timeout: float = None) -> float:
+        """
+        acquire의 비동기 버전, 스레드 대신 이벤트 루프에서 기다린다
+        - 기다리는 중에 취소되면 대기열에서 빠진다 (그 사이 슬롯을 넘겨받았으면 반납한다)
+        """
+        begin_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+        entry = self.enqueue(priority, wake)
+        if entry is None:
+            return 0.0
+
+        try:
+            await asyncio.wait_for(granted, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self.lock:
+                if not entry[3]:
+                    self.remove_waiting(entry, priority if isinstance(e, asyncio.TimeoutError) else None)
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise TimeoutError(f'no ollama slot within {timeout}s')
+                    raise
+            if isinstance(e, asyncio.CancelledError):
+                self.release()
+                raise
+        with self.lock:
+            wait_sec = time.perf_counter() - begin_time
+            self.record_admitted(priority, wait_sec)
+            return wait_sec
+
+    def enqueue(self, priority: str, wake: callable) -> list:
+        """
+        슬롯이 비어있으면 바로 차지하고 None을, 아니면 대기열에 넣은 항목을 반환한다
+        """
+        with self.lock:
+            if self.active < self.slots and not self.waiting:
+                self.active += 1
+                self.record_admitted(priority, 0.0)
+                return None
+            if len(self.waiting) >= self.max_queue:
+                self.stats[priority]['rejected'] += 1
+                raise QueueFullError(f'ollama queue is full ({self.max_queue})')
+            entry = [PRIORITIES[priority], next(self.seq), wake, False]
+            heapq.heappush(self.waiting, entry)
+            return entry
+
+    def remove_waiting(self, entry: list, timeout_priority: str = None):
+        """
+        슬롯을 넘겨받지 못한 항목을 대기열에서 뺀다 (self.lock 안에서 호출)
+        """
+        self.waiting.remove(entry)
+        heapq.heapify(self.waiting)
+        if timeout_priority is not None:
+            self.stats[timeout_priority]['timeouts'] += 1
+
+    def release(self):
+        with self.lock:
+            if self.waiting:
+                # 슬롯을 반납하지 않고 가장 앞선 대기 요청에 넘긴다
+                entry = heapq.heappop(self.waiting)
+                entry[3] = True
+                entry[2]()
+            else:
+                self.active -= 1
+
+    def record_admitted(self, priority: str, wait_sec: float):
+        stats = self.stats[priority]
+        stats['admitted'] += 1
+        stats['wait_sec_sum'] += wait_sec
+        stats['wait_sec_max'] = max(stats['wait_sec_max'], wait_sec)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'slots': self.slots,
+                'active': self.active,
+                'waiting': len(self.waiting),
+                'max_queue': self.max_queue,
+                'priorities': {
+                    name: {
+                        'admitted': stats['admitted'],
+                        'rejected': stats['rejected'],
+                        'timeouts': stats['timeouts'],
+                        'wait_sec_avg': round(stats['wait_sec_sum'] / stats['admitted'], 4) if stats['admitted'] else None,
+                        'wait_sec_max': round(stats['wait_sec_max'], 4)
+                    } for name, stats in self.stats.items()
+                }
+            }
+
+
+class OllamaScheduler:
+    """
+    Ollama 모델별 요청 스케줄러 싱글톤
+
+    - 모델마다 OLLAMA_NUM_PARALLEL개(서버의 병렬 처리 슬롯 수)까지만 동시에 요청한다
+    - 나머지 요청은 OLLAMA_MAX_QUEUE개까지 우선순위 대기열에서 기다리고, 넘치면 바로 거절한다 (QueueFullError)
+    - 서버 쪽 대기열이 넘쳐 오류가 나기 전에 클라이언트 쪽에서 막아, 서버를 포화 상태로 유지하되 과부하는 피한다
+    """
+    _instance = None
+
+    def __init__(self):
+        if OllamaScheduler._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            OllamaScheduler._instance = self
+            constants = Constants.get_instance()
+            self.slots = constants.ollama_num_parallel
+            self.max_queue = constants.ollama_max_queue
+            self.lock = threading.Lock()
+            self.queues = {}
+
+    @staticmethod
+    def get_instance():
+        if OllamaScheduler._instance is None:
+            OllamaScheduler()
+        return OllamaScheduler._instance
+
+    def get_queue(self, model_name: str) -> ModelQueue:
+        with self.lock:
+            if model_name not in self.queues:
+                self.queues[model_name] = ModelQueue(self.slots, self.max_queue)
+            return self.queues[model_name]
+
+    @contextmanager
+    def slot(self, model_name: str, priority: str = DEFAULT_PRIORITY, timeout: float = None):
+        """
+        처리 슬롯을 얻어 with 블록을 실행한다
+        - with OllamaScheduler.get_instance().slot(model_name, 'interactive'): ollama.generate(...)
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f'unknown priority: {priority}')
+        queue = self.get_queue(model_name)
+        queue.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            queue.release()
+
+    @asynccontextmanager
+    async def slot_async(self, model_name: str, priority: str = DEFAULT_PRIORITY, timeout: float = None):
+        """
+        slot의 비동기 버전
+        - async with OllamaScheduler.get_instance().slot_async(model_name, 'interactive'): await client.generate(...)
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f'unknown priority: {priority}')
+        queue = self.get_queue(model_name)
+        await queue.acquire_async(priority, timeout)
+        try:
+            yield
+        finally:
+            queue.release()
+
+    def get_stats(self) -> dict:
+        """
+        모델별 처리중/대기 요청 수와 우선순위별 허용/거절/시간초과 수, 평균/최대 대기 시간
+        """
+        with self.lock:
+            queues = dict(self.queues)
+        return {model_name: queue.get_stats() for model_name, queue in queues.items()}
@@ -1,12 +1,16 @@
-import tiktoken
-import datetime
 from pydantic import BaseModel
-from openai import OpenAI
-import FinanceDataReader as fdr
-import numpy as np
-from common.llmroute.baseclient import BaseClient
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
+from common.llmroute.baseclient import BaseClient, LoopLocalClients
+from common.llmroute.exchangerate import ExchangeRate
+from common.llmroute.providerguard import ProviderGuard
+from common.llmroute.singleflight import SingleFlight
+from common.llmroute.jsonstream import StreamStats, open_stream, read_json_stream
+from common.llmroute.tokenizerregistry import TokenizerRegistry, split_by_tokens
+from common.system.constants import Constants
 from common.models.simpleDTO import SimpleDTO as ResponseDTO
 import json
+import time
 
 class OpenAIClient(BaseClient):
     """
@@ -58,41 +62,55 @@ class OpenAIClient(BaseClient):
     '''
     client: OpenAI
 
-    '''
-    원/달러 환율
-    '''
-    currency_rates: float
-
 
     def __init__(self, model_name: str, options: dict):
+        constants = Constants.get_instance()
+        api_key = options['api_key'] if 'api_key' in options else None
+        # 재시도는 SDK 대신 ProviderGuard가 한다 (속도 조절, 회로 차단과 함께 계산하기 위해)
         self.client = OpenAI(
-            api_key = options['api_key'] if 'api_key' in options else None,
+            api_key = api_key,
+            timeout = constants.llm_timeout_sec,
+            max_retries = 0
         )
+        # 비동기 클라이언트는 이벤트 루프마다 하나, 연결 풀은 LLM_MAX_CONNECTIONS개까지
+        self.async_clients = LoopLocalClients(lambda: AsyncOpenAI(
+            api_key = api_key,
+            timeout = constants.llm_timeout_sec,
+            max_retries = 0,
+            http_client = DefaultAsyncHttpxClient(
+                limits = httpx.Limits(max_connections=constants.llm_max_connections, max_keepalive_connections=constants.llm_max_connections)
+            )
+        ))
 
         self.model_name = model_name
         self.mode_architecture = 'GPT'
 
+        # 분당 요청/토큰 제한, 429 재시도, 회로 차단 (rpm, tpm 옵션이 없으면 OPENAI_RPM, OPENAI_TPM)
+        self.guard = ProviderGuard(
+            f'openai:{model_name}',
+            options['rpm'] if 'rpm' in options else constants.openai_rpm,
+            options['tpm'] if 'tpm' in options else constants.openai_tpm
+        )
+        # 스트리밍 생성의 첫 필드 도착 시간, 중단/복구 횟수
+        self.stream_stats = StreamStats()
+
         self.context_length = options['context_length'] if 'context_length' in options else 2048
         self.chunk_size = min(self.context_length, options['chunk_size'] if 'chunk_size' in options else 2048)
         self.embedding_length = options['embedding_length'] if 'embedding_length' in options else 2048
 
         self.tokenizer_type = None
-        #self.tokenizer_callable = self.load_tokenizer()
+        self.tokenizer = None # 처음 토큰을 셀 때 TokenizerRegistry에서 받아온다
         self.cost_per_token = options['cost_per_token'] if 'cost_per_token' in options else float('inf')
 
-        # 환율 계산
-        try:
-            df = fdr.DataReader('USD/KRW')[-7:] # 최근 7일 환율
-            today = datetime.datetime.today().strftime('%Y-%m-%d')
-            if today in df.index: # 오늘 최고가
-                today_row = df.loc[today]
-                self.currency_rates = float(today_row['Close'] if np.isnan(today_row['Close']) else today_row['High'])
-            else: # 전날 종가
-                self.currency_rates = float(df.iloc[-1]['Close'])
-        except:
-            self.currency_rates = 1500.0
-            print("LOG-ERROR: 환율 조회 실패, 1500원으로 가정합니다!!")
+        # 환율은 ExchangeRate가 백그라운드에서 조회한다 (생성시 네트워크 호출 없음, 만료되었을 때만 조회를 시작)
+        ExchangeRate.get_instance().get_usd_krw()
 
+    @property
+    def currency_rates(self) -> float:
+        """
+        원/달러 환율
+        """
+        return ExchangeRate.get_instance().get_usd_krw()
 
     def generate(self, prompt: str, options: dict) -> ResponseDTO:
         """
@@ -110,41 +128,106 @@ class OpenAIClient(BaseClient):
             raise ValueError(f"지원되지 않는 모델입니다: {self.model_name}")
 
         try:
-            # refer to https://platform.openai.com/docs/guides/text-generation?example=json
-            default_format = {
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "response_schema",
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "text": {
-                                "description": "generated response text",
-                                "type": "string"
-                            },
-                            "additionalProperties": False
-                        }
-                    }
-                }
-            }
+            request = self.get_chat_request(prompt, options)
+            response = SingleFlight.get_instance().do('generate', request, lambda: self.guard.call(
+                lambda: self.parse_raw(self.client.chat.completions.with_raw_response.create(**request)),
+                self.get_request_tokens(prompt)))
+            return ResponseDTO(status=100, message='Success', data=json.loads(response.choices[0].message.content))
+        except Exception as e:
+            return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
 
-            # client.completions.create는 response_format을 지원하지 않고, prompt를 인자로 받음
-            # client.chat.completions.create는 response_format을 지원하고, messages를 인자로 받음
-            response = self.client.chat.completions.create(
-                model = self.model_name,
-                messages = [
-                    {
-                        "role" : "user",
-                        "content" : prompt
-                    },
-                ],
-                response_format = options['format'] if 'format' in options else default_format
-            )
+    async def agenerate(self, prompt: str, options: dict) -> ResponseDTO:
+        """
+        generate의 비동기 버전 (AsyncOpenAI, 이벤트 루프별 연결 풀 재사용)
+        - 요청 중에 취소되면 HTTP 요청도 함께 취소된다
+        """
+        if self.model_name not in ["gpt-4o-mini"]:
+            raise ValueError(f"지원되지 않는 모델입니다: {self.model_name}")
+
+        try:
+            request = self.get_chat_request(prompt, options)
+            client = self.async_clients.get()
+            async def call():
+                return self.parse_raw(await client.chat.completions.with_raw_response.create(**request))
+            response = await SingleFlight.get_instance().do_async('generate', request,
+                lambda: self.guard.call_async(call, self.get_request_tokens(prompt)))
             return ResponseDTO(status=100, message='Success', data=json.loads(response.choices[0].message.content))
         except Exception as e:
             return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
 
+    async def agenerate_stream(self, prompt: str, options: dict, on_field: callable = None) -> ResponseDTO:
+        """
+        생성 결과를 스트림으로 받으며 JSON 최상위 필드가 완성될 때마다 on_field(키, 값)을 부른다
+        - options['max_stream_tokens'] : 이만큼 생성하고도 끝나지 않으면 스트림을 닫고 그때까지 완성된 필드만 반환한다 (기본값 LLM_STREAM_MAX_TOKENS)
+        - 뒷부분 JSON이 깨져도 완성된 필드는 살린다
+        - 호출마다 콜백이 달라 SingleFlight로 합치지 않는다
+        """
+        if self.model_name not in ["gpt-4o-mini"]:
+            raise ValueError(f"지원되지 않는 모델입니다: {self.model_name}")
 
+        begin_time = time.perf_counter()
+        try:
+            request = self.get_chat_request(prompt, options)
+            request['stream'] = True
+            max_tokens = options['max_stream_tokens'] if 'max_stream_tokens' in options else Constants.get_instance().llm_stream_max_tokens
+            client = self.async_clients.get()
+            async def call():
+                stream = self.parse_raw(await client.chat.completions.with_raw_response.create(**request))
+                return await open_stream(stream, lambda chunk: chunk.choices[0].delta.content if chunk.choices else None)
+            chunks = await self.guard.call_async(call, self.get_request_tokens(prompt))
+            result = await read_json_stream(chunks, on_field, max_tokens, begin_time)
+            self.stream_stats.record(result)
+            return ResponseDTO(status=100, message='Success' if not result['salvaged'] else 'Success - partial', data=result['data'])
+        except Exception as e:
+            return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
+
+    def get_chat_request(self, prompt: str, options: dict) -> dict:
+        # refer to https://platform.openai.com/docs/guides/text-generation?example=json
+        default_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "response_schema",
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "text": {
+                            "description": "generated response text",
+                            "type": "string"
+                        },
+                        "additionalProperties": False
+                    }
+                }
+            }
+        }
+
+        # client.completions.create는 response_format을 지원하지 않고, prompt를 인자로 받음
+        # client.chat.completions.create는 response_format을 지원하고, messages를 인자로 받음
+        return {
+            'model' : self.model_name,
+            'messages' : [
+                {
+                    "role" : "user",
+                    "content" : prompt
+                },
+            ],
+            'response_format' : options['format'] if 'format' in options else default_format
+        }
+
+
+    def parse_raw(self, raw):
+        """
+        raw 응답의 x-ratelimit-* 헤더를 ProviderGuard에 알리고 응답 본문을 반환한다
+        """
+        self.guard.update_from_headers(raw.headers)
+        return raw.parse()
+
+    def get_request_tokens(self, text) -> int:
+        """
+        TPM 예약에 쓸 토큰 수, 토크나이저를 쓸 수 없으면 글자 수의 절반으로 어림한다
+        """
+        if not isinstance(text, str):
+            text = ' '.join(text)
+        return self.get_token_count(text) or len(text) // 2
 
     def embed(self, input: str, options: dict, operation: str = None) -> ResponseDTO:
         """
@@ -165,47 +248,73 @@ class OpenAIClient(BaseClient):
             raise ValueError(f"지원되지 않는 모델입니다: {self.model_name}")
 
         try:
-            response = self.client.embeddings.create(
-                model = self.model_name,
-                input = input
-            )
+            request = {'model': self.model_name, 'input': input}
+            response = SingleFlight.get_instance().do('embed', request, lambda: self.guard.call(
+                lambda: self.parse_raw(self.client.embeddings.with_raw_response.create(**request)),
+                self.get_request_tokens(input)))
             return ResponseDTO(status=100, message='Success', data=response.data[0].embedding)
 
         except Exception as e:
             return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
 
+    async def aembed(self, input: str, options: dict, operation: str = None) -> ResponseDTO:
+        """
+        embed의 비동기 버전 (AsyncOpenAI, 이벤트 루프별 연결 풀 재사용)
+        """
+        if self.model_name not in ["text-embedding-3-small"]:
+            raise ValueError(f"지원되지 않는 모델입니다: {self.model_name}")
+
+        try:
+            request = {'model': self.model_name, 'input': input}
+            client = self.async_clients.get()
+            async def call():
+                return self.parse_raw(await client.embeddings.with_raw_response.create(**request))
+            response = await SingleFlight.get_instance().do_async('embed', request,
+                lambda: self.guard.call_async(call, self.get_request_tokens(input)))
+            return ResponseDTO(status=100, message='Success', data=response.data[0].embedding)
+
+        except Exception as e:
+            return ResponseDTO(status=900, message=f"Internal Server Error - {str(e)}", data=None)
+
+    @property
+    def tokenizer_callable(self):
+        if self.tokenizer is None:
+            self.tokenizer = self.load_tokenizer()
+        return self.tokenizer
+
     def load_tokenizer(self):
         """
-        토크나이저 로드
+        토크나이저 로드 (TokenizerRegistry가 tiktoken 인코딩을 프로세스 안에서 한 번만 로드한다)
         """
         model_name = self.model_name.lower()
 
-        if model_name in ["gpt-4o-mini"]:
-            #self.tokenizer_callable = tiktoken.get_encoding("o200k_base")
-            return tiktoken.get_encoding("o200k_base")
-        elif model_name in ["text-embedding-3-small"]:
-            #self.tokenizer_callable = tiktoken.get_encoding("cl100k_base")
-            return tiktoken.get_encoding("cl100k_base")
+        if model_name in ["gpt-4o-mini", "text-embedding-3-small"]:
+            return TokenizerRegistry.get_instance().get_openai_tokenizer(model_name)
         else:
             raise ValueError(f"지원되지 않는 모델입니다: {model_name}")
 
-    def get_how_much_cost(self, text) -> float:
-        """
-        비용을 원화로 환산하여 반환한다.
-        - 모델이름을 기준으로 tiktoken 토크나이저를 로드
-        - 토큰당비용은 모델클라이언트 생성시 옵션으로 직접지정
-        - 환율은 오늘 최고가 혹은 전날 종가 기준으로 계산
-        - 산식 : 토큰수 * 토큰당비용 * 환율 * 2 (input, output)
-        """
-        return self.get_token_count(text) * self.get_cost_per_token() * self.currency_rates * 2
-
     def get_token_count(self, text) -> int:
         try:
-            return len(self.load_tokenizer().encode(text))
+            return self.get_token_counts([text])[0]
         except:
             print("LOG-ERROR: get_token_count() failed")
 
+    def get_token_counts(self, texts: list[str]) -> list[int]:
+        """
+        여러 텍스트의 토큰 수를 한 번에 센다
+        """
+        return self.tokenizer_callable.count_batch(texts)
+
+    def split_by_tokens(self, text: str, max_tokens: int) -> list[str]:
+        """
+        text를 max_tokens개 토큰씩 나눈다
+        """
+        return split_by_tokens(self.tokenizer_callable, text, max_tokens)
+
     def get_cost_per_token(self) -> float:
+        """
+        토큰당 비용 (달러), 모델클라이언트 생성시 옵션으로 직접지정, 원화 환산은 currency_rates (오늘 최고가 혹은 전날 종가 기준)
+        """
         return self.cost_per_token
 
     def get_chunk_size(self) -> int:
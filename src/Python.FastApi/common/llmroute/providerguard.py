@@ -0,0 +1,305 @@
+import asyncio
+import random
+import re
+import threading
+import time
+import httpx
+import ollama
+import openai
+from common.system.constants import Constants
+from common.system.ratelimiter import TokenBucket
+
+# 429를 받으면 호출 속도를 이 비율로 줄이고, 성공할 때마다 조금씩 되돌린다
+THROTTLE_DECREASE = 0.5
+THROTTLE_RECOVER = 0.05
+THROTTLE_MIN_SCALE = 0.05
+
+
+class CircuitOpenError(Exception):
+    """
+    실패가 이어져 회로가 열렸다, 쿨다운이 끝날 때까지 백엔드를 호출하지 않는다
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    연속 실패 횟수로 여닫는 회로 차단기 (스레드 안전)
+
+    - closed : 정상 호출, threshold번 연달아 실패하면 open
+    - open : cooldown_sec 동안 호출하지 않고 바로 CircuitOpenError
+    - half_open : 쿨다운이 끝나면 한 번만 시험 호출, 성공하면 closed, 실패하면 다시 open
+    """
+    def __init__(self, threshold: int, cooldown_sec: float):
+        self.threshold = threshold
+        self.cooldown_sec = cooldown_sec
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_inflight = False
+
+    def before_call(self):
+        with self.lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.cooldown_sec:
+                    raise CircuitOpenError(f'circuit is open, retry after {self.cooldown_sec - (time.monotonic() - self.opened_at):.1f}s')
+                self.state = 'half_open'
+                self.trial_inflight = False
+            if self.state == 'half_open':
+                if self.trial_inflight:
+                    raise CircuitOpenError('circuit is half open, trial call in progress')
+                self.trial_inflight = True
+
+    def on_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_inflight = False
+
+    def on_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_inflight = False
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def on_abandon(self):
+        """
+        성공도 실패도 아닌 채로 끝난 호출 (취소, 429로 재시도를 다 씀), 상태는 그대로 두고 시험 호출 자리만 비운다
+        """
+        with self.lock:
+            self.trial_inflight = False
+
+    def is_open(self) -> bool:
+        """
+        쿨다운 중이라 호출하면 바로 거절되는 상태인지
+        """
+        with self.lock:
+            return self.state == 'open' and time.monotonic() - self.opened_at < self.cooldown_sec
+
+    def get_status(self) -> dict:
+        with self.lock:
+            return {'state': self.state, 'failures': self.failures}
+
+
+class ProviderGuard:
+    """
+    LLM 제공자 호출을 감싸 속도 제한, 재시도, 회로 차단을 처리한다 (클라이언트마다 하나)
+
+    - rpm, tpm이 있으면 분당 요청 수/토큰 수 토큰 버킷으로 호출 전에 기다린다
+    - 응답의 rate limit 헤더(x-ratelimit-remaining-*, x-ratelimit-reset-*)를 읽어 남은 양이 없으면 초기화 시각까지 멈춘다
+    - 429를 받으면 호출 속도를 절반으로 줄이고, 성공할 때마다 설정값까지 조금씩 되돌린다
+    - 429, 5xx, 시간초과, 연결 오류는 지터를 넣은 지수 백오프로 LLM_RETRY_MAX번까지 다시 시도한다 (retry-after가 있으면 따른다)
+    - 회로 차단기는 5xx, 시간초과, 연결 오류로 재시도를 다 쓴 호출만 실패로 센다 (429는 속도 조절로만 처리)
+    - 그 외 오류(잘못된 요청 등)는 다시 시도하지 않는다
+    """
+    def __init__(self, name: str, rpm: float = None, tpm: float = None):
+        constants = Constants.get_instance()
+        self.name = name
+        self.retry_max = constants.llm_retry_max
+        self.retry_base_sec = constants.llm_retry_base_sec
+        self.retry_max_sec = constants.llm_retry_max_sec
+        self.breaker = CircuitBreaker(constants.llm_breaker_threshold, constants.llm_breaker_cooldown_sec)
+
+        self.lock = threading.Lock()
+        self.rpm = rpm
+        self.tpm = tpm
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.request_bucket = TokenBucket(rpm / 60, rpm) if rpm else None
+        self.token_bucket = TokenBucket(tpm / 60, tpm) if tpm else None
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'failures': 0, 'rejected': 0}
+
+    # --------------------------------------------------------------
+    # 호출
+    def call(self, request: callable, tokens: int = 0):
+        """
+        request()를 속도 제한과 재시도를 적용해 호출하고 결과를 반환한다
+        - 회로 차단기는 재시도를 포함한 호출 하나에 한 번만 묻고 결과를 한 번만 알린다
+        """
+        self.before_call()
+        for attempt in range(self.retry_max + 1):
+            time.sleep(self.reserve(tokens))
+            try:
+                result = request()
+            except Exception as e:
+                time.sleep(self.after_failure(e, attempt))
+                continue
+            self.after_success()
+            return result
+
+    async def call_async(self, request: callable, tokens: int = 0):
+        """
+        call의 비동기 버전, request는 코루틴을 반환하는 함수
+        - 취소되면 결과를 알리지 않고 시험 호출 자리만 비운다
+        """
+        self.before_call()
+        try:
+            for attempt in range(self.retry_max + 1):
+                await asyncio.sleep(self.reserve(tokens))
+                try:
+                    result = await request()
+                except Exception as e:
+                    await asyncio.sleep(self.after_failure(e, attempt))
+                    continue
+                self.after_success()
+                return result
+        except asyncio.CancelledError:
+            self.breaker.on_abandon()
+            raise
+
+    def before_call(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.add_stats('rejected')
+            raise
+        self.add_stats('calls')
+
+    def reserve(self, tokens: int) -> float:
+        """
+        요청 하나와 tokens개를 예약하고, 호출 전에 기다려야 할 시간(초)을 반환한다
+        """
+        wait = max(0.0, self.paused_until - time.monotonic())
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens:
+            wait = max(wait, self.token_bucket.reserve(min(tokens, self.token_bucket.capacity)))
+        return wait
+
+    def after_success(self):
+        self.breaker.on_success()
+        with self.lock:
+            if self.scale < 1.0:
+                self.scale = min(1.0, self.scale + THROTTLE_RECOVER)
+                self.apply_scale()
+
+    def after_failure(self, e: Exception, attempt: int) -> float:
+        """
+        실패를 기록하고 다시 시도하기 전에 기다릴 시간(초)을 반환한다, 다시 시도하지 않을 오류면 그대로 raise
+        - 429는 속도를 줄이고 기다릴 뿐 회로 차단기에는 세지 않는다 (백엔드는 살아있다)
+        - 5xx, 시간초과, 연결 오류는 재시도를 다 쓴 뒤에 회로 차단기에 실패 한 번으로 센다
+        """
+        status_code = get_status_code(e)
+        if not is_retryable(e, status_code):
+            # 잘못된 요청 등은 백엔드가 살아있다는 뜻이므로 회로 차단기에는 성공으로 센다
+            self.breaker.on_success()
+            raise e
+        if status_code == 429:
+            self.add_stats('throttled')
+            with self.lock:
+                self.scale = max(THROTTLE_MIN_SCALE, self.scale * THROTTLE_DECREASE)
+                self.apply_scale()
+        else:
+            self.add_stats('failures')
+        if attempt >= self.retry_max:
+            if status_code == 429:
+                self.breaker.on_abandon()
+            else:
+                self.breaker.on_failure()
+            raise e
+        self.add_stats('retries')
+
+        # full jitter : 0 ~ min(최대, 기본 * 2^attempt) 사이 임의의 시간, retry-after가 더 길면 그만큼
+        delay = random.uniform(0, min(self.retry_max_sec, self.retry_base_sec * (2 ** attempt)))
+        retry_after = get_retry_after(e)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.retry_max_sec))
+        return delay
+
+    def apply_scale(self):
+        """
+        줄어든 비율만큼 버킷 충전 속도를 바꾼다 (self.lock 안에서 호출)
+        """
+        if self.request_bucket is not None:
+            self.request_bucket.set_rate(self.rpm / 60 * self.scale)
+        if self.token_bucket is not None:
+            self.token_bucket.set_rate(self.tpm / 60 * self.scale)
+
+    # --------------------------------------------------------------
+    # 응답 헤더
+    def update_from_headers(self, headers):
+        """
+        x-ratelimit-remaining-requests/tokens가 0이면 x-ratelimit-reset-requests/tokens 뒤까지 호출을 멈춘다
+        - 남은 양이 버킷보다 적으면 버킷을 남은 양에 맞춘다
+        """
+        now = time.monotonic()
+        for kind, bucket in (('requests', self.request_bucket), ('tokens', self.token_bucket)):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            if remaining <= 0 and reset is not None:
+                with self.lock:
+                    self.paused_until = max(self.paused_until, now + reset)
+            if bucket is not None:
+                bucket.limit(remaining)
+
+    def add_stats(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def get_status(self) -> dict:
+        with self.lock:
+            status = dict(self.stats)
+            status['rate_scale'] = round(self.scale, 3)
+            status['paused_sec'] = round(max(0.0, self.paused_until - time.monotonic()), 3)
+        status['circuit'] = self.breaker.get_status()
+        return status
+
+
+def get_status_code(e: Exception) -> int:
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code
+    if isinstance(e, ollama.ResponseError):
+        return e.status_code
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code
+    return None
+
+
+def is_retryable(e: Exception, status_code: int) -> bool:
+    """
+    잠시 뒤 다시 하면 성공할 수 있는 오류 (429, 5xx, 시간초과, 연결 오류)
+    """
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, httpx.TimeoutException,
+                          httpx.TransportError, ConnectionError, TimeoutError))
+
+
+def get_retry_after(e: Exception) -> float:
+    """
+    응답의 retry-after-ms, retry-after 헤더 (초), 없으면 None
+    """
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms') is not None:
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after') is not None:
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+def parse_duration(value: str) -> float:
+    """
+    OpenAI rate limit 헤더의 기간 표기를 초로 바꾼다 ('1s', '6m0s', '20ms', '1h2m3.5s'), 읽을 수 없으면 None
+    """
+    if not value:
+        return None
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(number) * units[unit] for number, unit in parts)
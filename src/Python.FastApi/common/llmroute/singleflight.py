@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import threading
+from common.system.constants import Constants
+
+
+class Flight:
+    """
+    진행중인 백엔드 호출 하나 (동기 호출용)
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    같은 요청이 동시에 여러 번 들어오면 백엔드는 한 번만 호출하고 결과를 나눠주는 싱글톤
+
+    - 요청(모델, 프롬프트/입력, format, 옵션)이 같으면 같은 키로 보고, 먼저 온 호출이 끝날 때까지 나머지는 기다렸다가 같은 결과(혹은 같은 예외)를 받는다
+    - 끝난 호출의 결과는 보관하지 않는다 (캐시가 아니라 진행중인 호출만 합친다)
+    - 동기 호출과 비동기 호출은 따로 합치고, 비동기 호출은 같은 이벤트 루프 안에서만 합친다
+    - 비동기 호출은 기다리던 호출이 모두 취소되었을 때만 백엔드 호출을 취소한다
+    - LLM_SINGLEFLIGHT=false이면 합치지 않고 그대로 호출한다
+    """
+    _instance = None
+
+    def __init__(self):
+        if SingleFlight._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            SingleFlight._instance = self
+            self.enabled = Constants.get_instance().llm_singleflight
+            self.lock = threading.Lock()
+            self.flights = {}
+            self.tasks = {}
+            self.stats = {}
+
+    @staticmethod
+    def get_instance():
+        if SingleFlight._instance is None:
+            SingleFlight()
+        return SingleFlight._instance
+
+    def do(self, operation: str, request: dict, call: callable):
+        """
+        request와 같은 요청이 진행중이면 그 결과를 기다리고, 아니면 call()을 호출한다
+        - param
+            operation : str : 'generate' or 'embed' (통계용)
+            request : dict : 백엔드에 보낼 요청 (키를 만드는 데 쓴다)
+            call : callable : 백엔드 호출
+        """
+        if not self.enabled:
+            return call()
+        key = get_request_key(request)
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+            self.add_stats(operation, 'calls' if leader else 'coalesced')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = call()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    async def do_async(self, operation: str, request: dict, call: callable):
+        """
+        do의 비동기 버전, call은 코루틴을 반환하는 함수
+        """
+        if not self.enabled:
+            return await call()
+        key = (asyncio.get_running_loop(), get_request_key(request))
+        with self.lock:
+            entry = self.tasks.get(key)
+            leader = entry is None
+            if leader:
+                entry = self.tasks[key] = [asyncio.ensure_future(call()), 0] # [백엔드 호출, 기다리는 호출 수]
+                entry[0].add_done_callback(lambda task: self.remove_task(key, entry, task))
+            entry[1] += 1
+            self.add_stats(operation, 'calls' if leader else 'coalesced')
+
+        task = entry[0]
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            with self.lock:
+                entry[1] -= 1
+                cancel = entry[1] == 0
+            if cancel:
+                task.cancel()
+            raise
+
+    def remove_task(self, key, entry: list, task: asyncio.Future):
+        with self.lock:
+            if self.tasks.get(key) is entry:
+                del self.tasks[key]
+        if not task.cancelled():
+            task.exception() # 기다리던 호출이 모두 취소된 뒤에 난 예외가 'never retrieved'로 남지 않도록 읽어둔다
+
+    def add_stats(self, operation: str, key: str):
+        """
+        self.lock 안에서 호출
+        """
+        if operation not in self.stats:
+            self.stats[operation] = {'calls': 0, 'coalesced': 0}
+        self.stats[operation][key] += 1
+
+    def get_stats(self) -> dict:
+        """
+        작업별 백엔드 호출 수(calls)와 합쳐져 아낀 호출 수(coalesced), 지금 진행중인 호출 수
+        """
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'inflight': len(self.flights) + len(self.tasks),
+                'operations': {operation: dict(stats) for operation, stats in self.stats.items()}
+            }
+
+
+def get_request_key(request: dict) -> str:
+    """
+    요청 내용의 해시, 키 순서와 관계없이 같은 요청이면 같은 키
+    """
+    body = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
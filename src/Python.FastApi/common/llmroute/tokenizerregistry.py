@@ -0,0 +1,221 @@
+import os
+import re
+import threading
+from common.system.constants import Constants
+
+# Ollama 아키텍처(general.architecture) 혹은 모델 이름 앞부분 -> TOKENIZER_DIR 안의 토크나이저 파일 (Hugging Face tokenizer.json)
+# 모델 이름 전체로 된 파일({모델이름}.json, ':'와 '/'는 '_')이 있으면 그 파일을 먼저 쓴다
+OLLAMA_TOKENIZER_FILES = {
+    'gemma3': 'gemma3.json',
+    'gemma2': 'gemma.json',
+    'gemma': 'gemma.json',
+    'llama': 'llama3.json',
+    'qwen3': 'qwen2.json',
+    'qwen2': 'qwen2.json',
+    'mistral': 'mistral.json',
+    'phi3': 'phi3.json',
+    'exaone': 'exaone.json',
+    'nomic-bert': 'bert.json',
+    'bert': 'bert.json',
+}
+
+# OpenAI 모델 -> tiktoken 인코딩
+OPENAI_ENCODINGS = {
+    'gpt-4o': 'o200k_base',
+    'o1': 'o200k_base',
+    'o3': 'o200k_base',
+    'gpt-3.5-turbo': 'cl100k_base',
+    'text-embedding-3': 'cl100k_base',
+}
+
+# 토크나이저가 없을 때 쓰는 어림값 (토큰 / 글자), 인코딩별로 한글 효율이 크게 달라 알려진 것만 따로 둔다
+# 한글은 음절 하나, 그 외 글자(영문, 숫자, 기호)는 네 글자를 한 토큰으로 보고, 공백은 세지 않는다
+ESTIMATE_RATIOS = {
+    'default': {'hangul': 1.0, 'cjk': 1.0, 'other': 0.25},
+    'cl100k_base': {'hangul': 1.5, 'cjk': 1.2, 'other': 0.25},
+    'gemma.json': {'hangul': 0.7, 'cjk': 0.8, 'other': 0.25},
+    'gemma3.json': {'hangul': 0.7, 'cjk': 0.8, 'other': 0.25},
+}
+HANGUL_PATTERN = re.compile(r'[가-힣ᄀ-ᇿ㄰-㆏]')
+CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿豈-﫿]')
+SPACE_PATTERN = re.compile(r'\s')
+
+
+class HFTokenizer:
+    """
+    tokenizers(Hugging Face fast tokenizer) 파일로 만든 토크나이저
+    """
+    kind = 'tokenizers'
+
+    def __init__(self, name: str, path: str):
+        from tokenizers import Tokenizer # 필요할 때만 불러온다
+        self.name = name
+        self.tokenizer = Tokenizer.from_file(path)
+
+    def count_batch(self, texts: list[str]) -> list[int]:
+        return [len(encoding.ids) for encoding in self.tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+    def get_offsets(self, text: str) -> list[int]:
+        return [start for start, _ in self.tokenizer.encode(text, add_special_tokens=False).offsets]
+
+
+class TiktokenTokenizer:
+    """
+    tiktoken 인코딩 (OpenAI 모델)
+    """
+    kind = 'tiktoken'
+
+    def __init__(self, name: str):
+        import tiktoken
+        self.name = name
+        self.encoding = tiktoken.get_encoding(name)
+
+    def count_batch(self, texts: list[str]) -> list[int]:
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+
+    def get_offsets(self, text: str) -> list[int]:
+        _, offsets = self.encoding.decode_with_offsets(self.encoding.encode_ordinary(text))
+        return offsets
+
+
+class EstimateTokenizer:
+    """
+    토크나이저 파일이 없을 때 쓰는 어림 토크나이저, 글자 종류별 토큰/글자 비율(ESTIMATE_RATIOS)로 센다
+    """
+    kind = 'estimate'
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ratios = ESTIMATE_RATIOS[name] if name in ESTIMATE_RATIOS else ESTIMATE_RATIOS['default']
+
+    def count_batch(self, texts: list[str]) -> list[int]:
+        return [self.count_one(text) for text in texts]
+
+    def count_one(self, text: str) -> int:
+        hangul = len(HANGUL_PATTERN.findall(text))
+        cjk = len(CJK_PATTERN.findall(text))
+        spaces = len(SPACE_PATTERN.findall(text))
+        other = len(text) - hangul - cjk - spaces
+        tokens = hangul * self.ratios['hangul'] + cjk * self.ratios['cjk'] + other * self.ratios['other']
+        return int(round(tokens)) if text else 0
+
+    def get_offsets(self, text: str) -> list[int]:
+        """
+        글자 비율을 누적해 1토큰이 찰 때마다 그 글자 위치를 토큰 시작으로 본다
+        """
+        offsets = []
+        filled = 1.0
+        for i, ch in enumerate(text):
+            if SPACE_PATTERN.match(ch):
+                continue
+            if filled >= 1.0:
+                offsets.append(i)
+                filled = 0.0
+            if HANGUL_PATTERN.match(ch):
+                filled += self.ratios['hangul']
+            elif CJK_PATTERN.match(ch):
+                filled += self.ratios['cjk']
+            else:
+                filled += self.ratios['other']
+        return offsets
+
+
+class TokenizerRegistry:
+    """
+    모델별 토크나이저를 찾아 프로세스 안에서 한 번만 로드하고 재사용하는 싱글톤
+
+    - Ollama 모델은 TOKENIZER_DIR의 tokenizers 파일 (모델 이름 파일 > 아키텍처/모델 계열 파일 순서로 찾는다)
+    - OpenAI 모델은 tiktoken 인코딩
+    - 파일이 없거나 로드에 실패하면 어림 토크나이저(EstimateTokenizer)로 대신하고, 실패한 것을 기억해 다시 시도하지 않는다
+    - 로드는 처음 쓸 때 한다 (생성시 디스크/네트워크 접근 없음)
+    """
+    _instance = None
+
+    def __init__(self):
+        if TokenizerRegistry._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            TokenizerRegistry._instance = self
+            self.tokenizer_dir = Constants.get_instance().tokenizer_dir
+            self.lock = threading.Lock()
+            self.tokenizers = {}
+
+    @staticmethod
+    def get_instance():
+        if TokenizerRegistry._instance is None:
+            TokenizerRegistry()
+        return TokenizerRegistry._instance
+
+    def get_ollama_tokenizer(self, model_name: str, architecture: str = None):
+        """
+        Ollama 모델의 토크나이저
+        - param
+            model_name : str : 모델 이름 (예: gemma2:9b-instruct-q5_K_M)
+            architecture : str : ollama show의 general.architecture (모르면 None, 모델 이름으로 찾는다)
+        """
+        candidates = [model_name.replace(':', '_').replace('/', '_') + '.json']
+        family = find_family(architecture, OLLAMA_TOKENIZER_FILES) or find_family(model_name.split('/')[-1], OLLAMA_TOKENIZER_FILES)
+        if family is not None:
+            candidates.append(OLLAMA_TOKENIZER_FILES[family])
+
+        for filename in candidates:
+            path = os.path.join(self.tokenizer_dir, filename)
+            if os.path.isfile(path):
+                return self.get_or_load(f'tokenizers:{path}', lambda: HFTokenizer(filename, path),
+                                        lambda: EstimateTokenizer(filename))
+        name = candidates[-1]
+        return self.get_or_load(f'estimate:{name}', lambda: EstimateTokenizer(name))
+
+    def get_openai_tokenizer(self, model_name: str):
+        """
+        OpenAI 모델의 토크나이저 (tiktoken 인코딩 파일을 받지 못하면 어림 토크나이저)
+        """
+        family = find_family(model_name, OPENAI_ENCODINGS)
+        if family is None:
+            return self.get_or_load('estimate:default', lambda: EstimateTokenizer('default'))
+        encoding = OPENAI_ENCODINGS[family]
+        return self.get_or_load(f'tiktoken:{encoding}', lambda: TiktokenTokenizer(encoding),
+                                lambda: EstimateTokenizer(encoding))
+
+    def get_or_load(self, key: str, load: callable, fallback: callable = None):
+        with self.lock:
+            if key in self.tokenizers:
+                return self.tokenizers[key]
+            try:
+                tokenizer = load()
+            except Exception as e:
+                if fallback is None:
+                    raise
+                print(f"LOG-ERROR: tokenizer {key} load failed, using estimate - {str(e)}")
+                tokenizer = fallback()
+            self.tokenizers[key] = tokenizer
+            return tokenizer
+
+    def get_loaded(self) -> dict:
+        """
+        로드된 토크나이저 (키 -> 종류)
+        """
+        with self.lock:
+            return {key: tokenizer.kind for key, tokenizer in self.tokenizers.items()}
+
+
+def find_family(name: str, table: dict) -> str:
+    """
+    table의 키 중 name이 그 키로 시작하는 가장 긴 키 (gemma2:9b -> gemma2), 없으면 None
+    """
+    if not name:
+        return None
+    name = name.lower()
+    matches = [family for family in table if name.startswith(family)]
+    return max(matches, key=len) if matches else None
+
+
+def split_by_tokens(tokenizer, text: str, max_tokens: int) -> list[str]:
+    """
+    text를 max_tokens개 토큰씩 나눈다, 토큰 경계(글자 위치)에서 자르므로 글자가 깨지지 않는다
+    """
+    if not text:
+        return []
+    offsets = tokenizer.get_offsets(text)
+    boundaries = [0] + [offsets[i] for i in range(max_tokens, len(offsets), max_tokens)] + [len(text)]
+    return [text[start:end] for start, end in zip(boundaries, boundaries[1:]) if text[start:end]]
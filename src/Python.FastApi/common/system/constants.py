@@ -44,10 +44,54 @@ class Constants:
     ollama_max_queue :int
     ollama_num_parallel :int
 
+    # LLM router
+    llm_model_refresh_sec :int
+    llm_discover_timeout_sec :float
+    exchange_rate_ttl_sec :int
+    llm_timeout_sec :float
+    llm_max_connections :int
+    llm_retry_max :int
+    llm_retry_base_sec :float
+    llm_retry_max_sec :float
+    llm_breaker_threshold :int
+    llm_breaker_cooldown_sec :float
+    openai_rpm :int
+    openai_tpm :int
+    llm_singleflight :bool
+    llm_stream_max_tokens :int
+    llm_output_reserve_tokens :int
+    tokenizer_dir :str
+
+    # Reference expansion constants
+    websearch_providers :str
+    naver_search_rate_per_sec :float
+    naver_search_burst :int
+    naver_search_daily_quota :int
+    google_pse_rate_per_sec :float
+    google_pse_daily_quota :int
+    local_search_fixture_path :str
+    local_search_latency_ms :float
+    websearch_pool_size :int
+    reference_concept_parallel :int
+    websearch_cache_ttl_sec :int
+    reference_fresh_sec :int
+    reference_max_attempts :int
+    websearch_cache_max_rows :int
+
     # DB
     db_echo_truefalse :bool
     db_pool_size :int
     db_max_overflow :int
+    async_db_pool_size :int
+    async_db_max_overflow :int
+
+    # Cache constants
+    snapshot_cache_max_bytes :int
+    embedding_cache_size :int
+
+    # Search constants
+    embed_model_name :str
+    search_index_dim :int
 
 
     def __init__(self):
@@ -108,10 +152,54 @@ class Constants:
         self.ollama_max_queue = int(os.getenv('OLLAMA_MAX_QUEUE', '100'))
         self.ollama_num_parallel = int(os.getenv('OLLAMA_NUM_PARALLEL', '10'))
 
+        # LLM router
+        self.llm_model_refresh_sec = int(os.getenv('LLM_MODEL_REFRESH_SEC', '300'))
+        self.llm_discover_timeout_sec = float(os.getenv('LLM_DISCOVER_TIMEOUT_SEC', '5'))
+        self.exchange_rate_ttl_sec = int(os.getenv('EXCHANGE_RATE_TTL_SEC', str(6 * 3600)))
+        self.llm_timeout_sec = float(os.getenv('LLM_TIMEOUT_SEC', '300'))
+        self.llm_max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '100'))
+        self.llm_retry_max = int(os.getenv('LLM_RETRY_MAX', '5'))
+        self.llm_retry_base_sec = float(os.getenv('LLM_RETRY_BASE_SEC', '0.5'))
+        self.llm_retry_max_sec = float(os.getenv('LLM_RETRY_MAX_SEC', '30'))
+        self.llm_breaker_threshold = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+        self.llm_breaker_cooldown_sec = float(os.getenv('LLM_BREAKER_COOLDOWN_SEC', '30'))
+        self.openai_rpm = int(os.getenv('OPENAI_RPM', '500'))
+        self.openai_tpm = int(os.getenv('OPENAI_TPM', '200000'))
+        self.llm_singleflight = os.getenv('LLM_SINGLEFLIGHT', 'True').lower() in ('true', '1', 'yes', 'on')
+        self.llm_stream_max_tokens = int(os.getenv('LLM_STREAM_MAX_TOKENS', '4096'))
+        self.llm_output_reserve_tokens = int(os.getenv('LLM_OUTPUT_RESERVE_TOKENS', '512'))
+        self.tokenizer_dir = os.getenv('TOKENIZER_DIR', './tokenizers')
+
+        # Reference expansion (웹검색 확장)
+        self.websearch_providers = os.getenv('WEBSEARCH_PROVIDERS', 'naver,google_pse')
+        self.naver_search_rate_per_sec = float(os.getenv('NAVER_SEARCH_RATE_PER_SEC', '10'))
+        self.naver_search_burst = int(os.getenv('NAVER_SEARCH_BURST', '10'))
+        self.naver_search_daily_quota = int(os.getenv('NAVER_SEARCH_DAILY_QUOTA', '25000'))
+        self.google_pse_rate_per_sec = float(os.getenv('GOOGLE_PSE_RATE_PER_SEC', '1'))
+        self.google_pse_daily_quota = int(os.getenv('GOOGLE_PSE_DAILY_QUOTA', '100'))
+        self.local_search_fixture_path = os.getenv('LOCAL_SEARCH_FIXTURE_PATH', '')
+        self.local_search_latency_ms = float(os.getenv('LOCAL_SEARCH_LATENCY_MS', '0'))
+        self.websearch_pool_size = int(os.getenv('WEBSEARCH_POOL_SIZE', '8'))
+        self.reference_concept_parallel = int(os.getenv('REFERENCE_CONCEPT_PARALLEL', '32'))
+        self.websearch_cache_ttl_sec = int(os.getenv('WEBSEARCH_CACHE_TTL_SEC', str(7 * 24 * 3600)))
+        self.reference_fresh_sec = int(os.getenv('REFERENCE_FRESH_SEC', str(30 * 24 * 3600)))
+        self.reference_max_attempts = int(os.getenv('REFERENCE_MAX_ATTEMPTS', '3'))
+        self.websearch_cache_max_rows = int(os.getenv('WEBSEARCH_CACHE_MAX_ROWS', '100000'))
+
         # DB
         self.db_echo_truefalse = os.getenv('DB_ECHO_TRUEFALSE', 'False').lower() in ('true', '1', 'yes', 'on')
         self.db_pool_size = int(os.getenv('DB_POOL_SIZE', '50'))
         self.db_max_overflow = int(os.getenv('DB_MAX_OVERFLOW', '0'))
+        self.async_db_pool_size = int(os.getenv('ASYNC_DB_POOL_SIZE', '20'))
+        self.async_db_max_overflow = int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '0'))
+
+        # Cache
+        self.snapshot_cache_max_bytes = int(os.getenv('SNAPSHOT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+        self.embedding_cache_size = int(os.getenv('EMBEDDING_CACHE_SIZE', '10000'))
+
+        # Search
+        self.embed_model_name = os.getenv('EMBED_MODEL_NAME', 'text-embedding-3-small')
+        self.search_index_dim = int(os.getenv('SEARCH_INDEX_DIM', '1536'))
 
     def _load_dotenv_if_exists(self):
         """
@@ -0,0 +1,50 @@
+import threading
+import numpy as np
+from cachetools import LRUCache
+from common.system.constants import Constants
+
+
+class EmbeddingCache:
+    """
+    검색어 임베딩을 (모델 이름, 정규화한 검색어) 키로 보관하는 LRU 싱글톤
+
+    - 같은 검색어나 자동완성처럼 반복되는 검색어는 임베딩 API를 다시 호출하지 않는다
+    - 항목 수는 EMBEDDING_CACHE_SIZE를 넘지 않도록 오래 안 쓴 항목부터 버린다
+    """
+    _instance = None
+
+    def __init__(self):
+        if EmbeddingCache._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            EmbeddingCache._instance = self
+            self.lock = threading.Lock()
+            self.entries = LRUCache(maxsize=Constants.get_instance().embedding_cache_size)
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def get_instance():
+        if EmbeddingCache._instance is None:
+            EmbeddingCache()
+        return EmbeddingCache._instance
+
+    def get(self, model_name: str, query: str) -> np.ndarray:
+        with self.lock:
+            embedding = self.entries.get((model_name, normalize_query(query)))
+            if embedding is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return embedding
+
+    def put(self, model_name: str, query: str, embedding):
+        with self.lock:
+            self.entries[(model_name, normalize_query(query))] = np.asarray(embedding, dtype=np.float32)
+
+
+def normalize_query(query: str) -> str:
+    """
+    앞뒤 공백을 없애고 연속된 공백을 하나로 줄여 같은 검색어가 같은 키가 되도록 한다
+    """
+    return ' '.join(query.split())
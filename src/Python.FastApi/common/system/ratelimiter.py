@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    토큰 버킷 방식의 호출 속도 제한기 (스레드 안전)
+
+    - 초당 rate개씩 토큰이 채워지고, 최대 capacity개까지 쌓인다
+    - acquire는 토큰이 생길 때까지 호출한 스레드를 재운다
+    - 외부 API 쿼터(예: 네이버 검색 API 초당 호출 수)를 넘지 않도록 호출 전에 사용한다
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        토큰을 가져갈 수 있으면 가져가고 0을, 없으면 토큰이 생길 때까지 남은 시간(초)을 반환한다
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """
+        acquire의 비동기 버전, 스레드 대신 이벤트 루프에서 기다린다
+        """
+        if tokens > self.capacity:
+            raise ValueError('tokens must not exceed capacity')
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            await asyncio.sleep(wait)
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """
+        토큰을 tokens개 가져간다
+        - timeout(초) 안에 가져가지 못하면 False를 반환한다, None이면 가져갈 때까지 기다린다
+        """
+        if tokens > self.capacity:
+            raise ValueError('tokens must not exceed capacity')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        토큰을 미리 빼고 (음수가 될 수 있다) 다시 양수가 될 때까지 기다려야 할 시간(초)을 반환한다
+        - 기다리는 호출들이 잠금 없이 순서대로 간격을 두고 실행되도록 할 때 쓴다
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+    def set_rate(self, rate: float):
+        """
+        충전 속도를 바꾼다 (쌓인 토큰은 그대로)
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = float(rate)
+
+    def limit(self, tokens: float):
+        """
+        쌓인 토큰이 tokens보다 많으면 tokens로 줄인다 (서버가 알려준 남은 양에 맞출 때)
+        """
+        with self.lock:
+            self.tokens = min(self.tokens, tokens)
@@ -0,0 +1,83 @@
+import threading
+import zlib
+from cachetools import LRUCache
+from common.system.constants import Constants
+
+
+class SnapshotCache:
+    """
+    그래프 버전별로 직렬화된 응답 (본문 bytes, 헤더 dict)을 메모리에 보관하는 싱글톤
+
+    - 현재 버전의 항목만 보관하며, 더 새로운 버전이 들어오면 이전 버전 항목을 모두 버린다
+    - 전체 크기는 SNAPSHOT_CACHE_MAX_BYTES를 넘지 않도록 오래 안 쓴 항목부터 버린다
+    """
+    _instance = None
+
+    def __init__(self):
+        if SnapshotCache._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            SnapshotCache._instance = self
+            self.lock = threading.Lock()
+            self.version = None
+            self.entries = LRUCache(maxsize=Constants.get_instance().snapshot_cache_max_bytes,
+                                    getsizeof=lambda entry: len(entry[0]))
+
+    @staticmethod
+    def get_instance():
+        if SnapshotCache._instance is None:
+            SnapshotCache()
+        return SnapshotCache._instance
+
+    def get(self, version: int, key: str) -> tuple[bytes, dict]:
+        with self.lock:
+            if version != self.version:
+                return None
+            return self.entries.get(key)
+
+    def put(self, version: int, key: str, body: bytes, headers: dict = None):
+        with self.lock:
+            if self.version is not None and version < self.version:
+                return # 이미 더 새로운 버전이 있으면 보관하지 않는다
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            if len(body) <= self.entries.maxsize:
+                self.entries[key] = (body, headers or {})
+
+    def cache_chunks(self, version: int, key: str, chunks, headers: dict = None):
+        """
+        청크를 내보내는 그대로 버퍼에 이어 쓰고(tee), 끝까지 보낸 경우에만 캐시에 넣는다
+        - 버퍼가 캐시 최대 크기(SNAPSHOT_CACHE_MAX_BYTES)를 넘거나 더 새로운 버전이 들어오면
+          모은 것을 버리고 청크만 내보낸다 (보관하지 못할 본문을 끝까지 메모리에 쥐고 있지 않는다)
+        """
+        buffer = bytearray()
+        for chunk in chunks:
+            if buffer is not None:
+                if len(buffer) + len(chunk) > self.entries.maxsize or self.is_outdated(version):
+                    buffer = None
+                else:
+                    buffer += chunk
+            yield chunk
+        if buffer is not None:
+            self.put(version, key, bytes(buffer), headers)
+
+    def is_outdated(self, version: int) -> bool:
+        with self.lock:
+            return self.version is not None and version < self.version
+
+def make_etag(version: int, key: str) -> str:
+    """
+    그래프 버전과 요청 키(경로, 파라미터)로 ETag를 만든다
+    """
+    return f'"g{version}-{zlib.crc32(key.encode("utf-8")):08x}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match 헤더에 etag가 있는지 확인한다 (약한 비교, '*' 허용)
+    """
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(',')]
+    return '*' in candidates or etag in [c[2:] if c.startswith('W/') else c for c in candidates]
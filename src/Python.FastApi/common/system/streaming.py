@@ -0,0 +1,86 @@
+import io
+import json
+import itertools
+import pyarrow as pa
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# 줄바꿈/공백 없는 직렬화기 (C 가속 인코더를 재사용)
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def ndjson_chunks(rows, batch_size: int = 1000):
+    """
+    dict 이터레이터를 NDJSON(한 줄에 JSON 객체 하나) 바이트 청크로 바꾼다
+    - batch_size개의 행을 모아 한 번에 내보내 쓰기 횟수를 줄인다
+    """
+    buffer = []
+    for row in rows:
+        buffer.append(_encoder.encode(row))
+        if len(buffer) >= batch_size:
+            yield ('\n'.join(buffer) + '\n').encode('utf-8')
+            buffer = []
+    if buffer:
+        yield ('\n'.join(buffer) + '\n').encode('utf-8')
+
+
+def json_array_chunks(rows, status: str, message: str, batch_size: int = 1000):
+    """
+    dict 이터레이터를 ResponseDTO 형태({"status", "message", "data": [...]})의 JSON 바이트 청크로 바꾼다
+    - 응답 전체를 메모리에 만들지 않고 data 배열을 batch_size개씩 이어서 내보낸다
+    """
+    yield ('{"status":' + _encoder.encode(status) + ',"message":' + _encoder.encode(message) + ',"data":[').encode('utf-8')
+    buffer = []
+    first = True
+    for row in rows:
+        buffer.append(_encoder.encode(row))
+        if len(buffer) >= batch_size:
+            yield (('' if first else ',') + ','.join(buffer)).encode('utf-8')
+            first = False
+            buffer = []
+    if buffer:
+        yield (('' if first else ',') + ','.join(buffer)).encode('utf-8')
+    yield b']}'
+
+
+def stream_chunks(rows, format: str, status: str = 'success', message: str = 'data selected', batch_size: int = 1000):
+    """
+    format에 맞는 (청크 이터레이터, media_type)을 반환한다
+    - 'ndjson' : NDJSON
+    - 'json' : ResponseDTO 형태의 JSON 배열
+    """
+    if format == 'ndjson':
+        return ndjson_chunks(rows, batch_size), NDJSON_MEDIA_TYPE
+    return json_array_chunks(rows, status, message, batch_size), JSON_MEDIA_TYPE
+
+
+def prime_rows(rows):
+    """
+    이터레이터의 첫 행을 미리 읽어 쿼리 실행 오류를 응답 시작 전에 드러낸다
+    - 첫 행을 다시 앞에 붙인 이터레이터를 반환한다
+    """
+    rows = iter(rows)
+    try:
+        first = next(rows)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], rows)
+
+
+def arrow_ipc_chunks(schema, batches):
+    """
+    pyarrow RecordBatch 이터레이터를 Arrow IPC 스트림 바이트 청크로 바꾼다
+    - 스키마는 첫 배치와 함께 내보내고, 이후 배치마다 한 청크씩 내보낸다
+    - 버퍼는 압축하지 않는다 (UI의 Arrow IPC 리더가 압축 버퍼를 읽지 않는다)
+    """
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, schema)
+    for batch in batches:
+        writer.write_batch(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    writer.close()
+    yield buffer.getvalue()
@@ -0,0 +1,77 @@
+import datetime
+import re
+import threading
+from abc import ABC, abstractmethod
+import httpx
+
+_TAG = re.compile(r'<[^>]+>')
+
+
+class QuotaExceededError(Exception):
+    """
+    검색 제공자의 호출 한도를 넘었을 때 발생한다
+    """
+    pass
+
+
+class BaseSearchProvider(ABC):
+    """
+    공통 웹검색 제공자 인터페이스
+
+    - search는 공유 httpx.AsyncClient로 호출하고, 결과를 {"title", "description", "link"} 목록으로 맞춰 반환한다
+    - 하루 호출 한도(daily_quota)를 넘거나 제공자가 한도 초과(429 등)를 알리면 그날은 더 호출하지 않는다
+    """
+    name: str
+    daily_quota: int
+
+    def __init__(self, name: str, daily_quota: int = 0):
+        self.name = name
+        self.daily_quota = daily_quota # 0이면 제한 없음
+        self.lock = threading.Lock()
+        self.day = datetime.date.today()
+        self.used = 0
+        self.exhausted = False
+
+    @abstractmethod
+    async def search(self, client: httpx.AsyncClient, query: str, num: int) -> list[dict]:
+        pass
+
+    def has_quota(self) -> bool:
+        with self.lock:
+            self.reset_if_new_day()
+            if self.exhausted:
+                return False
+            return self.daily_quota == 0 or self.used < self.daily_quota
+
+    def record_call(self):
+        """
+        호출 한 번을 한도에 반영한다, 남은 한도가 없으면 QuotaExceededError
+        """
+        with self.lock:
+            self.reset_if_new_day()
+            if self.exhausted or (self.daily_quota and self.used >= self.daily_quota):
+                raise QuotaExceededError(f'{self.name} daily quota exceeded')
+            self.used += 1
+
+    def mark_exhausted(self):
+        with self.lock:
+            self.exhausted = True
+
+    def get_quota_status(self) -> dict:
+        with self.lock:
+            self.reset_if_new_day()
+            return {'used': self.used, 'daily_quota': self.daily_quota, 'exhausted': self.exhausted}
+
+    def reset_if_new_day(self):
+        today = datetime.date.today()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+            self.exhausted = False
+
+
+def strip_tags(text: str) -> str:
+    """
+    검색결과 제목/요약의 강조 태그(<b> 등)를 지운다
+    """
+    return _TAG.sub('', text or '')
@@ -0,0 +1,38 @@
+import httpx
+from common.system.ratelimiter import TokenBucket
+from common.websearch.basesearchprovider import BaseSearchProvider, QuotaExceededError, strip_tags
+
+
+class GooglePSEProvider(BaseSearchProvider):
+    """
+    Google Programmable Search Engine (Custom Search JSON API)
+    - 한 번에 최대 10건까지 받을 수 있다
+    - 한도 초과(429, 403 rateLimitExceeded/dailyLimitExceeded)를 받으면 그날은 더 호출하지 않는다
+    """
+    def __init__(self, url: str, api_key: str, cx: str, options: dict,
+                 rate_per_sec: float, burst: int, daily_quota: int):
+        super().__init__('google_pse', daily_quota)
+        self.url = url or 'https://www.googleapis.com/customsearch/v1'
+        self.api_key = api_key
+        self.cx = cx
+        self.max_num = int(options.pop('num', '') or 10)
+        self.options = {k: v for k, v in options.items() if v} # 설정하지 않은 옵션은 보내지 않는다
+        self.bucket = TokenBucket(rate_per_sec, burst)
+
+    async def search(self, client: httpx.AsyncClient, query: str, num: int = 10) -> list[dict]:
+        params = {**self.options, 'key': self.api_key, 'cx': self.cx, 'q': query, 'num': min(max(num, 1), self.max_num, 10)}
+        await self.bucket.acquire_async()
+        self.record_call()
+        response = await client.get(self.url, params=params)
+        if response.status_code == 429 or (response.status_code == 403 and 'LimitExceeded' in response.text):
+            self.mark_exhausted()
+            raise QuotaExceededError('google_pse quota exceeded')
+        response.raise_for_status()
+        return [
+            {
+                'title': strip_tags(item.get('title')),
+                'description': strip_tags(item.get('snippet')),
+                'link': item.get('link', ''),
+            }
+            for item in response.json().get('items', [])
+        ]
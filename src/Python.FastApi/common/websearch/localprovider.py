@@ -0,0 +1,38 @@
+import asyncio
+import json
+import os
+import zlib
+import httpx
+from common.websearch.basesearchprovider import BaseSearchProvider
+
+
+class LocalSearchProvider(BaseSearchProvider):
+    """
+    외부 API 없이 동작하는 검색 제공자 (오프라인 벤치마크, 부하 테스트용)
+    - fixture_path의 JSON({"검색어": [{"title", "description", "link"}, ...]})에 있는 검색어는 그 결과를 반환한다
+    - 없는 검색어는 검색어로부터 항상 같은 결과를 만들어 반환한다
+    - latency_ms만큼 기다렸다가 반환하여 네트워크 지연을 흉내낸다
+    """
+    def __init__(self, fixture_path: str = '', latency_ms: float = 0):
+        super().__init__('local', 0)
+        self.latency_sec = latency_ms / 1000
+        self.fixtures = {}
+        if fixture_path and os.path.exists(fixture_path):
+            with open(fixture_path, 'r', encoding='utf-8') as f:
+                self.fixtures = {' '.join(k.lower().split()): v for k, v in json.load(f).items()}
+
+    async def search(self, client: httpx.AsyncClient, query: str, num: int = 10) -> list[dict]:
+        if self.latency_sec:
+            await asyncio.sleep(self.latency_sec)
+        key = ' '.join(query.lower().split())
+        if key in self.fixtures:
+            return self.fixtures[key][:num]
+        seed = zlib.crc32(key.encode('utf-8'))
+        return [
+            {
+                'title': f'{query} 문서 {i + 1}',
+                'description': f'{query}에 대한 로컬 검색결과 {i + 1} ({(seed + i) % 997})',
+                'link': f'local://{seed:08x}/{i + 1}',
+            }
+            for i in range(num)
+        ]
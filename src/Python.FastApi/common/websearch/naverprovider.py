@@ -0,0 +1,56 @@
+import asyncio
+import httpx
+from common.system.ratelimiter import TokenBucket
+from common.websearch.basesearchprovider import BaseSearchProvider, QuotaExceededError, strip_tags
+
+
+class NaverSearchProvider(BaseSearchProvider):
+    """
+    네이버 웹문서 검색 API (https://openapi.naver.com/v1/search/webkr.json)
+    - 초당 호출 수는 토큰 버킷으로 제한하고, 429를 받으면 잠시 기다렸다가 다시 호출한다
+    - 한도 초과 응답(010)이 오면 그날은 더 호출하지 않는다
+    """
+    def __init__(self, url: str, client_id: str, client_secret: str,
+                 rate_per_sec: float, burst: int, daily_quota: int, max_retries: int = 3):
+        super().__init__('naver', daily_quota)
+        self.url = url
+        self.headers = {
+            'X-Naver-Client-Id': client_id,
+            'X-Naver-Client-Secret': client_secret,
+        }
+        self.bucket = TokenBucket(rate_per_sec, burst)
+        self.max_retries = max_retries
+
+    async def search(self, client: httpx.AsyncClient, query: str, num: int = 10) -> list[dict]:
+        # NAVER_WEBKR_URL은 'query='로 끝나는 형태이므로 나머지 파라미터는 params로 붙인다
+        url = self.url.split('?')[0]
+        params = {'query': query, 'display': min(max(num, 1), 100)}
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire_async()
+            self.record_call()
+            response = await client.get(url, params=params, headers=self.headers)
+            if response.status_code == 429:
+                if error_code(response) == '010': # 일일 한도 초과
+                    self.mark_exhausted()
+                    raise QuotaExceededError('naver daily quota exceeded')
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+                print(f"LOG-ERROR : 429 in naver search, retry {attempt + 1}/{self.max_retries}")
+                await asyncio.sleep(2 ** attempt)
+                continue
+            response.raise_for_status()
+            return [
+                {
+                    'title': strip_tags(item.get('title')),
+                    'description': strip_tags(item.get('description')),
+                    'link': item.get('link', ''),
+                }
+                for item in response.json().get('items', [])
+            ]
+
+
+def error_code(response: httpx.Response) -> str:
+    try:
+        return response.json().get('errorCode')
+    except ValueError:
+        return None
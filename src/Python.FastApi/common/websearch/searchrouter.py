@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import httpx
+from common.system.constants import Constants
+from common.websearch.basesearchprovider import BaseSearchProvider, QuotaExceededError
+from common.websearch.naverprovider import NaverSearchProvider
+from common.websearch.googlepseprovider import GooglePSEProvider
+from common.websearch.localprovider import LocalSearchProvider
+
+
+class SearchRouter:
+    """
+    설정된 웹검색 제공자를 모아 요청에 맞는 제공자로 검색하는 싱글톤
+
+    - 모든 검색은 전용 이벤트 루프 스레드에서 하나의 httpx.AsyncClient(연결 재사용)로 실행한다
+    - 스레드에서는 search, 이벤트 루프에서는 search_async로 호출한다
+    - provider
+      - 제공자 이름 ('naver', 'google_pse', 'local') : 그 제공자로 검색
+      - 'auto' : WEBSEARCH_PROVIDERS 순서대로 한도가 남은 첫 제공자로 검색
+      - 'all' : 한도가 남은 WEBSEARCH_PROVIDERS 제공자 모두에 동시에 검색하고 결과를 번갈아 합친다 (링크 중복 제거)
+    - 반환 : {"provider": 검색한 제공자(쉼표로 구분), "items": [{"title", "description", "link"}, ...]}
+    """
+    _instance = None
+
+    def __init__(self):
+        if SearchRouter._instance is not None:
+            raise Exception("This class is a singleton!")
+        else:
+            SearchRouter._instance = self
+            self.constants = Constants.get_instance()
+            self.providers = self.spawn_providers()
+            self.priority = [name.strip() for name in self.constants.websearch_providers.split(',')
+                             if name.strip() in self.providers]
+            self.client = None
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, daemon=True, name='websearch-loop').start()
+
+    @staticmethod
+    def get_instance():
+        if SearchRouter._instance is None:
+            SearchRouter()
+        return SearchRouter._instance
+
+    def spawn_providers(self) -> dict[str, BaseSearchProvider]:
+        """
+        인증정보가 설정된 제공자만 만든다 (local은 항상 사용 가능)
+        """
+        constants = self.constants
+        providers = {}
+        if constants.naver_client_id and constants.naver_client_secret:
+            providers['naver'] = NaverSearchProvider(
+                url = constants.naver_webkr_url,
+                client_id = constants.naver_client_id,
+                client_secret = constants.naver_client_secret,
+                rate_per_sec = constants.naver_search_rate_per_sec,
+                burst = constants.naver_search_burst,
+                daily_quota = constants.naver_search_daily_quota
+            )
+        if constants.google_pse_api_key and constants.google_pse_cx:
+            providers['google_pse'] = GooglePSEProvider(
+                url = constants.google_pse_api_url,
+                api_key = constants.google_pse_api_key,
+                cx = constants.google_pse_cx,
+                options = {
+                    'dateRestrict': constants.google_pse_datarestict,
+                    'filter': constants.google_pse_filter,
+                    'hl': constants.google_pse_h1,
+                    'num': constants.google_pse_num,
+                    'safe': constants.google_pse_safe,
+                },
+                rate_per_sec = constants.google_pse_rate_per_sec,
+                burst = max(1, int(constants.google_pse_rate_per_sec)),
+                daily_quota = constants.google_pse_daily_quota
+            )
+        providers['local'] = LocalSearchProvider(
+            fixture_path = constants.local_search_fixture_path,
+            latency_ms = constants.local_search_latency_ms
+        )
+        return providers
+
+    def search(self, query: str, provider: str = 'naver', num: int = 10, timeout: float = None) -> dict:
+        """
+        search_async를 검색 전용 이벤트 루프에서 실행하고 결과를 기다린다 (스레드에서 호출)
+        """
+        return asyncio.run_coroutine_threadsafe(self.search_async(query, provider, num), self.loop).result(timeout)
+
+    async def search_async(self, query: str, provider: str = 'naver', num: int = 10) -> dict:
+        if provider == 'auto':
+            for name in self.priority:
+                if not self.providers[name].has_quota():
+                    continue
+                try:
+                    return await self.search_one(name, query, num)
+                except QuotaExceededError:
+                    continue
+            raise QuotaExceededError('no search provider has quota left')
+
+        if provider == 'all':
+            names = [name for name in self.priority if self.providers[name].has_quota()]
+            if not names:
+                raise QuotaExceededError('no search provider has quota left')
+            results = await asyncio.gather(*[self.search_one(name, query, num) for name in names], return_exceptions=True)
+            succeeded = [result for result in results if not isinstance(result, Exception)]
+            if not succeeded:
+                raise results[0]
+            return {
+                'provider': ','.join(result['provider'] for result in succeeded),
+                'items': merge_items([result['items'] for result in succeeded], num)
+            }
+
+        if provider not in self.providers:
+            raise Exception(f'search provider is not available: {provider}')
+        return await self.search_one(provider, query, num)
+
+    async def search_one(self, name: str, query: str, num: int) -> dict:
+        items = await self.providers[name].search(await self.get_client(), query, num)
+        return {'provider': name, 'items': items}
+
+    async def get_client(self) -> httpx.AsyncClient:
+        # 검색 전용 이벤트 루프 안에서만 만들고 쓴다
+        if self.client is None:
+            pool_size = self.constants.websearch_pool_size
+            self.client = httpx.AsyncClient(
+                timeout = 10.0,
+                limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+        return self.client
+
+    def get_providers_status(self) -> dict:
+        """
+        제공자별 오늘 사용량과 한도
+        """
+        return {name: provider.get_quota_status() for name, provider in self.providers.items()}
+
+
+def merge_items(item_lists: list[list[dict]], num: int) -> list[dict]:
+    """
+    제공자별 결과를 한 건씩 번갈아 합치고 같은 링크는 한 번만 남긴다, 최대 num건
+    """
+    merged = []
+    seen = set()
+    for rank in range(max(len(items) for items in item_lists)):
+        for items in item_lists:
+            if rank >= len(items):
+                continue
+            key = items[rank]['link'] or id(items[rank])
+            if key not in seen:
+                seen.add(key)
+                merged.append(items[rank])
+    return merged[:num]
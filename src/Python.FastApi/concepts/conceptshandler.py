@@ -1,11 +1,12 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, Body
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Body, Header
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from starlette import status as status
 from concepts.conceptsservice import ConceptsService
 from concepts.conceptsmodel import Concepts
 from common.models.responseDTO import ResponseDTO
-import json
+from common.system.streaming import stream_chunks, prime_rows
+from common.system.snapshotcache import SnapshotCache, make_etag, etag_matches
 
 router = APIRouter(
     prefix="/api/concepts",
@@ -42,6 +43,75 @@ def create_concepts(
         content = ResponseDTO( status='error', message='internal server error', data=data )
         return JSONResponse(status_code=500, content=dict(content))
 
+@router.put(
+    "/source-target-count",
+    summary="모든 주요개념의 출처와 대상 개수를 다시 계산한다",
+    description="tb_networks를 한 번 집계하여 tb_concepts의 source_num, target_num을 일괄 갱신한다. (/{concept_id} 보다 먼저 등록해야 한다)",
+    responses={
+        status.HTTP_200_OK:                    {"description":"데이터 수정 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data updated", "data": "10 rows updated" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 수정 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def update_concepts_source_target_count_all(
+    service: Annotated[ConceptsService, Depends(get_service)] = get_service
+) -> ResponseDTO:
+    result = service.update_concepts_source_target_count_all()
+    if result['status'] == 'success':
+        data = result['data'] #success message string
+        content = ResponseDTO( status='success', message='data updated', data=data )
+        return JSONResponse(status_code=200, content=dict(content))
+    else:
+        data = result['data'] #error message string
+        content = ResponseDTO( status='error', message='internal server error', data=data )
+        return JSONResponse(status_code=500, content=dict(content))
+
+@router.post(
+    "/layout",
+    summary="모든 주요개념의 2차원 배치 좌표를 계산한다",
+    description="임베딩을 PCA 또는 무작위 투영으로 2차원에 배치하여 tb_concepts의 pos_x, pos_y에 저장한다. refine이 \"true\"이면 연결된 이웃 쪽으로 좌표를 보정한다. 투영식은 tb_layouts에 저장되어 이후 추가되는 개념의 배치에 사용된다.",
+    responses={
+        status.HTTP_200_OK:                    {"description":"배치 계산 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data updated", "data": { "method": "pca", "concept_count": 1000, "refined": True, "elapsed_sec": 1.2 } } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"배치 계산 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def update_concepts_layout(
+    options: Annotated[dict, Body(..., examples=[
+        { "method": "pca", "refine": "true", "refine_alpha": 0.5, "refine_iterations": 10 },
+        { "method": "random", "seed": 0 } ])],
+    service: Annotated[ConceptsService, Depends(get_service)] = get_service
+) -> ResponseDTO:
+    result = service.update_concepts_layout(options)
+    if result['status'] == 'success':
+        data = result['data'] #layout summary dict
+        content = ResponseDTO( status='success', message='data updated', data=data )
+        return JSONResponse(status_code=200, content=dict(content))
+    else:
+        data = result['data'] #error message string
+        content = ResponseDTO( status='error', message='internal server error', data=data )
+        return JSONResponse(status_code=500, content=dict(content))
+
+@router.post(
+    "/layout/incremental",
+    summary="좌표가 없는 주요개념만 배치한다",
+    description="가장 최근에 계산한 배치(tb_layouts) 기준으로 pos_x, pos_y가 없는 개념만 좌표를 계산한다. 개념 저장/수정시 자동으로 수행된다.",
+    responses={
+        status.HTTP_200_OK:                    {"description":"배치 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data updated", "data": "10 rows placed" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"배치 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def update_concepts_layout_incremental(
+    service: Annotated[ConceptsService, Depends(get_service)] = get_service
+) -> ResponseDTO:
+    result = service.update_concepts_layout_incremental()
+    if result['status'] == 'success':
+        data = result['data'] #success message string
+        content = ResponseDTO( status='success', message='data updated', data=data )
+        return JSONResponse(status_code=200, content=dict(content))
+    else:
+        data = result['data'] #error message string
+        content = ResponseDTO( status='error', message='internal server error', data=data )
+        return JSONResponse(status_code=500, content=dict(content))
+
 @router.put(
     "/{concept_id}",
     summary="주요개념을 DB에서 수정한다",
@@ -98,23 +168,163 @@ def update_concept_source_target_count(
 
 @router.get(
     "",
-    summary="주요개념 전체를 조회한다",
-    description="tb_concepts에서 데이터를 조회한다.",
+    summary="주요개념 목록을 조회한다",
+    description="tb_concepts에서 데이터를 조회한다. fields로 컬럼을 고르고(기본값은 embedding 제외), after_id/limit으로 id 순 키셋 페이지네이션을 한다. 다음 페이지가 있으면 X-Next-After-Id 헤더로 커서를 알려준다. 그래프 버전 기반 ETag를 돌려주며, If-None-Match가 같으면 304를 반환한다.",
     responses={
         status.HTTP_200_OK:                    {"description":"데이터 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": "..." } } }, "model": ResponseDTO},
-        status.HTTP_400_BAD_REQUEST:           {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "essential input missing", "data": "..." } } }, "model": ResponseDTO},
+        status.HTTP_304_NOT_MODIFIED:          {"description":"변경 없음 (If-None-Match 일치)"},
+        status.HTTP_400_BAD_REQUEST:           {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "unknown fields: xxx" } } }, "model": ResponseDTO},
         status.HTTP_422_UNPROCESSABLE_ENTITY:  {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "..." } } }, "model": ResponseDTO},
         status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
     },
 )
 def get_concepts(
+    fields: str = None,
+    after_id: int = 0,
+    limit: int = None,
+    if_none_match: Annotated[str, Header()] = None,
+    service: Annotated[ConceptsService, Depends(get_service)] = get_service
+) -> ResponseDTO:
+    field_list, invalid = parse_fields(fields)
+    if limit is not None and limit < 1:
+        invalid = 'limit'
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    try:
+        version = service.read_graph_version()
+    except Exception as e:
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+        return JSONResponse(status_code=500, content=dict(content))
+    key = f"/api/concepts?fields={','.join(field_list)}&after_id={after_id}&limit={limit}"
+    etag = make_etag(version, key)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    cache = SnapshotCache.get_instance()
+    cached = cache.get(version, key)
+    if cached is not None:
+        body, headers = cached
+        return Response(content=body, media_type='application/json', headers=headers)
+
+    result = service.get_concepts_page(field_list, after_id, limit)
+    if result['status'] == 'success':
+        data = result['data'] #concepts dict list
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if limit is not None and len(data) == limit:
+            headers['X-Next-After-Id'] = str(data[-1]['id'])
+        content = ResponseDTO( status='success', message='data selected', data=data )
+        response = JSONResponse(status_code=200, content=dict(content), headers=headers)
+        cache.put(version, key, response.body, headers)
+        return response
+    else:
+        data = result['data'] #error message string
+        content = ResponseDTO( status='error', message='internal server error', data=data )
+        return JSONResponse(status_code=500, content=dict(content))
+
+@router.get(
+    "/stream",
+    summary="주요개념 목록을 스트리밍으로 조회한다",
+    description="서버측 커서로 tb_concepts를 id 순으로 읽으며 바로 내보낸다. format=ndjson이면 한 줄에 개념 하나(application/x-ndjson), format=json이면 ResponseDTO 형태의 JSON을 청크 단위로 보낸다. 테이블 크기와 관계없이 메모리 사용량이 일정하다.",
+    responses={
+        status.HTTP_200_OK:                    {"description":"데이터 조회 성공", "content":{ "application/x-ndjson": { "example": "{\"id\":1,\"title\":\"...\"}\n{\"id\":2,\"title\":\"...\"}\n" }, "application/json": { "example": { "status": "success", "message": "data selected", "data": "..." } } }},
+        status.HTTP_400_BAD_REQUEST:           {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "unknown fields: xxx" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_concepts_stream(
+    fields: str = None,
+    format: str = 'ndjson',
+    service: Annotated[ConceptsService, Depends(get_service)] = get_service
+):
+    field_list, invalid = parse_fields(fields)
+    if format not in ('ndjson', 'json'):
+        invalid = 'format'
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    try:
+        rows = prime_rows(service.get_concepts_stream(field_list))
+    except Exception as e:
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+        return JSONResponse(status_code=500, content=dict(content))
+    chunks, media_type = stream_chunks(rows, format)
+    return StreamingResponse(chunks, media_type=media_type)
+
+MAX_SPATIAL_NODES = 10000
+MAX_VIEWPORT_GRID = 256
+MAX_VIEWPORT_PER_CELL = 100
+
+@router.get(
+    "/spatial/rect",
+    summary="배치 좌표가 사각형 영역 안에 있는 주요개념을 조회한다",
+    description="pos_x, pos_y가 (x1, y1)-(x2, y2) 안에 있는 개념을 연결 수가 많은 순서로 limit개까지 조회한다. fields로 컬럼을 고른다. limit을 넘으면 truncated가 true이다.",
+    responses={
+        status.HTTP_200_OK:                    {"description":"데이터 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": { "nodes": [], "truncated": False } } } }, "model": ResponseDTO},
+        status.HTTP_400_BAD_REQUEST:           {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "limit" } } }, "model": ResponseDTO},
+        status.HTTP_422_UNPROCESSABLE_ENTITY:  {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "..." } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+async def get_concepts_in_rect(
+    x1: float,
+    y1: float,
+    x2: float,
+    y2: float,
+    fields: str = None,
+    limit: int = 1000,
+    service: Annotated[ConceptsService, Depends(get_service)] = get_service
+) -> ResponseDTO:
+    field_list, invalid = parse_fields(fields)
+    if limit < 1 or limit > MAX_SPATIAL_NODES:
+        invalid = 'limit'
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    result = await service.get_concepts_in_rect_async(field_list, x1, y1, x2, y2, limit)
+    if result['status'] == 'success':
+        data = result['data'] #nodes, truncated
+        content = ResponseDTO( status='success', message='data selected', data=data )
+        return JSONResponse(status_code=200, content=dict(content))
+    else:
+        data = result['data'] #error message string
+        content = ResponseDTO( status='error', message='internal server error', data=data )
+        return JSONResponse(status_code=500, content=dict(content))
+
+@router.get(
+    "/spatial/viewport",
+    summary="화면 영역의 주요개념을 상세수준(level of detail)에 맞게 샘플링한다",
+    description="화면 영역 (x1, y1)-(x2, y2)를 grid x grid 칸으로 나누고, 칸마다 연결 수가 많은 개념을 per_cell개씩 조회한다. 축소된 화면에서는 연결 수가 많은 개념 위주로 보이고, 확대할수록 더 많은 개념이 보인다.",
+    responses={
+        status.HTTP_200_OK:                    {"description":"데이터 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": { "nodes": [], "cell_width": 0.1, "cell_height": 0.1 } } } }, "model": ResponseDTO},
+        status.HTTP_400_BAD_REQUEST:           {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "grid" } } }, "model": ResponseDTO},
+        status.HTTP_422_UNPROCESSABLE_ENTITY:  {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "..." } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+async def get_concepts_viewport_sample(
+    x1: float,
+    y1: float,
+    x2: float,
+    y2: float,
+    grid: int = 32,
+    per_cell: int = 1,
     service: Annotated[ConceptsService, Depends(get_service)] = get_service
 ) -> ResponseDTO:
-    result = service.get_concepts()
+    invalid = ''
+    if grid < 1 or grid > MAX_VIEWPORT_GRID:
+        invalid = 'grid'
+    elif per_cell < 1 or per_cell > MAX_VIEWPORT_PER_CELL:
+        invalid = 'per_cell'
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    result = await service.get_concepts_viewport_sample_async(x1, y1, x2, y2, grid, per_cell)
     if result['status'] == 'success':
-        data = result['data'] #concepts object list
-        data = [o.to_dict() for o in data]
-        data = json.loads(json.dumps(data, default=str))
+        data = result['data'] #nodes, cell size
         content = ResponseDTO( status='success', message='data selected', data=data )
         return JSONResponse(status_code=200, content=dict(content))
     else:
@@ -122,6 +332,54 @@ def get_concepts(
         content = ResponseDTO( status='error', message='internal server error', data=data )
         return JSONResponse(status_code=500, content=dict(content))
 
+MAX_SEARCH_RESULTS = 100
+MAX_SEARCH_QUERY_LENGTH = 1000
+MAX_SEARCH_EF = 1000
+
+@router.get(
+    "/search",
+    summary="검색어와 가까운 주요개념을 조회한다 (임베딩, 전문검색, 혼합)",
+    description="검색어 q와 가까운 개념을 limit개 조회한다. mode=vector(기본값)는 q를 EMBED_MODEL_NAME 모델로 임베딩하여 코사인 거리 순으로, score는 1 - 코사인 거리이다. mode=text는 제목/키워드/개요 전문검색(websearch 문법) 순으로, score는 ts_rank_cd이다. mode=hybrid는 두 순위를 reciprocal rank fusion으로 합치며, vector_rank와 text_rank가 함께 붙는다. 검색어 임베딩은 LRU 캐시에 보관한다. ef_search로 HNSW 탐색 폭을 조정할 수 있다. Server-Timing 헤더로 임베딩/DB 소요시간을 알려준다.",
+    responses={
+        status.HTTP_200_OK:                    {"description":"데이터 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": [ { "id": 1, "title": "개념명", "score": 0.82 } ] } } }, "model": ResponseDTO},
+        status.HTTP_400_BAD_REQUEST:           {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "q" } } }, "model": ResponseDTO},
+        status.HTTP_422_UNPROCESSABLE_ENTITY:  {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "..." } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+async def search_concepts(
+    q: str,
+    fields: str = None,
+    limit: int = 10,
+    ef_search: int = None,
+    mode: str = 'vector',
+    service: Annotated[ConceptsService, Depends(get_service)] = get_service
+) -> ResponseDTO:
+    field_list, invalid = parse_fields(fields)
+    if not q.strip() or len(q) > MAX_SEARCH_QUERY_LENGTH:
+        invalid = 'q'
+    elif mode not in ('vector', 'text', 'hybrid'):
+        invalid = 'mode'
+    elif limit < 1 or limit > MAX_SEARCH_RESULTS:
+        invalid = 'limit'
+    elif ef_search is not None and (ef_search < limit or ef_search > MAX_SEARCH_EF):
+        invalid = 'ef_search'
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    result = await service.search_concepts_async(q, field_list, limit, ef_search, mode)
+    timing = server_timing(result['timing'])
+    headers = {"Server-Timing": timing} if timing else None
+    if result['status'] == 'success':
+        data = result['data'] #concepts with score
+        content = ResponseDTO( status='success', message='data selected', data=data )
+        return JSONResponse(status_code=200, content=dict(content), headers=headers)
+    else:
+        data = result['data'] #error message string
+        content = ResponseDTO( status='error', message='internal server error', data=data )
+        return JSONResponse(status_code=500, content=dict(content), headers=headers)
+
 @router.get(
     "/{concept_id:int}",
     summary="id를 기준으로 특정 주요개념을 조회한다",
@@ -134,15 +392,14 @@ def get_concepts(
         status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
     },
 )
-def get_concept(
+async def get_concept(
     concept_id: int,
     service: Annotated[ConceptsService, Depends(get_service)] = get_service
 ) -> ResponseDTO:
-    result = service.get_concept(concept_id)
+    result = await service.get_concept_async(concept_id)
     if result['status'] == 'success':
         data = result['data'] #concepts object
         data = data.to_dict()
-        data = json.loads(json.dumps(data, default=str))
         content = ResponseDTO( status='success', message='data selected', data=data )
         return JSONResponse(status_code=200, content=dict(content))
     else:
@@ -161,10 +418,10 @@ def get_concept(
         status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
     },
 )
-def get_concepts_count(
+async def get_concepts_count(
     service: Annotated[ConceptsService, Depends(get_service)] = get_service
 ) -> ResponseDTO:
-    result = service.get_concepts_count()
+    result = await service.get_concepts_count_async()
     if result['status'] == 'success':
         data = result['data'] #concepts count integer
         content = ResponseDTO( status='success', message='data selected', data=str(data) )
@@ -195,4 +452,30 @@ def delete_concepts_all(
     else:
         data = result['data']
         content = ResponseDTO( status='error', message='internal server error', data=data )
-        return JSONResponse(status_code=500, content=dict(content))
\ No newline at end of file
+        return JSONResponse(status_code=500, content=dict(content))
+
+def server_timing(timing: dict) -> str:
+    """
+    단계별 소요시간 dict를 Server-Timing 헤더 값으로 바꾼다
+    - embed_cache는 embed 항목의 설명(hit/miss)으로 붙인다
+    """
+    metrics = []
+    if 'embed' in timing:
+        metrics.append(f'embed;dur={timing["embed"]:.1f};desc="{timing.get("embed_cache", "")}"')
+    if 'db' in timing:
+        metrics.append(f'db;dur={timing["db"]:.1f}')
+    return ', '.join(metrics)
+
+def parse_fields(fields: str) -> tuple[list[str], str]:
+    """
+    쉼표로 구분된 fields 파라미터를 컬럼 목록으로 바꾼다.
+    - 비어있으면 embedding을 뺀 기본 컬럼을 사용한다
+    - 알 수 없는 컬럼이 있으면 오류 메시지를 함께 반환한다
+    """
+    if not fields:
+        return Concepts.DEFAULT_FIELDS[:], ''
+    field_list = list(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    unknown = [f for f in field_list if f not in Concepts.FIELDS]
+    if unknown:
+        return field_list, 'unknown fields: ' + ', '.join(unknown)
+    return field_list, ''
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime
-from sqlalchemy.orm import declarative_base
+import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Float, inspect
+from sqlalchemy.orm import declarative_base, deferred
 
 from pgvector.sqlalchemy import Vector
 
@@ -18,24 +19,39 @@ class Concepts(Base):
     target_num  = Column(Integer)
     create_time = Column(DateTime)
     update_time = Column(DateTime)
-    embedding   = Column(Vector(4096))
+    embedding   = deferred(Column(Vector(4096))) # 필요한 쿼리에서만 undefer로 읽는다
+    pos_x       = Column(Float) # 서버에서 계산한 2차원 배치 좌표 (tb_layouts 기준)
+    pos_y       = Column(Float)
+
+    '''
+    목록 조회시 선택할 수 있는 컬럼, 기본값에서는 임베딩을 제외한다
+    '''
+    FIELDS = ["id", "title", "keywords", "category", "summary", "status", "data_name",
+              "source_num", "target_num", "create_time", "update_time", "embedding",
+              "pos_x", "pos_y"]
+    DEFAULT_FIELDS = [f for f in FIELDS if f != "embedding"]
 
     def to_dict(self):
+        unloaded = inspect(self).unloaded
         return {
-            "id": self.id,
-            "title": self.title,
-            "keywords": self.keywords,
-            "category": self.category,
-            "summary": self.summary,
-            "status": self.status,
-            "data_name": self.data_name,
-            "source_num": self.source_num,
-            "target_num": self.target_num,
-            "create_time": self.create_time.isoformat() if self.create_time else None,
-            "update_time": self.update_time.isoformat() if self.update_time else None,
-            "embedding": self.getEmbeddingString()
+            field: Concepts.serialize_field(field, getattr(self, field))
+            for field in Concepts.FIELDS if field not in unloaded
         }
 
+    @staticmethod
+    def serialize_field(field: str, value):
+        """
+        컬럼 값을 JSON 응답에 맞는 값으로 바꾼다
+        - 일시는 isoformat 문자열, 임베딩은 쉼표로 이은 문자열
+        """
+        if value is None:
+            return None
+        if field == "embedding":
+            return ','.join(map(str, value))
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return value
+
     def __repr__(self):
         return str(self.to_dict())
 
@@ -43,4 +59,4 @@ class Concepts(Base):
         return str(self.to_dict())
 
     def getEmbeddingString(self):
-        return ','.join(map(str,self.embedding))
\ No newline at end of file
+        return ','.join(map(str,self.embedding))
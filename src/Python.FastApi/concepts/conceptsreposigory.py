@@ -1,8 +1,31 @@
 from typing import Tuple
 import traceback
-from sqlalchemy import insert, select, update, desc
+from sqlalchemy import insert, select, update, desc, text, func
+from sqlalchemy.orm import undefer
 from common.db.db import DB
+from common.db.asyncdb import AsyncDB
+from common.db.graphversion import GraphVersionRepository
 from concepts.conceptsmodel import Concepts
+from common.algebra.projection import layout_position_sql
+
+# reciprocal rank fusion 상수, 순위가 낮은 후보의 점수 차이를 완만하게 한다 (search_tb_concepts_hybrid_async)
+RRF_K = 60
+
+# 화면 영역을 칸으로 나눠 칸마다 연결 수 상위 개념만 남기는 쿼리 (read_tb_concepts_viewport_sample)
+VIEWPORT_SAMPLE_SQL = text("""
+    SELECT id, title, category, pos_x, pos_y, source_num, target_num
+      FROM (
+            SELECT id, title, category, pos_x, pos_y, source_num, target_num,
+                   row_number() OVER (
+                       PARTITION BY floor((pos_x - :x1) / :cell_w), floor((pos_y - :y1) / :cell_h)
+                       ORDER BY (source_num + target_num) DESC NULLS LAST, id
+                   ) AS cell_rank
+              FROM tb_concepts
+             WHERE point(pos_x, pos_y) <@ box(point(:x1, :y1), point(:x2, :y2))
+           ) AS s
+     WHERE cell_rank <= :per_cell
+     ORDER BY (source_num + target_num) DESC NULLS LAST, id
+""")
 
 class ConceptsRepository():
     """
@@ -10,21 +33,26 @@ class ConceptsRepository():
     """
     def __init__(self):
         self.db = DB.get_instance()
+        self.async_db = AsyncDB.get_instance()
+        self.graph_version = GraphVersionRepository()
         pass
 
     def create_tb_concepts_list(self, keyconcept_list: list[dict]) -> Tuple[int, str]:
         """
         tb_concepts 테이블에 딕셔너리 리스트를 입력받아 모두 저장한다
+        - 저장한 개념만 같은 트랜잭션에서 가장 최근 배치 기준으로 좌표를 계산한다
         """
         rtncd = 900
         rtnmsg = '실패'
 
         session = self.db.get_session()
         try:
-            session.execute(insert(Concepts), keyconcept_list)
+            concept_ids = session.scalars(insert(Concepts).returning(Concepts.id), keyconcept_list).all()
+            self.update_tb_concepts_positions_with_layout(session, concept_ids)
+            session.commit()
+            self.graph_version.increase_tb_graph_version(session)
             rtncd = 200
             rtnmsg = '성공'
-            session.commit()
         except Exception as e:
             traceback.print_exc()
             session.rollback()
@@ -37,11 +65,11 @@ class ConceptsRepository():
 
     def read_tb_concepts_all(self) -> list[Concepts]:
         """
-        tb_concepts 테이블의 모든 데이터를 읽어온다
+        tb_concepts 테이블의 모든 데이터를 읽어온다 (임베딩 포함)
         """
         session = self.db.get_session()
         try:
-            query = session.query(Concepts)
+            query = session.query(Concepts).options(undefer(Concepts.embedding))
             rtndata = query.all()
         except Exception as e:
             traceback.print_exc()
@@ -50,13 +78,157 @@ class ConceptsRepository():
             session.close()
         return rtndata
 
+    def read_tb_concepts_page(self, fields: list[str], after_id: int, limit: int) -> list[dict]:
+        """
+        tb_concepts 테이블에서 fields 컬럼만 id 순으로 읽어온다 (키셋 페이지네이션)
+        - after_id보다 큰 id부터 limit개를 읽는다, limit이 None이면 끝까지 읽는다
+        - 선택하지 않은 컬럼(특히 embedding)은 DB에서 읽지도 않는다
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(self.select_tb_concepts_page(fields, after_id, limit))
+            rtndata = self.rows_to_dicts(fields, result)
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    def select_tb_concepts_page(self, fields: list[str], after_id: int, limit: int):
+        columns = [getattr(Concepts, field) for field in fields]
+        query = select(*columns).where(Concepts.id > after_id).order_by(Concepts.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    def rows_to_dicts(self, fields: list[str], rows) -> list[dict]:
+        return [
+            {field: Concepts.serialize_field(field, value) for field, value in zip(fields, row)}
+            for row in rows
+        ]
+
+    def read_tb_concepts_stream(self, fields: list[str], batch_size: int = 1000):
+        """
+        tb_concepts 테이블에서 fields 컬럼만 서버측 커서로 batch_size개씩 읽어오는 제너레이터
+        - 행마다 응답용 dict를 만들며, 전체 결과를 메모리에 올리지 않는다
+        """
+        session = self.db.get_session()
+        try:
+            columns = [getattr(Concepts, field) for field in fields]
+            result = session.execute(select(*columns)
+                                     .order_by(Concepts.id)
+                                     .execution_options(yield_per=batch_size))
+            for row in result:
+                yield {field: Concepts.serialize_field(field, value) for field, value in zip(fields, row)}
+        finally:
+            session.close()
+
+    def read_tb_concepts_in_rect(self, fields: list[str], x1: float, y1: float, x2: float, y2: float, limit: int) -> list[dict]:
+        """
+        배치 좌표가 사각형 (x1, y1)-(x2, y2) 안에 있는 개념을 연결 수가 많은 순서로 limit개까지 읽어온다
+        - point(pos_x, pos_y) GiST 인덱스를 사용한다
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(self.select_tb_concepts_in_rect(fields, limit), {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2})
+            rtndata = self.rows_to_dicts(fields, result)
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    async def read_tb_concepts_in_rect_async(self, fields: list[str], x1: float, y1: float, x2: float, y2: float, limit: int) -> list[dict]:
+        """
+        read_tb_concepts_in_rect의 비동기(asyncpg) 버전
+        """
+        session = self.async_db.get_session()
+        rtndata = []
+        try:
+            result = await session.execute(self.select_tb_concepts_in_rect(fields, limit), {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2})
+            rtndata = self.rows_to_dicts(fields, result)
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            await session.close()
+        return rtndata
+
+    def select_tb_concepts_in_rect(self, fields: list[str], limit: int):
+        columns = [getattr(Concepts, field) for field in fields]
+        return (select(*columns)
+                .where(text("point(pos_x, pos_y) <@ box(point(:x1, :y1), point(:x2, :y2))"))
+                .order_by(desc(Concepts.source_num + Concepts.target_num).nulls_last(), Concepts.id)
+                .limit(limit))
+
+    def read_tb_concepts_viewport_sample(self, x1: float, y1: float, x2: float, y2: float, grid: int, per_cell: int) -> list[dict]:
+        """
+        화면 영역을 grid x grid 칸으로 나누고, 칸마다 연결 수가 많은 개념을 per_cell개씩 읽어온다 (level of detail)
+        - 축소된 화면일수록 칸이 넓어지므로 연결 수가 많은 개념 위주로 남는다
+        - 각 행은 id, title, category, pos_x, pos_y, source_num, target_num을 가진다
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(VIEWPORT_SAMPLE_SQL, self.viewport_sample_params(x1, y1, x2, y2, grid, per_cell))
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    async def read_tb_concepts_viewport_sample_async(self, x1: float, y1: float, x2: float, y2: float, grid: int, per_cell: int) -> list[dict]:
+        """
+        read_tb_concepts_viewport_sample의 비동기(asyncpg) 버전
+        """
+        session = self.async_db.get_session()
+        rtndata = []
+        try:
+            result = await session.execute(VIEWPORT_SAMPLE_SQL, self.viewport_sample_params(x1, y1, x2, y2, grid, per_cell))
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            await session.close()
+        return rtndata
+
+    def viewport_sample_params(self, x1: float, y1: float, x2: float, y2: float, grid: int, per_cell: int) -> dict:
+        return {
+            'x1': float(x1), 'y1': float(y1), 'x2': float(x2), 'y2': float(y2),
+            'cell_w': max((x2 - x1) / grid, 1e-12),
+            'cell_h': max((y2 - y1) / grid, 1e-12),
+            'per_cell': per_cell,
+        }
+
+    def read_tb_concepts_id_embedding_all(self, batch_size: int = 1000):
+        """
+        tb_concepts 테이블의 (id, embedding)만 서버측 커서로 batch_size개씩 읽어오는 제너레이터
+        - ORM 객체를 만들지 않고, 전체 결과를 한 번에 메모리에 올리지 않는다
+        """
+        session = self.db.get_session()
+        try:
+            result = session.execute(select(Concepts.id, Concepts.embedding)
+                                     .order_by(Concepts.id)
+                                     .execution_options(yield_per=batch_size))
+            for row in result:
+                yield row.id, row.embedding
+        finally:
+            session.close()
+
     def read_tb_concepts_by_id(self, concpet_id : str) -> Concepts:
         """
         tb_concepts 테이블에서 concpet_id로 데이터를 읽어온다
         """
         session = self.db.get_session()
         try:
-            query = session.query(Concepts).filter(Concepts.id == concpet_id)
+            query = session.query(Concepts).options(undefer(Concepts.embedding)).filter(Concepts.id == concpet_id)
             rtndata = query.first()
         except Exception as e:
             traceback.print_exc()
@@ -79,13 +251,28 @@ class ConceptsRepository():
             session.close()
         return rtndata
 
+    async def read_tb_concepts_count_async(self) -> int:
+        """
+        read_tb_concepts_count의 비동기(asyncpg) 버전
+        """
+        session = self.async_db.get_session()
+        try:
+            rtndata = (await session.execute(select(func.count()).select_from(Concepts))).scalar()
+        except Exception as e:
+            traceback.print_exc()
+            rtndata = 0
+        finally:
+            await session.close()
+        return rtndata
+
     def read_tb_concepts_top_by_source_target_num(self, limit: int) -> list[Concepts]:
         """
         tb_concepts 테이블에서 상위 limit개의 데이터를 읽어온다
         """
         session = self.db.get_session()
         try:
-            query = session.query(Concepts).order_by(desc(Concepts.source_num+Concepts.target_num)).limit(limit)
+            # idx_tb_concepts_degree 표현식 인덱스와 정렬조건(DESC NULLS LAST)을 맞춰야 인덱스를 탄다
+            query = session.query(Concepts).order_by(desc(Concepts.source_num+Concepts.target_num).nulls_last()).limit(limit)
             rtndata = query.all()
         except Exception as e:
             traceback.print_exc()
@@ -100,7 +287,7 @@ class ConceptsRepository():
         """
         session = self.db.get_session()
         try:
-            query = session.query(Concepts).filter(Concepts.id == concept_id)
+            query = session.query(Concepts).options(undefer(Concepts.embedding)).filter(Concepts.id == concept_id)
             rtndata = query.first()
         except Exception as e:
             traceback.print_exc()
@@ -109,6 +296,132 @@ class ConceptsRepository():
         return rtndata
 
 
+    async def read_tb_concepts_by_id_async(self, concept_id : int) -> Concepts:
+        """
+        read_tb_concepts_by_id의 비동기(asyncpg) 버전
+        """
+        session = self.async_db.get_session()
+        rtndata = None
+        try:
+            result = await session.execute(select(Concepts).options(undefer(Concepts.embedding)).where(Concepts.id == concept_id))
+            rtndata = result.scalars().first()
+        except Exception as e:
+            traceback.print_exc()
+        finally:
+            await session.close()
+        return rtndata
+
+    async def search_tb_concepts_by_embedding_async(self, fields: list[str], embedding: str, dim: int, index_dim: int,
+                                                    limit: int, ef_search: int = None) -> list[dict]:
+        """
+        tb_concepts 테이블에서 검색어 임베딩과 코사인 거리가 가까운 개념을 limit개 읽어온다
+        - embedding : '[v1,v2,...]' 형식의 검색어 임베딩, dim은 그 차원
+        - dim이 index_dim 이하이면 idx_tb_concepts_embedding_hnsw와 같은 표현식으로 정렬하여 HNSW 인덱스를 탄다
+        - dim이 더 크면 인덱스 없이 전체 vector(4096)로 정확 검색한다
+        - 각 행은 fields 컬럼과 score(1 - 코사인 거리)를 가진다
+        """
+        distance = self.embedding_distance_sql(dim, index_dim)
+        query = text(f"""
+            SELECT {self.concepts_columns_sql(fields)}, 1 - ({distance}) AS score
+              FROM tb_concepts c
+             WHERE embedding IS NOT NULL
+             ORDER BY {distance}
+             LIMIT :limit
+        """)
+        return await self.execute_search_async(query, fields, {'embedding': embedding, 'limit': limit}, ef_search)
+
+    async def search_tb_concepts_by_text_async(self, fields: list[str], query_text: str, limit: int) -> list[dict]:
+        """
+        tb_concepts 테이블에서 제목/키워드/개요 전문검색(search_tsv)에 걸리는 개념을 ts_rank_cd 순으로 limit개 읽어온다
+        - query_text는 websearch_to_tsquery 문법("구절", OR, -제외)을 따른다
+        - 각 행은 fields 컬럼과 score(ts_rank_cd)를 가진다
+        """
+        query = text(f"""
+            SELECT {self.concepts_columns_sql(fields)}, ts_rank_cd(c.search_tsv, q) AS score
+              FROM tb_concepts c, websearch_to_tsquery('simple', :query_text) q
+             WHERE c.search_tsv @@ q
+             ORDER BY score DESC, c.id
+             LIMIT :limit
+        """)
+        return await self.execute_search_async(query, fields, {'query_text': query_text, 'limit': limit})
+
+    async def search_tb_concepts_hybrid_async(self, fields: list[str], query_text: str, embedding: str, dim: int, index_dim: int,
+                                              limit: int, candidates: int, ef_search: int = None) -> list[dict]:
+        """
+        전문검색 순위와 임베딩 검색 순위를 reciprocal rank fusion으로 합쳐 limit개 읽어온다 (한 번의 쿼리)
+        - 각 검색에서 candidates개씩 후보를 뽑고, score = Σ 1 / (RRF_K + 순위)로 정렬한다
+        - 한쪽 검색에만 걸린 개념은 그쪽 점수만 받는다
+        - 각 행은 fields 컬럼과 score, vector_rank, text_rank(걸리지 않았으면 None)를 가진다
+        """
+        distance = self.embedding_distance_sql(dim, index_dim)
+        query = text(f"""
+            WITH vec AS (
+                SELECT id, row_number() OVER (ORDER BY distance, id) AS rank
+                  FROM (SELECT id, {distance} AS distance
+                          FROM tb_concepts
+                         WHERE embedding IS NOT NULL
+                         ORDER BY distance
+                         LIMIT :candidates) AS v
+            ), txt AS (
+                SELECT id, row_number() OVER (ORDER BY score DESC, id) AS rank
+                  FROM (SELECT c.id, ts_rank_cd(c.search_tsv, q) AS score
+                          FROM tb_concepts c, websearch_to_tsquery('simple', :query_text) q
+                         WHERE c.search_tsv @@ q
+                         ORDER BY score DESC, c.id
+                         LIMIT :candidates) AS t
+            ), fused AS (
+                SELECT coalesce(vec.id, txt.id) AS id,
+                       coalesce(1.0 / (:rrf_k + vec.rank), 0) + coalesce(1.0 / (:rrf_k + txt.rank), 0) AS score,
+                       vec.rank AS vector_rank,
+                       txt.rank AS text_rank
+                  FROM vec FULL OUTER JOIN txt ON vec.id = txt.id
+            )
+            SELECT {self.concepts_columns_sql(fields)}, f.score, f.vector_rank, f.text_rank
+              FROM fused f
+              JOIN tb_concepts c ON c.id = f.id
+             ORDER BY f.score DESC, c.id
+             LIMIT :limit
+        """)
+        params = {'embedding': embedding, 'query_text': query_text, 'limit': limit, 'candidates': candidates, 'rrf_k': RRF_K}
+        return await self.execute_search_async(query, fields, params, ef_search, extra=('vector_rank', 'text_rank'))
+
+    async def execute_search_async(self, query, fields: list[str], params: dict, ef_search: int = None, extra: tuple = ()) -> list[dict]:
+        session = self.async_db.get_session()
+        rtndata = []
+        try:
+            if ef_search is not None:
+                # 트랜잭션 안에서만 유효하도록 설정한다 (SET LOCAL)
+                await session.execute(text("SELECT set_config('hnsw.ef_search', :ef_search, true)"), {'ef_search': str(ef_search)})
+            result = await session.execute(query, params)
+            rtndata = [
+                {
+                    **{field: Concepts.serialize_field(field, row._mapping[field]) for field in fields},
+                    'score': float(row.score),
+                    **{key: row._mapping[key] for key in extra},
+                }
+                for row in result
+            ]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            await session.close()
+        return rtndata
+
+    def embedding_distance_sql(self, dim: int, index_dim: int) -> str:
+        """
+        검색어 임베딩(:embedding)과의 코사인 거리 SQL 표현식
+        - dim이 index_dim 이하이면 idx_tb_concepts_embedding_hnsw와 같은 표현식을 쓴다
+          (인덱스 표현식과 글자 그대로 같은 상수를 써야 하므로 바인드 파라미터로 넘기지 않는다)
+        - 더 크면 전체 vector(4096)로 비교한다 (인덱스 없음)
+        """
+        if dim <= index_dim:
+            return f"(((embedding::real[])[1:{int(index_dim)}])::vector({int(index_dim)})) <=> CAST(:embedding AS vector({int(index_dim)}))"
+        return f"embedding <=> CAST(:embedding AS vector({Concepts.__table__.c.embedding.type.dim}))"
+
+    def concepts_columns_sql(self, fields: list[str]) -> str:
+        return ', '.join('c.' + Concepts.__table__.c[field].name for field in fields)
+
     def read_tb_concepts_nearest_by_embedding(self, source : Concepts, operation: str, limit: int) -> list[Concepts]:
         """
         tb_concepts 테이블에서 source와 가장 가까운 개념을 operation에 따라 limit개수만큼 읽어온다
@@ -118,27 +431,27 @@ class ConceptsRepository():
 
         try:
             if operation == 'cosine_distance':
-                query_result = session.scalars(select(Concepts)
+                query_result = session.scalars(select(Concepts).options(undefer(Concepts.embedding))
                                                .filter(Concepts.id != source.id)
                                                .order_by(Concepts.embedding.cosine_distance(source.embedding))
                                                .limit(limit))
             elif operation == 'max_inner_product':
-                query_result = session.scalars(select(Concepts)
+                query_result = session.scalars(select(Concepts).options(undefer(Concepts.embedding))
                                                .filter(Concepts.id != source.id)
                                                .order_by(Concepts.embedding.max_inner_product(source.embedding))
                                                .limit(limit))
             elif operation == 'l1_distance':
-                query_result = session.scalars(select(Concepts)
+                query_result = session.scalars(select(Concepts).options(undefer(Concepts.embedding))
                                                .filter(Concepts.id != source.id)
                                                .order_by(Concepts.embedding.l1_distance(source.embedding))
                                                .limit(limit))
             #elif operation == 'hamming_distance':
-            #    query_result = session.scalars(select(Concepts)
+            #    query_result = session.scalars(select(Concepts).options(undefer(Concepts.embedding))
             #                                   .filter(Concepts.id != source.id)
             #                                   .order_by(Concepts.embedding.hamming_distance(source.embedding))
             #                                   .limit(limit))
             #elif operation == 'jaccard_distance':
-            #    query_result = session.scalars(select(Concepts)
+            #    query_result = session.scalars(select(Concepts).options(undefer(Concepts.embedding))
             #                                   .filter(Concepts.id != source.id)
             #                                   .order_by(Concepts.embedding.jaccard_distance(source.embedding))
             #                                   .limit(limit))
@@ -174,10 +487,14 @@ class ConceptsRepository():
                                 target_num = concepts['target_num'],
                                 create_time = concepts['create_time'],
                                 update_time = concepts['update_time'],
-                                embedding = concepts['embedding']
+                                embedding = concepts['embedding'],
+                                pos_x = None, # 임베딩이 바뀌었을 수 있으므로 다시 배치한다
+                                pos_y = None
                             )
             )
+            self.update_tb_concepts_positions_with_layout(session, [concepts['id']])
             session.commit()
+            self.graph_version.increase_tb_graph_version(session)
             rtncd = 200
             rtnmsg = '성공'
         except Exception as e:
@@ -205,6 +522,7 @@ class ConceptsRepository():
                                     target_num = target_num)
             )
             session.commit()
+            self.graph_version.increase_tb_graph_version(session)
             rtncd = 200
             rtnmsg = '성공'
         except Exception as e:
@@ -217,6 +535,166 @@ class ConceptsRepository():
         return rtncd, rtnmsg
 
 
+    def update_tb_concepts_source_target_count_all(self) -> Tuple[int, str, int]:
+        """
+        tb_networks 집계 한 번으로 모든 개념의 source_num, target_num을 다시 계산한다
+        - 값이 바뀐 행만 갱신하고, 갱신된 행 수를 함께 반환한다
+        """
+        rtncd = 900
+        rtnmsg = '실패'
+        rtncount = 0
+        session = self.db.get_session()
+        try:
+            result = session.execute(text("""
+                UPDATE tb_concepts AS c
+                   SET source_num = d.source_num,
+                       target_num = d.target_num
+                  FROM (
+                        SELECT c2.id,
+                               coalesce(s.cnt, 0) AS source_num,
+                               coalesce(t.cnt, 0) AS target_num
+                          FROM tb_concepts c2
+                          LEFT JOIN (SELECT source_concept_id AS id, count(*) AS cnt
+                                       FROM tb_networks GROUP BY source_concept_id) s ON s.id = c2.id
+                          LEFT JOIN (SELECT target_concept_id AS id, count(*) AS cnt
+                                       FROM tb_networks GROUP BY target_concept_id) t ON t.id = c2.id
+                       ) AS d
+                 WHERE c.id = d.id
+                   AND (c.source_num IS DISTINCT FROM d.source_num
+                        OR c.target_num IS DISTINCT FROM d.target_num)
+            """))
+            rtncount = result.rowcount
+            session.commit()
+            if rtncount > 0:
+                self.graph_version.increase_tb_graph_version(session)
+            rtncd = 200
+            rtnmsg = '성공'
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+            rtncd = 900
+            rtnmsg = '실패'
+        finally:
+            session.close()
+        return rtncd, rtnmsg, rtncount
+
+
+    def read_tb_concepts_projection(self, axis_x: str, axis_y: str) -> list[tuple[int, float, float]]:
+        """
+        정규화한 임베딩을 두 축(vector 문자열)에 투영한 값을 DB에서 계산하여 (id, x, y)로 읽어온다
+        - 임베딩이 없거나 0벡터인 개념은 제외한다
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(text("""
+                SELECT id,
+                       -(embedding <#> CAST(:axis_x AS vector)) / vector_norm(embedding),
+                       -(embedding <#> CAST(:axis_y AS vector)) / vector_norm(embedding)
+                  FROM tb_concepts
+                 WHERE embedding IS NOT NULL
+                   AND vector_norm(embedding) > 0
+                 ORDER BY id
+            """), {'axis_x': axis_x, 'axis_y': axis_y})
+            rtndata = [(row[0], row[1], row[2]) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    def replace_tb_concepts_layout(self, layout: dict, concept_ids: list[int], xs: list[float], ys: list[float],
+                                   batch_size: int = 10000) -> Tuple[int, str]:
+        """
+        새 배치를 tb_layouts에 저장하고 모든 개념의 pos_x, pos_y를 한 트랜잭션에서 교체한다
+        - layout : method, axis_x, axis_y (vector 문자열), offset_x, offset_y, scale
+        - 좌표 계산 중에 추가되어 concept_ids에 없는 개념은 새 배치 기준으로 바로 배치한다
+        """
+        rtncd = 900
+        rtnmsg = '실패'
+        session = self.db.get_session()
+        try:
+            session.execute(text("""
+                INSERT INTO tb_layouts (method, axis_x, axis_y, offset_x, offset_y, scale)
+                VALUES (:method, CAST(:axis_x AS vector), CAST(:axis_y AS vector), :offset_x, :offset_y, :scale)
+            """), layout)
+            session.execute(text("UPDATE tb_concepts SET pos_x = NULL, pos_y = NULL WHERE pos_x IS NOT NULL OR pos_y IS NOT NULL"))
+            for start in range(0, len(concept_ids), batch_size):
+                session.execute(text("""
+                    UPDATE tb_concepts AS c
+                       SET pos_x = v.pos_x,
+                           pos_y = v.pos_y
+                      FROM (
+                            SELECT unnest(CAST(:ids AS integer[])) AS id,
+                                   unnest(CAST(:xs AS real[]))     AS pos_x,
+                                   unnest(CAST(:ys AS real[]))     AS pos_y
+                           ) AS v
+                     WHERE c.id = v.id
+                """), {
+                    'ids': concept_ids[start:start + batch_size],
+                    'xs': xs[start:start + batch_size],
+                    'ys': ys[start:start + batch_size],
+                })
+            self.update_tb_concepts_positions_with_layout(session)
+            session.commit()
+            self.graph_version.increase_tb_graph_version(session)
+            rtncd = 200
+            rtnmsg = '성공'
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+            rtncd = 900
+            rtnmsg = '실패'
+        finally:
+            session.close()
+        return rtncd, rtnmsg
+
+    def update_tb_concepts_positions_incremental(self, concept_ids: list[int] = None) -> Tuple[int, str, int]:
+        """
+        가장 최근 배치(tb_layouts)로 아직 좌표가 없는 개념만 배치한다 (전체 배치를 다시 계산하지 않음)
+        - concept_ids를 주면 좌표 유무와 관계없이 해당 개념만 다시 배치한다
+        - 배치된 행 수를 함께 반환하며, 저장된 배치가 없으면 0이다
+        """
+        rtncd = 900
+        rtnmsg = '실패'
+        rtncount = 0
+        session = self.db.get_session()
+        try:
+            rtncount = self.update_tb_concepts_positions_with_layout(session, concept_ids)
+            session.commit()
+            if rtncount > 0:
+                self.graph_version.increase_tb_graph_version(session)
+            rtncd = 200
+            rtnmsg = '성공'
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+            rtncd = 900
+            rtnmsg = '실패'
+        finally:
+            session.close()
+        return rtncd, rtnmsg, rtncount
+
+    def update_tb_concepts_positions_with_layout(self, session, concept_ids: list[int] = None) -> int:
+        """
+        가장 최근 배치의 투영식을 SQL로 적용하여 pos_x, pos_y를 계산한다
+        - concept_ids를 주면 그 개념만, 없으면 좌표가 없는 개념(idx_tb_concepts_unplaced)만 계산한다
+        - 임베딩이 없거나 0벡터인 개념도 정해진 자리에 놓아 다시 찾지 않도록 한다
+        - 호출한 쪽의 세션/트랜잭션을 그대로 사용한다
+        """
+        if concept_ids is not None and len(concept_ids) == 0:
+            return 0
+        condition = 'c.id = ANY(CAST(:ids AS integer[]))' if concept_ids is not None else 'c.pos_x IS NULL'
+        result = session.execute(text(f"""
+            UPDATE tb_concepts AS c
+               SET pos_x = {layout_position_sql('c.embedding', 'l.axis_x', 'l.offset_x', 'l.scale')},
+                   pos_y = {layout_position_sql('c.embedding', 'l.axis_y', 'l.offset_y', 'l.scale')}
+              FROM (SELECT * FROM tb_layouts ORDER BY id DESC LIMIT 1) AS l
+             WHERE {condition}
+        """), {'ids': list(concept_ids or [])})
+        return result.rowcount
+
     def read_tb_concepts_all_idonly(self) -> list[int]:
         """
         tb_concepts 테이블의 모든 id를 읽어온다
@@ -242,6 +720,7 @@ class ConceptsRepository():
         try:
             session.query(Concepts).delete()
             session.commit()
+            self.graph_version.increase_tb_graph_version(session)
             rtncd = 200
             rtnmsg = '성공'
         except Exception as e:
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import pika
 import json
@@ -7,22 +8,34 @@ import time
 from typing import Tuple
 from common.datasources.markdown import Markdown
 from concepts.conceptsreposigory import ConceptsRepository
+from concepts.conceptsmodel import Concepts
+from networks.networksrepository import NetworksRepository
+from common.algebra.projection import random_projection_axes, fit_pca_axes, smooth_by_neighbors, to_vector_literal, DEFAULT_PROJECTION_SEED
+import numpy as np
 from common.system.constants import Constants
+from common.system.embeddingcache import EmbeddingCache
+from common.llmroute.llmrouter import LLMRouter
 #from networks.networksservice import NetworksService #순환참조 발생으로 각주처리
 
 RABBITMQ_HOST = 'bws_mq'
 QUEUE_NAME = 'extract_dataloader_queue'
 
+# 혼합 검색에서 전문검색/임베딩 검색 각각 뽑을 후보 수 = max(최소 후보 수, limit * 배수)
+SEARCH_HYBRID_MIN_CANDIDATES = 50
+SEARCH_HYBRID_CANDIDATE_FACTOR = 5
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ConceptsService:
     repository : ConceptsRepository
-    llmclients : dict
+    llmroute : LLMRouter
 
     def __init__(self):
         self.repository = ConceptsRepository()
         self.constants = Constants.get_instance()
+        self.embedding_cache = EmbeddingCache.get_instance()
+        self.llmroute = LLMRouter.get_instance()
         threading.Thread(target=self.start_consumer_retry, daemon=True).start() # 별도스레드에서 실행
         pass
 
@@ -70,6 +83,136 @@ class ConceptsService:
 
         return {"status": status, "data": data}
 
+    def update_concepts_source_target_count_all(self) -> dict:
+        status = ''
+        data = ''
+        try:
+            rtncd, rtnmsg, count = self.repository.update_tb_concepts_source_target_count_all()
+            if rtncd != 200:
+                raise Exception(f"source/target count recount failed - {rtnmsg}")
+            status = 'success'
+            data = f'{count} rows updated'
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    def update_concepts_layout(self, options: dict) -> dict:
+        """
+        모든 개념의 2차원 배치 좌표(pos_x, pos_y)를 계산하여 저장한다
+
+        - options
+            - method : 'pca' (주성분 2개, 기본) 또는 'random' (seed로 고정한 무작위 투영)
+            - seed : 무작위 투영 시드 (기본 0)
+            - refine : "true"이면 연결된 이웃 쪽으로 좌표를 끌어당겨 이웃 관계를 보존한다
+            - refine_alpha : 이웃 평균 위치의 반영 비율 (기본 0.5)
+            - refine_iterations : 보정 반복 횟수 (기본 10)
+        - 좌표는 원점 중심, 표준편차 0.5 정도로 맞춘다
+        - 투영식을 tb_layouts에 남기므로 이후 추가되는 개념은 전체를 다시 계산하지 않고 배치된다
+        """
+        status = ''
+        data = ''
+        try:
+            begin_time = time.time()
+            method = options['method'] if 'method' in options else 'pca'
+            seed = int(options['seed']) if 'seed' in options else DEFAULT_PROJECTION_SEED
+            refine = options['refine'] if 'refine' in options else "false"
+            refine_alpha = float(options['refine_alpha']) if 'refine_alpha' in options else 0.5
+            refine_iterations = int(options['refine_iterations']) if 'refine_iterations' in options else 10
+
+            dim = Concepts.__table__.c.embedding.type.dim
+            if method == 'pca':
+                _, axes = fit_pca_axes(self.iter_embedding_batches())
+                axes = np.pad(axes, ((0, 0), (0, dim - axes.shape[1])))
+            elif method == 'random':
+                axes = random_projection_axes(dim, 2, seed)
+            else:
+                raise Exception(f"unknown layout method - {method}")
+            axis_x, axis_y = to_vector_literal(axes[0]), to_vector_literal(axes[1])
+
+            projection = self.repository.read_tb_concepts_projection(axis_x, axis_y)
+            if not projection:
+                raise Exception('no concepts with embedding')
+            concept_ids = [row[0] for row in projection]
+            positions = np.array([(row[1], row[2]) for row in projection], dtype=np.float64)
+            offset = positions.mean(axis=0)
+            spread = positions.std(axis=0).max()
+            scale = 0.5 / spread if spread > 0 else 1.0
+            positions = scale * (positions - offset)
+
+            if refine == "true":
+                row_index = {concept_id: i for i, concept_id in enumerate(concept_ids)}
+                edges = [(row_index[s], row_index[t]) for s, t in NetworksRepository().read_tb_networks_edges_all()
+                         if s in row_index and t in row_index]
+                if edges:
+                    edges = np.array(edges, dtype=np.int64)
+                    positions = smooth_by_neighbors(positions, edges[:, 0], edges[:, 1], refine_alpha, refine_iterations)
+
+            layout = {
+                'method': method,
+                'axis_x': axis_x,
+                'axis_y': axis_y,
+                'offset_x': float(offset[0]),
+                'offset_y': float(offset[1]),
+                'scale': float(scale),
+            }
+            rtncd, rtnmsg = self.repository.replace_tb_concepts_layout(
+                layout, concept_ids, positions[:, 0].tolist(), positions[:, 1].tolist())
+            if rtncd != 200:
+                raise Exception(f"layout save failed - {rtnmsg}")
+            status = 'success'
+            data = {
+                'method': method,
+                'concept_count': len(concept_ids),
+                'refined': refine == "true",
+                'elapsed_sec': time.time() - begin_time
+            }
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    def update_concepts_layout_incremental(self) -> dict:
+        """
+        가장 최근 배치 기준으로 좌표가 없는 개념만 배치한다
+        """
+        status = ''
+        data = ''
+        try:
+            rtncd, rtnmsg, count = self.repository.update_tb_concepts_positions_incremental()
+            if rtncd != 200:
+                raise Exception(f"incremental layout failed - {rtnmsg}")
+            status = 'success'
+            data = f'{count} rows placed'
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    def iter_embedding_batches(self, batch_size: int = 1000):
+        """
+        임베딩을 0 패딩을 뺀 (batch_size, 차원) 행렬 단위로 내보낸다
+        """
+        batch = []
+        for _, embedding in self.repository.read_tb_concepts_id_embedding_all(batch_size):
+            if embedding is None:
+                continue
+            batch.append(np.asarray(embedding, dtype=np.float32))
+            if len(batch) >= batch_size:
+                yield self.strip_padding(batch)
+                batch = []
+        if batch:
+            yield self.strip_padding(batch)
+
+    def strip_padding(self, vectors: list) -> np.ndarray:
+        matrix = np.stack(vectors)
+        nonzero = np.flatnonzero(np.abs(matrix).max(axis=0))
+        dim = int(nonzero[-1]) + 1 if len(nonzero) > 0 else 1
+        return matrix[:, :dim]
+
     def get_concepts(self) -> dict:
         status = ''
         data = ''
@@ -83,6 +226,116 @@ class ConceptsService:
 
         return {"status": status, "data": data}
 
+    def get_concepts_page(self, fields: list[str], after_id: int, limit: int) -> dict:
+        status = ''
+        data = ''
+        try:
+            if 'id' not in fields:
+                fields = ['id'] + fields # 다음 페이지 커서
+            concept_list = self.repository.read_tb_concepts_page(fields, after_id, limit)
+            status = 'success'
+            data = concept_list
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    def get_concepts_stream(self, fields: list[str]):
+        """
+        fields 컬럼만 담은 dict를 id 순으로 하나씩 내보내는 제너레이터를 반환한다
+        """
+        if 'id' not in fields:
+            fields = ['id'] + fields
+        return self.repository.read_tb_concepts_stream(fields)
+
+    def get_concepts_in_rect(self, fields: list[str], x1: float, y1: float, x2: float, y2: float, limit: int) -> dict:
+        status = ''
+        data = ''
+        try:
+            if 'id' not in fields:
+                fields = ['id'] + fields
+            x1, x2 = min(x1, x2), max(x1, x2)
+            y1, y2 = min(y1, y2), max(y1, y2)
+            concept_list = self.repository.read_tb_concepts_in_rect(fields, x1, y1, x2, y2, limit + 1)
+            status = 'success'
+            data = {
+                'nodes': concept_list[:limit],
+                'truncated': len(concept_list) > limit
+            }
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    async def get_concepts_in_rect_async(self, fields: list[str], x1: float, y1: float, x2: float, y2: float, limit: int) -> dict:
+        status = ''
+        data = ''
+        try:
+            if 'id' not in fields:
+                fields = ['id'] + fields
+            x1, x2 = min(x1, x2), max(x1, x2)
+            y1, y2 = min(y1, y2), max(y1, y2)
+            concept_list = await self.repository.read_tb_concepts_in_rect_async(fields, x1, y1, x2, y2, limit + 1)
+            status = 'success'
+            data = {
+                'nodes': concept_list[:limit],
+                'truncated': len(concept_list) > limit
+            }
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    def get_concepts_viewport_sample(self, x1: float, y1: float, x2: float, y2: float, grid: int, per_cell: int) -> dict:
+        """
+        화면 영역의 개념을 칸별로 연결 수 상위 per_cell개씩 샘플링한다
+        """
+        status = ''
+        data = ''
+        try:
+            x1, x2 = min(x1, x2), max(x1, x2)
+            y1, y2 = min(y1, y2), max(y1, y2)
+            concept_list = self.repository.read_tb_concepts_viewport_sample(x1, y1, x2, y2, grid, per_cell)
+            status = 'success'
+            data = {
+                'nodes': concept_list,
+                'cell_width': (x2 - x1) / grid,
+                'cell_height': (y2 - y1) / grid
+            }
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    async def get_concepts_viewport_sample_async(self, x1: float, y1: float, x2: float, y2: float, grid: int, per_cell: int) -> dict:
+        status = ''
+        data = ''
+        try:
+            x1, x2 = min(x1, x2), max(x1, x2)
+            y1, y2 = min(y1, y2), max(y1, y2)
+            concept_list = await self.repository.read_tb_concepts_viewport_sample_async(x1, y1, x2, y2, grid, per_cell)
+            status = 'success'
+            data = {
+                'nodes': concept_list,
+                'cell_width': (x2 - x1) / grid,
+                'cell_height': (y2 - y1) / grid
+            }
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    def read_graph_version(self) -> int:
+        """
+        개념/연결이 바뀔 때마다 올라가는 그래프 버전을 반환한다 (ETag, 응답 캐시 키)
+        """
+        return self.repository.graph_version.read_tb_graph_version()
+
     def get_concept(self, concept_id: int) -> dict:
         status = ''
         data = ''
@@ -96,6 +349,19 @@ class ConceptsService:
 
         return {"status": status, "data": data}
 
+    async def get_concept_async(self, concept_id: int) -> dict:
+        status = ''
+        data = ''
+        try:
+            concept = await self.repository.read_tb_concepts_by_id_async(concept_id)
+            status = 'success'
+            data = concept
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
     def get_concepts_count(self) -> dict:
         status = ''
         data = ''
@@ -109,6 +375,85 @@ class ConceptsService:
 
         return {"status": status, "data": data}
 
+    async def get_concepts_count_async(self) -> dict:
+        status = ''
+        data = ''
+        try:
+            count = await self.repository.read_tb_concepts_count_async()
+            status = 'success'
+            data = count
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data}
+
+    async def search_concepts_async(self, query: str, fields: list[str], limit: int, ef_search: int = None, mode: str = 'vector') -> dict:
+        """
+        검색어와 가까운 개념을 limit개 찾는다
+        - mode
+          - 'vector' : 검색어를 EMBED_MODEL_NAME 모델로 임베딩하여 코사인 거리 순
+          - 'text' : 제목/키워드/개요 전문검색 순 (임베딩 호출 없음)
+          - 'hybrid' : 두 순위를 reciprocal rank fusion으로 합친 순서
+        - 검색어 임베딩은 EmbeddingCache에 보관하므로 같은 검색어는 임베딩 API를 다시 호출하지 않는다
+        - 임베딩 호출은 블로킹이므로 스레드에서 실행한다
+        - timing : 단계별 소요시간(ms)과 임베딩 캐시 적중 여부 (Server-Timing 헤더용)
+        """
+        status = ''
+        data = ''
+        timing = {}
+        try:
+            if mode != 'text':
+                begin_time = time.perf_counter()
+                embedding, timing['embed_cache'] = await self.embed_query_async(query)
+                timing['embed'] = (time.perf_counter() - begin_time) * 1000
+                dim = len(embedding)
+                index_dim = self.constants.search_index_dim
+                target_dim = index_dim if dim <= index_dim else Concepts.__table__.c.embedding.type.dim
+                padded = np.zeros(target_dim, dtype=np.float32)
+                padded[:dim] = embedding[:target_dim]
+
+            begin_time = time.perf_counter()
+            if mode == 'text':
+                data = await self.repository.search_tb_concepts_by_text_async(fields, query, limit)
+            elif mode == 'hybrid':
+                candidates = max(SEARCH_HYBRID_MIN_CANDIDATES, limit * SEARCH_HYBRID_CANDIDATE_FACTOR)
+                data = await self.repository.search_tb_concepts_hybrid_async(
+                    fields, query, to_vector_literal(padded), dim, index_dim, limit, candidates, ef_search)
+            else:
+                data = await self.repository.search_tb_concepts_by_embedding_async(
+                    fields, to_vector_literal(padded), dim, index_dim, limit, ef_search)
+            timing['db'] = (time.perf_counter() - begin_time) * 1000
+            status = 'success'
+        except Exception as e:
+            status = 'error'
+            data = str(e)
+
+        return {"status": status, "data": data, "timing": timing}
+
+    async def embed_query_async(self, query: str) -> tuple[np.ndarray, str]:
+        """
+        검색어 임베딩을 캐시에서 찾고, 없으면 임베딩 API를 호출하여 캐시에 넣는다
+        - return : (임베딩, 'hit' 또는 'miss')
+        """
+        model_name = self.constants.embed_model_name
+        embedding = self.embedding_cache.get(model_name, query)
+        if embedding is not None:
+            return embedding, 'hit'
+        response = await self.get_embed_client().aembed(query, {'priority': 'interactive'}, 'single')
+        if response.status != 100 or response.data is None:
+            raise Exception(f'query embedding failed - {response.message}')
+        embedding = np.asarray(response.data, dtype=np.float32)
+        self.embedding_cache.put(model_name, query, embedding)
+        return embedding, 'miss'
+
+    def get_embed_client(self):
+        model_name = self.constants.embed_model_name
+        try:
+            return self.llmroute.get_client_by_modelname(model_name)
+        except KeyError:
+            raise Exception(f'embedding model is not available: {model_name}')
+
     def read_concepts_nearest_by_embedding(self, concept: dict, operation: str, topn: int) -> list:
         status = ''
         data = ''
@@ -17,9 +17,9 @@ def get_service():
 @router.post(
     "/check-budget",
     summary="데이터에서 주요개념을 추출하는 비용을 추정한다.",
-    description="데이터타입에 따라 데이터소스로부터 데이터를 읽어들인다. 데이터 양에 따라 필요한 토큰 값을 추정한다.",
+    description="데이터타입에 따라 데이터소스로부터 데이터를 읽어들인다. 모델의 토크나이저로 토큰 수를 세어 비용을 추정한다 (토크나이저 파일이 없는 로컬 모델은 어림값). reason_model_name이 auto이면 max_budget(원) 안에서 고른 모델로 추정한다.",
     responses={
-        status.HTTP_200_OK:                    {"description":"데이터 추출 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data extracted", "data": { "reasoning_sum": 1000, "embedding_sum": 1000, } } } }, "model": ResponseDTO},
+        status.HTTP_200_OK:                    {"description":"데이터 추출 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data extracted", "data": { "reasoning_sum": 1000, "embedding_sum": 1000, "reasoning_tokens": 50000, "embedding_tokens": 50000 } } } }, "model": ResponseDTO},
         status.HTTP_400_BAD_REQUEST:           {"description":"데이터 추출 실패", "content":{ "application/json": { "example": { "status": "error", "message": "essential input missing", "data": "datatype" } } }, "model": ResponseDTO},
         status.HTTP_422_UNPROCESSABLE_ENTITY:  {"description":"데이터 추출 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "" } } }, "model": ResponseDTO},
         status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"데이터 추출 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
@@ -64,7 +64,7 @@ def check_budget(
 @router.post(
     "",
     summary="데이터에서 주요개념을 추출한다.",
-    description="데이터타입에 따라 데이터소스로부터 데이터를 읽어들인다. 정해진 프롬프트/포맷에 따라 LLM을 활용해 주요개념을 추출한다. 추출한 데이터는 메시지큐로 발행한다.",
+    description="데이터타입에 따라 데이터소스로부터 데이터를 읽어들인다. 정해진 프롬프트/포맷에 따라 LLM을 활용해 주요개념을 추출한다. 추출한 데이터는 메시지큐로 발행한다. reason_model_name이 auto이면 파일마다 남은 max_budget(원)과 모델별 부하를 보고 모델을 고른다 (로컬 모델 우선, 로컬 모델이 포화되었을 때만 유료 모델).",
     responses={
         status.HTTP_200_OK:                    {"description":"데이터 추출 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data extracted", "data": { "reasoning_sum": 1000, "embedding_sum": 1000, } } } }, "model": ResponseDTO},
         status.HTTP_400_BAD_REQUEST:           {"description":"데이터 추출 실패", "content":{ "application/json": { "example": { "status": "error", "message": "essential input missing", "data": "datatype" } } }, "model": ResponseDTO},
@@ -117,6 +117,28 @@ def extract(
         content = ResponseDTO( status='error', message='data extraction failed', data=str(result['data']) )
         return JSONResponse(status_code=500, content=dict(content))
 
+@router.get(
+    "/llm-status",
+    summary="LLM 모델별 부하와 Ollama 대기열 현황을 조회한다.",
+    description="LLMRouter가 기록한 모델별 진행중 요청 수/응답 시간과, OllamaScheduler의 모델별 처리중/대기 요청 수, 우선순위(interactive, bulk)별 허용/거절/시간초과 수와 평균/최대 대기 시간을 조회한다.",
+    responses={
+        status.HTTP_200_OK:                    {"description":"조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": { "loads": { "gemma2:9b-instruct-q5_K_M": { "inflight": 12, "calls": 340, "latency_ewma": 3.2 } }, "ollama_scheduler": { "gemma2:9b-instruct-q5_K_M": { "slots": 10, "active": 10, "waiting": 2, "max_queue": 100, "priorities": { "interactive": { "admitted": 5, "rejected": 0, "timeouts": 0, "wait_sec_avg": 0.4, "wait_sec_max": 1.1 }, "bulk": { "admitted": 335, "rejected": 0, "timeouts": 0, "wait_sec_avg": 2.8, "wait_sec_max": 9.5 } } } } } } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description":"조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_llm_status(
+    service: Annotated[ExtractService, Depends(get_service)],
+) -> JSONResponse:
+    """
+    LLM 모델별 부하와 Ollama 대기열 현황을 조회한다.
+    """
+    try:
+        content = ResponseDTO( status='success', message='data selected', data=service.read_llm_status() )
+        return JSONResponse(status_code=200, content=dict(content))
+    except Exception as e:
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+        return JSONResponse(status_code=500, content=dict(content))
+
 def check_essential_input(datasourcetype, datasourcepath) -> bool:
     """
     필수 입력값을 확인한다.
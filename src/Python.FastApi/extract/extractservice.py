@@ -1,11 +1,14 @@
+import asyncio
 import pika
 import json
 import traceback
 import datetime
 from common.datasources.markdown import Markdown
-from common.llmroute.llmrouter import LLMRouter
+from common.llmroute.llmrouter import LLMRouter, read_lazy_list_batches, count_lazy_list_tokens
 from common.llmroute.openaiclient import OpenAIClient
 from common.llmroute.ollamaclient import OllamaClient
+from common.llmroute.ollamascheduler import OllamaScheduler
+from common.llmroute.singleflight import SingleFlight
 from common.llmroute.baseclient import BaseClient
 from concepts.conceptsmodel import Concepts
 from common.system.constants import Constants
@@ -17,8 +20,7 @@ QUEUE_NAME = 'extract_dataloader_queue'
 
 class ExtractService:
     def __init__(self):
-        llmrouter = LLMRouter()
-        self.llmclients = llmrouter.get_clients_all()
+        self.llmroute = LLMRouter.get_instance()
         self.constants = Constants.get_instance()
         pass
 
@@ -51,30 +53,30 @@ class ExtractService:
             # estimate cost
             reason_model_name = options['reason_model_name'] if 'reason_model_name' in options else 'gemma2:9b-instruct-q5_K_M'
             embed_model_name = options['embed_model_name'] if 'embed_model_name' in options else 'gemma2:9b-instruct-q5_K_M'
-            reason_model_client = self.llmclients[reason_model_name]
-            embed_model_client = self.llmclients[embed_model_name]
+            max_data_num = options['max_file_num'] if 'max_file_num' in options else len(lazy_list)
+            reason_model_client = self.get_reason_client(reason_model_name, lazy_list[:max_data_num], options)
+            embed_model_client = self.llmroute.get_client_by_modelname(embed_model_name)
             if isinstance(reason_model_client, OllamaClient):
                 print(f"LOG-INFO: reasoning with OllamaClient is free!! Fell free to use it.")
             if isinstance(embed_model_client, OllamaClient):
                 print(f"LOG-INFO: embedding with OllamaClient is free!! Fell free to use it.")
 
-            max_data_num = options['max_file_num'] if 'max_file_num' in options else len(lazy_list)
-            for filepath, loader_func in lazy_list[:max_data_num]:
-                try:
-                    data = loader_func()
-                    reasoning_cost = reason_model_client.get_how_much_cost(data)
-                    embedding_cost = embed_model_client.get_how_much_cost(data)
-                    reasoning_sum += reasoning_cost
-                    embedding_sum += embedding_cost
-                except Exception as e:
-                    print(f"LOG-ERROR: error reading {filepath} - {str(e)}")
-            reasoning_cost *= 2 # for output token
-            embedding_cost *= 2
+            # 파일을 TOKEN_COUNT_BATCH_SIZE개씩 읽어 토큰 수를 한 번에 센다 (count_lazy_list_tokens와 같은 값, 한 번 읽어 두 모델을 함께 센다)
+            reasoning_tokens = 0
+            embedding_tokens = 0
+            for batch in read_lazy_list_batches(lazy_list[:max_data_num]):
+                reasoning_tokens += sum(reason_model_client.get_token_counts(batch))
+                embedding_tokens += sum(embed_model_client.get_token_counts(batch))
+            reasoning_sum = self.llmroute.estimate_cost(reason_model_client, reasoning_tokens) # 입력, 출력 토큰 모두 포함
+            embedding_sum = self.llmroute.estimate_cost(embed_model_client, embedding_tokens)
 
             status = 'success'
             data = {
+                'reason_model_name': reason_model_client.model_name,
                 'reasoning_sum': reasoning_sum,
-                'embedding_sum': embedding_sum
+                'embedding_sum': embedding_sum,
+                'reasoning_tokens': reasoning_tokens,
+                'embedding_tokens': embedding_tokens
             }
         except Exception as e:
             print(f"LOG-ERROR: error reading {datasourcetype}, {datasourcepath} - {str(e)}")
@@ -113,9 +115,14 @@ class ExtractService:
             max_data_num = options['max_file_num'] if 'max_file_num' in options else len(lazy_list)
             reason_model_name = options['reason_model_name']
             embed_model_name = options['embed_model_name']
+            remaining_budget = float(options['max_budget']) if 'max_budget' in options else float('inf')
             for data_name, data_loader in lazy_list[:max_data_num]: # TODO: 프로그레스바 추가
                 try:
-                    print(f"LOG-INFO: extracting {data_name}")
+                    # reason_model_name이 auto이면 파일마다 남은 예산으로 모델을 고른다, 고를 때와 차감할 때 모두 모델의 토크나이저로 센 토큰 수를 쓴다 (check_budget과 같은 값)
+                    reason_model_client = self.get_reason_client(options['reason_model_name'], [(data_name, data_loader)], {'max_budget': remaining_budget})
+                    reason_model_name = reason_model_client.model_name
+                    remaining_budget -= self.llmroute.estimate_cost(reason_model_client, count_lazy_list_tokens(reason_model_client, [(data_name, data_loader)]))
+                    print(f"LOG-INFO: extracting {data_name} with {reason_model_name}")
 
                     # extract keyconcepts from data
                     result = self.extract_keyconcepts_from_data(
@@ -161,8 +168,8 @@ class ExtractService:
         format : dict
         reason_model_name = options['reason_model_name']
         embed_model_name = options['embed_model_name']
-        reason_client = self.llmclients[reason_model_name]
-        embed_client = self.llmclients[embed_model_name]
+        reason_client = self.llmroute.get_client_by_modelname(reason_model_name)
+        embed_client = self.llmroute.get_client_by_modelname(embed_model_name)
 
         status = ''
         data = []
@@ -174,8 +181,8 @@ class ExtractService:
             if not data:
                 return []
 
-            reason_model_client = self.llmclients[reason_model_name]
-            embed_model_client = self.llmclients[embed_model_name]
+            reason_model_client = self.llmroute.get_client_by_modelname(reason_model_name)
+            embed_model_client = self.llmroute.get_client_by_modelname(embed_model_name)
             prompt = options['prompt'] if 'prompt' in options else """
             당신은 문서 요약의 대가입니다.
 
@@ -233,58 +240,58 @@ class ExtractService:
                     format = format_headless
 
 
-            # generate
-            concepts_list = []
-            data_size = len(data)
-            chunk_size =  reason_model_client.get_chunk_size()
-            chunk_count = data_size // chunk_size
-            for i in range(0, chunk_count+1):
-                chunk = data[i*chunk_size:(i+1)*chunk_size]
-                response = reason_model_client.generate(
-                    prompt = f"{prompt} data_name : {data_name}\n {chunk}",
-                    options = {
-                        "format" : format
-                    }
-                )
-                concepts_list.append(response.data)
-                print(f"LOG-DEBUG: {i} - {response.data}")
+            # generate (청크를 LLMRouter의 이벤트 루프에서 동시에 스트리밍 생성, Ollama는 OllamaScheduler가 동시호출 수를 제한)
+            # 청크의 title, summary가 완성되면 생성이 끝나기를 기다리지 않고 바로 임베딩을 시작한다
+            # 청크는 토큰 단위로 나눈다, 프롬프트, 청크, 생성할 출력(LLM_OUTPUT_RESERVE_TOKENS)이 chunk_size 토큰을 넘지 않도록 (프롬프트가 길어도 chunk_size의 1/4은 남긴다)
+            chunk_size = reason_model_client.get_chunk_size()
+            prompt_tokens = reason_model_client.get_token_count(prompt) or 0
+            output_tokens = min(self.constants.llm_output_reserve_tokens, chunk_size // 4)
+            chunk_tokens = max(chunk_size - prompt_tokens - output_tokens, chunk_size // 4)
+            chunks = reason_model_client.split_by_tokens(data, chunk_tokens)
+            generate_options = self.get_generate_options(reason_model_client, format, prompt_tokens + chunk_tokens, output_tokens)
+            concepts_list = self.llmroute.run(self.generate_chunks_async(reason_model_client, embed_model_client, prompt, generate_options, data_name, chunks))
 
-            # embed
+            # embed (스트리밍 중에 임베딩하지 못한 개념만)
+            pending = [concept for concept in concepts_list if 'embedding' not in concept]
             batch_size : int
             if isinstance(embed_model_client, OpenAIClient):
                 batch_size = 1
-                for i in range(0, len(concepts_list), batch_size):
-                    batch = concepts_list[i:i+batch_size]
-                    texts_to_embed = [f"{data.get('title','')} {data.get('summary','')}" for data in batch]
-                    embedding = embed_model_client.embed(texts_to_embed, {}, 'batch').data
+                for i in range(0, len(pending), batch_size):
+                    batch = pending[i:i+batch_size]
+                    texts_to_embed = [self.get_text_to_embed(data) for data in batch]
+                    with self.llmroute.track(embed_model_client):
+                        embedding = embed_model_client.embed(texts_to_embed, {}, 'batch').data
+                    if embedding is None:
+                        print(f"LOG-ERROR: {data_name} embedding failed, skipping {len(batch)} concepts")
+                        continue
 
                     for concept in batch: #TODO: OpenAI에도 배치처리 추가하기
                         concept['embedding']   = self.pad_embedding_with_zero_until_4096(embedding)
-                        concept['status']      = None
-                        concept['data_name']   = data_name
-                        concept['create_time'] = datetime.datetime.now()
-                        concept['update_time'] = None
-                        concept['source_num']  = 0
-                        concept['target_num']  = 0
 
             elif isinstance(embed_model_client, OllamaClient):
                 batch_size = 10
-                for i in range(0, len(concepts_list), batch_size):
-                    batch = concepts_list[i:i+batch_size]
-                    texts_to_embed = [f"{data.get('title','')} {data.get('summary','')}" for data in batch]
-                    embeddings = embed_model_client.embed(texts_to_embed, {}, 'batch').data
+                for i in range(0, len(pending), batch_size):
+                    batch = pending[i:i+batch_size]
+                    texts_to_embed = [self.get_text_to_embed(data) for data in batch]
+                    with self.llmroute.track(embed_model_client):
+                        embeddings = embed_model_client.embed(texts_to_embed, {}, 'batch').data
+                    if embeddings is None:
+                        print(f"LOG-ERROR: {data_name} embedding failed, skipping {len(batch)} concepts")
+                        continue
 
                     for concept, embedding in zip(batch, embeddings):
                         concept['embedding']   = self.pad_embedding_with_zero_until_4096(embedding)
-                        concept['status']      = None
-                        concept['data_name']   = data_name
-                        concept['create_time'] = datetime.datetime.now()
-                        concept['update_time'] = None
-                        concept['source_num']  = 0
-                        concept['target_num']  = 0
+
+            for concept in concepts_list:
+                concept['status']      = None
+                concept['data_name']   = data_name
+                concept['create_time'] = datetime.datetime.now()
+                concept['update_time'] = None
+                concept['source_num']  = 0
+                concept['target_num']  = 0
 
             status = 'success'
-            data = concepts_list
+            data = [concept for concept in concepts_list if 'embedding' in concept] # 임베딩에 실패한 개념은 발행하지 않는다
 
         except Exception as e:
             print(f"LOG-ERROR: error reading {data_name} - {str(e)}")
@@ -299,6 +306,106 @@ class ExtractService:
             'data': data
         }
 
+    async def generate_chunks_async(self, reason_model_client: BaseClient, embed_model_client: BaseClient, prompt: str, options: dict, data_name: str, chunks: list[str]) -> list:
+        """
+        청크마다 주요개념을 생성한다, 청크를 동시에 요청하고 청크 순서대로 결과를 반환한다
+        - 스트리밍으로 생성하면서 title과 summary가 완성되면 바로 임베딩을 시작해, 성공하면 결과에 embedding을 채운다
+        - 동시에 처리하는 청크 수는 get_chunk_concurrency로 제한한다 (청크의 임베딩까지 끝나야 자리를 내준다)
+        """
+        semaphore = asyncio.Semaphore(self.get_chunk_concurrency(reason_model_client))
+
+        async def embed_early(text):
+            with self.llmroute.track(embed_model_client):
+                return await embed_model_client.aembed(text, {}, None)
+
+        async def generate_chunk(i, chunk):
+            async with semaphore:
+                return await generate_chunk_bounded(i, chunk)
+
+        async def generate_chunk_bounded(i, chunk):
+            fields = {}
+            embed_task = None
+            def on_field(key, value):
+                nonlocal embed_task
+                fields[key] = value
+                if embed_task is None and 'title' in fields and 'summary' in fields:
+                    embed_task = asyncio.ensure_future(embed_early(self.get_text_to_embed(fields)))
+
+            with self.llmroute.track(reason_model_client):
+                response = await reason_model_client.agenerate_stream(
+                    prompt = f"{prompt} data_name : {data_name}\n {chunk}",
+                    options = options,
+                    on_field = on_field
+                )
+            if response.status != 100 or response.data is None:
+                # 재시도 후에도 실패한 청크만 빼고 나머지 청크는 살린다
+                print(f"LOG-ERROR: {data_name} chunk {i} generation failed - {response.message}")
+                if embed_task is not None:
+                    embed_task.cancel()
+                return None
+            print(f"LOG-DEBUG: {i} - {response.data}")
+
+            concept = response.data
+            if embed_task is not None and self.get_text_to_embed(concept) == self.get_text_to_embed(fields):
+                embedding = (await embed_task).data
+                if embedding is not None:
+                    concept['embedding'] = self.pad_embedding_with_zero_until_4096(embedding)
+            elif embed_task is not None:
+                embed_task.cancel()
+            return concept
+        results = await asyncio.gather(*[generate_chunk(i, chunk) for i, chunk in enumerate(chunks)])
+        return [result for result in results if result is not None]
+
+    def get_generate_options(self, reason_model_client: BaseClient, format: dict, input_tokens: int, output_tokens: int) -> dict:
+        """
+        청크 생성 요청 옵션
+        - Ollama : 서버 기본 컨텍스트(num_ctx)에 기대지 않고 입력과 출력이 들어갈 만큼 지정하고(모델 컨텍스트 길이까지), 출력은 output_tokens까지만 생성한다
+        """
+        options = {"format" : format}
+        if isinstance(reason_model_client, OllamaClient):
+            options['num_ctx'] = min(input_tokens + output_tokens, reason_model_client.context_length)
+            options['num_predict'] = output_tokens
+        return options
+
+    def get_chunk_concurrency(self, reason_model_client: BaseClient) -> int:
+        """
+        문서 하나에서 동시에 생성할 청크 수
+        - Ollama : 서버 처리 슬롯 수(OLLAMA_NUM_PARALLEL)만큼, 나머지는 여기서 기다려 스케줄러 대기열(OLLAMA_MAX_QUEUE)이 넘치지 않도록 한다
+        - 그 외 : 연결 풀 크기(LLM_MAX_CONNECTIONS)만큼
+        """
+        if isinstance(reason_model_client, OllamaClient):
+            return max(1, min(self.constants.ollama_num_parallel, self.constants.llm_max_connections))
+        return max(1, self.constants.llm_max_connections)
+
+    def get_text_to_embed(self, concept: dict) -> str:
+        """
+        개념을 임베딩할 때 쓰는 텍스트 (제목 + 요약)
+        """
+        return f"{concept.get('title','')} {concept.get('summary','')}"
+
+    def read_llm_status(self) -> dict:
+        """
+        모델별 부하(LLMRouter), Ollama 대기열 현황(OllamaScheduler), 합쳐진 중복 호출 수(SingleFlight), 스트리밍 생성의 첫 필드 도착 시간(stream_stats), 제공자별 재시도/속도 조절/회로 상태(ProviderGuard)
+        """
+        return {
+            'loads': self.llmroute.get_loads_all(),
+            'ollama_scheduler': OllamaScheduler.get_instance().get_stats(),
+            'singleflight': SingleFlight.get_instance().get_stats(),
+            'streams': {model_name: client.stream_stats.get_stats()
+                        for model_name, client in self.llmroute.get_clients_all().items() if hasattr(client, 'stream_stats')},
+            'providers': {model_name: client.guard.get_status()
+                          for model_name, client in self.llmroute.get_clients_all().items() if hasattr(client, 'guard')}
+        }
+
+    def get_reason_client(self, reason_model_name: str, lazy_list: list, options: dict) -> BaseClient:
+        """
+        추론 모델 클라이언트를 반환한다, reason_model_name이 auto이면 max_budget(원) 안에서 LLMRouter가 고른다
+        """
+        if reason_model_name == 'auto':
+            budget = float(options['max_budget']) if 'max_budget' in options else float('inf')
+            return self.llmroute.get_client_by_budget(budget, lazy_list)
+        return self.llmroute.get_client_by_modelname(reason_model_name)
+
     def pad_embedding_with_zero_until_4096(self, embedding: list[float]) -> list[float]:
         """
         임베딩 벡터를 4096차원으로 패딩한다.
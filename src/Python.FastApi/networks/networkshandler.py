@@ -1,10 +1,11 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, Body
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, Body, Header
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from starlette import status as status
 from networks.networksservice import NetworksService
 from common.models.responseDTO import ResponseDTO
-import json
+from common.system.streaming import stream_chunks, prime_rows, ARROW_STREAM_MEDIA_TYPE
+from common.system.snapshotcache import SnapshotCache, make_etag, etag_matches
 
 router = APIRouter(
     prefix="/api/networks",
@@ -27,7 +28,9 @@ def get_service():
     },
 )
 def engage_keyconcepts_into_networks(
-    options: Annotated[dict, Body(..., examples=[ { "operation": "cosine_distance", "cosine_sim_check" : "true" } ])],
+    options: Annotated[dict, Body(..., examples=[
+        { "operation": "cosine_distance", "cosine_sim_check" : "true" },
+        { "operation": "nn_descent", "k": 3, "build_k": 15, "sample_rate": 0.3, "max_iterations": 10, "recall_sample_size": 100 } ])],
     service: Annotated[NetworksService, Depends(get_service)] = get_service,
 ) -> ResponseDTO:
     """
@@ -40,13 +43,14 @@ def engage_keyconcepts_into_networks(
             - 'cosine_distance' : 코사인 거리를 이용한 유사도 측정
             - 'max_inner_product' : 내적을 이용한 유사도 측정
             - 'l1_distance' : L1 거리를 이용한 유사도 측정
+            - 'nn_descent' : NN-descent 근사 kNN 그래프, 표본 재현율을 함께 반환
     """
     status = 0
     content = None
     try:
-        service.engage_keyconcepts_into_networks(options)
+        result = service.engage_keyconcepts_into_networks(options)
         status = 200
-        content = ResponseDTO( status='success', message='data extracted', data='' )
+        content = ResponseDTO( status='success', message='data extracted', data=result )
     except Exception as e:
         status = 500
         content = ResponseDTO( status='error', message='internal server error', data=str(e) )
@@ -56,26 +60,245 @@ def engage_keyconcepts_into_networks(
 @router.get(
     "",
     summary="네트워크 전체를 조회한다.",
-    description="네트워크 테이블 전체를 조회한다.",
+    description="네트워크 테이블 전체를 조회한다. 그래프 버전 기반 ETag를 돌려주며, If-None-Match가 같으면 304를 반환한다.",
     responses={
         status.HTTP_200_OK:                     {"description":"네트워크 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data extracted", "data": "..." } } }, "model": ResponseDTO},
+        status.HTTP_304_NOT_MODIFIED:           {"description":"변경 없음 (If-None-Match 일치)"},
         status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"네트워크 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
     },
 )
 def get_networks(
+    if_none_match: Annotated[str, Header()] = None,
     service: Annotated[NetworksService, Depends(get_service)] = get_service,
 ) -> ResponseDTO:
     """
     네트워크를 조회한다.
+    - 같은 그래프 버전에서는 직렬화된 응답을 메모리에서 바로 돌려준다
     """
     status = 0
     content = None
+    key = "/api/networks"
     try:
+        version = service.read_graph_version()
+        etag = make_etag(version, key)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        cache = SnapshotCache.get_instance()
+        cached = cache.get(version, key)
+        if cached is not None:
+            body, headers = cached
+            return Response(content=body, media_type='application/json', headers=headers)
+
         result = service.read_networks_all()
         result = [o.to_dict() for o in result]
-        result = json.loads(json.dumps(result, default=str))
+        response = JSONResponse(status_code=200, content=dict(ResponseDTO( status='success', message='data extracted', data=result )), headers=headers)
+        cache.put(version, key, response.body, headers)
+        return response
+    except Exception as e:
+        status = 500
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+
+    return JSONResponse(status_code=status, content=dict(content))
+
+@router.get(
+    "/stream",
+    summary="네트워크 전체를 스트리밍으로 조회한다.",
+    description="서버측 커서로 tb_networks를 id 순으로 읽으며 바로 내보낸다. format=ndjson이면 한 줄에 행 하나(application/x-ndjson), format=json이면 ResponseDTO 형태의 JSON을 청크 단위로 보낸다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"네트워크 조회 성공", "content":{ "application/x-ndjson": { "example": "{\"id\":1,\"source_concept_id\":1,\"target_concept_id\":2}\n" }, "application/json": { "example": { "status": "success", "message": "data extracted", "data": "..." } } }},
+        status.HTTP_400_BAD_REQUEST:            {"description":"네트워크 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "format" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"네트워크 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_networks_stream(
+    format: str = 'ndjson',
+    service: Annotated[NetworksService, Depends(get_service)] = get_service,
+):
+    """
+    네트워크 테이블을 전체 결과를 메모리에 올리지 않고 스트리밍으로 조회한다.
+    """
+    if format not in ('ndjson', 'json'):
+        content = ResponseDTO( status='error', message='input validation error', data='format' )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    try:
+        rows = prime_rows(service.read_networks_stream())
+    except Exception as e:
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+        return JSONResponse(status_code=500, content=dict(content))
+    chunks, media_type = stream_chunks(rows, format, message='data extracted')
+    return StreamingResponse(chunks, media_type=media_type)
+
+
+@router.get(
+    "/snapshot",
+    summary="시각화용 그래프 스냅샷을 Arrow IPC 스트림으로 조회한다.",
+    description="노드 속성(id, title, keywords, summary, data_name, category, source_num, target_num), 2차원 좌표(x, y), 노드별 연결 목록(targets: list<int32>)을 Arrow IPC 스트림(application/vnd.apache.arrow.stream)으로 내보낸다. 좌표는 저장된 배치 좌표(POST /api/concepts/layout)를 쓰고, 배치가 없으면 seed로 고정한 무작위 투영으로 서버에서 계산한다. 압축 없이 내보낸다 (UI의 Arrow IPC 리더가 압축 버퍼를 읽지 않는다).",
+    responses={
+        status.HTTP_200_OK:                     {"description":"스냅샷 조회 성공", "content":{ "application/vnd.apache.arrow.stream": {} }},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"스냅샷 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_networks_snapshot(
+    seed: int = 0,
+    if_none_match: Annotated[str, Header()] = None,
+    service: Annotated[NetworksService, Depends(get_service)] = get_service,
+):
+    """
+    노드, 좌표, 연결을 담은 그래프 스냅샷을 Arrow IPC 스트림으로 조회한다.
+    - 그래프 버전 기반 ETag를 돌려주며, 같은 버전의 스냅샷은 메모리에 보관했다가 바로 돌려준다
+    """
+    key = f"/api/networks/snapshot?seed={seed}"
+    try:
+        version = service.read_graph_version()
+        etag = make_etag(version, key)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        cache = SnapshotCache.get_instance()
+        cached = cache.get(version, key)
+        if cached is not None:
+            body, headers = cached
+            return Response(content=body, media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+
+        chunks = prime_rows(service.read_networks_snapshot(seed))
+    except Exception as e:
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+        return JSONResponse(status_code=500, content=dict(content))
+    return StreamingResponse(cache.cache_chunks(version, key, chunks, headers), media_type=ARROW_STREAM_MEDIA_TYPE, headers=headers)
+
+MAX_HOPS = 5
+MAX_SUBGRAPH_NODES = 5000
+MAX_SUBGRAPH_EDGES = 20000
+MAX_SUBGRAPH_IDS = MAX_SUBGRAPH_NODES
+MAX_COMPONENTS = 20
+
+@router.get(
+    "/neighborhood/{concept_id}",
+    summary="주요개념의 k-hop 이웃 부분그래프를 조회한다.",
+    description="재귀 CTE로 concept_id에서 hops 이내에 있는 개념과 그 사이의 연결을 조회한다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"부분그래프 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": { "nodes": [], "edges": [], "truncated": False } } } }, "model": ResponseDTO},
+        status.HTTP_400_BAD_REQUEST:            {"description":"부분그래프 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "hops" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"부분그래프 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+async def get_networks_neighborhood(
+    concept_id: int,
+    hops: int = 1,
+    max_nodes: int = 500,
+    max_edges: int = 2000,
+    service: Annotated[NetworksService, Depends(get_service)] = get_service,
+) -> ResponseDTO:
+    """
+    주요개념의 k-hop 이웃 부분그래프를 조회한다.
+    """
+    invalid = check_subgraph_limits(max_nodes, max_edges)
+    if hops < 1 or hops > MAX_HOPS:
+        invalid = 'hops'
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    status = 0
+    content = None
+    try:
+        result = await service.read_networks_neighborhood_async(concept_id, hops, max_nodes, max_edges)
         status = 200
-        content = ResponseDTO( status='success', message='data extracted', data=result )
+        content = ResponseDTO( status='success', message='data selected', data=result )
+    except Exception as e:
+        status = 500
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+
+    return JSONResponse(status_code=status, content=dict(content))
+
+@router.post(
+    "/subgraph",
+    summary="주요개념 집합의 유도 부분그래프를 조회한다.",
+    description="concept_ids에 포함된 개념과 그 사이의 연결만 조회한다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"부분그래프 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": { "nodes": [], "edges": [], "truncated": False } } } }, "model": ResponseDTO},
+        status.HTTP_400_BAD_REQUEST:            {"description":"부분그래프 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "essential input missing", "data": "concept_ids" } } }, "model": ResponseDTO},
+        status.HTTP_422_UNPROCESSABLE_ENTITY:   {"description":"부분그래프 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "max_nodes" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"부분그래프 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+async def get_networks_subgraph(
+    options: Annotated[dict, Body(..., examples=[ { "concept_ids": [1, 2, 3], "max_nodes": 500, "max_edges": 2000 } ])],
+    service: Annotated[NetworksService, Depends(get_service)] = get_service,
+) -> ResponseDTO:
+    """
+    주요개념 집합의 유도 부분그래프를 조회한다.
+    """
+    concept_ids = options['concept_ids'] if 'concept_ids' in options else None
+    if not concept_ids:
+        content = ResponseDTO( status='error', message='essential input missing', data='concept_ids' )
+        return JSONResponse(status_code=400, content=dict(content))
+    if isinstance(concept_ids, list) and len(concept_ids) > MAX_SUBGRAPH_IDS:
+        # 변환하기 전에 개수부터 막는다
+        content = ResponseDTO( status='error', message='input validation error', data='concept_ids' )
+        return JSONResponse(status_code=400, content=dict(content))
+    invalid = None
+    try:
+        invalid = 'concept_ids'
+        concept_ids = [int(i) for i in concept_ids]
+        invalid = 'max_nodes'
+        max_nodes = int(options['max_nodes']) if 'max_nodes' in options else 500
+        invalid = 'max_edges'
+        max_edges = int(options['max_edges']) if 'max_edges' in options else 2000
+    except (TypeError, ValueError):
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=422, content=dict(content))
+    invalid = check_subgraph_limits(max_nodes, max_edges)
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    status = 0
+    content = None
+    try:
+        result = await service.read_networks_subgraph_async(concept_ids, max_nodes, max_edges)
+        status = 200
+        content = ResponseDTO( status='success', message='data selected', data=result )
+    except Exception as e:
+        status = 500
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+
+    return JSONResponse(status_code=status, content=dict(content))
+
+@router.get(
+    "/components",
+    summary="가장 밀집된 연결요소를 조회한다.",
+    description="평균차수(2E/V)가 높은 순으로 연결요소 topn개의 노드와 연결을 조회한다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"연결요소 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": [ { "rank": 1, "node_count": 10, "edge_count": 20, "density": 4.0, "nodes": [], "edges": [], "truncated": False } ] } } }, "model": ResponseDTO},
+        status.HTTP_400_BAD_REQUEST:            {"description":"연결요소 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "topn" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"연결요소 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_networks_densest_components(
+    topn: int = 1,
+    max_nodes: int = 500,
+    max_edges: int = 2000,
+    service: Annotated[NetworksService, Depends(get_service)] = get_service,
+) -> ResponseDTO:
+    """
+    가장 밀집된 연결요소를 조회한다.
+    """
+    invalid = check_subgraph_limits(max_nodes, max_edges)
+    if topn < 1 or topn > MAX_COMPONENTS:
+        invalid = 'topn'
+    if invalid:
+        content = ResponseDTO( status='error', message='input validation error', data=invalid )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    status = 0
+    content = None
+    try:
+        result = service.read_networks_densest_components(topn, max_nodes, max_edges)
+        status = 200
+        content = ResponseDTO( status='success', message='data selected', data=result )
     except Exception as e:
         status = 500
         content = ResponseDTO( status='error', message='internal server error', data=str(e) )
@@ -108,4 +331,15 @@ def delete_networks_all(
         content = ResponseDTO( status='error', message='internal server error', data=str(e) )
 
     return JSONResponse(status_code=status, content=dict(content)
-)
\ No newline at end of file
+)
+
+def check_subgraph_limits(max_nodes: int, max_edges: int) -> str:
+    """
+    부분그래프 조회 한도를 확인하고, 잘못된 입력값의 이름을 반환한다.
+    - max_nodes는 1 ~ MAX_SUBGRAPH_NODES, max_edges는 0 ~ MAX_SUBGRAPH_EDGES
+    """
+    if max_nodes < 1 or max_nodes > MAX_SUBGRAPH_NODES:
+        return 'max_nodes'
+    if max_edges < 0 or max_edges > MAX_SUBGRAPH_EDGES:
+        return 'max_edges'
+    return ''
@@ -1,8 +1,53 @@
 from typing import Tuple
+from collections import Counter
 import traceback
-from sqlalchemy import insert, select
+from sqlalchemy import insert, select, text
 from common.db.db import DB
+from common.db.asyncdb import AsyncDB
+from common.db.graphversion import GraphVersionRepository
 from networks.networksmodel import Networks
+from common.algebra.projection import layout_position_sql
+
+# concept_id에서 hops 이내(무방향)에 있는 개념 (read_tb_networks_neighborhood)
+NEIGHBORHOOD_SQL = text("""
+    WITH RECURSIVE edges AS (
+        SELECT source_concept_id AS a, target_concept_id AS b FROM tb_networks
+        UNION ALL
+        SELECT target_concept_id AS a, source_concept_id AS b FROM tb_networks
+    ), hop(node, depth) AS (
+        SELECT CAST(:concept_id AS integer), 0
+        UNION
+        SELECT e.b, h.depth + 1
+          FROM hop h
+          JOIN edges e ON e.a = h.node
+         WHERE h.depth < :hops
+    ), nearest AS (
+        SELECT node, min(depth) AS depth FROM hop GROUP BY node
+    )
+    SELECT c.id, c.title, c.category, c.source_num, c.target_num, n.depth
+      FROM nearest n
+      JOIN tb_concepts c ON c.id = n.node
+     ORDER BY n.depth, (c.source_num + c.target_num) DESC NULLS LAST, c.id
+     LIMIT :max_nodes
+""")
+
+# 개념 집합 사이의 연결 (read_tb_networks_induced)
+INDUCED_SQL = text("""
+    SELECT id, source_concept_id, target_concept_id
+      FROM tb_networks
+     WHERE source_concept_id = ANY(CAST(:ids AS integer[]))
+       AND target_concept_id = ANY(CAST(:ids AS integer[]))
+     ORDER BY id
+     LIMIT :max_edges
+""")
+
+# 부분그래프 노드 표시용 개념 컬럼 (read_tb_concepts_brief_by_ids)
+CONCEPTS_BRIEF_SQL = text("""
+    SELECT id, title, category, source_num, target_num
+      FROM tb_concepts
+     WHERE id = ANY(CAST(:ids AS integer[]))
+     ORDER BY (source_num + target_num) DESC NULLS LAST, id
+""")
 
 class NetworksRepository():
     """
@@ -10,6 +55,8 @@ class NetworksRepository():
     """
     def __init__(self):
         self.db = DB.get_instance()
+        self.async_db = AsyncDB.get_instance()
+        self.graph_version = GraphVersionRepository()
         pass
 
     def create_network_connections_tb_networks(self, source, target) -> Tuple[bool, str]:
@@ -21,13 +68,24 @@ class NetworksRepository():
           - 상위 p%만큼의 유사도를 가지는 컨셉간 연결
           - 누적 유사도의 비중이 전체 대비 p%가 되는 노드를 선택하여 연결
         """
+        return self.create_tb_networks_list([{'source_concept_id':source, 'target_concept_id':target}])
+
+    def create_tb_networks_list(self, network_list: list[dict]) -> Tuple[int, str]:
+        """
+        tb_networks 테이블에 연결 리스트를 한번에 저장한다
+        - 같은 트랜잭션 안에서 tb_concepts의 source_num, target_num을 배치 단위로 증가시킨다
+        """
         rtncd = 900
         rtnmsg = '실패'
+        if not network_list:
+            return 200, '성공'
 
         session = self.db.get_session()
         try:
-            session.execute(insert(Networks), {'source_concept_id':source, 'target_concept_id':target})
+            session.execute(insert(Networks), network_list)
+            self.increase_tb_concepts_source_target_count(session, network_list)
             session.commit()
+            self.graph_version.increase_tb_graph_version(session)
             rtncd = 200
             rtnmsg = '성공'
         except Exception as e:
@@ -40,6 +98,31 @@ class NetworksRepository():
 
         return rtncd, rtnmsg
 
+    def increase_tb_concepts_source_target_count(self, session, network_list: list[dict]):
+        """
+        연결 리스트를 개념별로 집계하여 source_num, target_num을 UPDATE 한 번으로 증가시킨다
+        - 호출한 쪽의 세션/트랜잭션을 그대로 사용한다
+        """
+        source_counter = Counter(int(n['source_concept_id']) for n in network_list)
+        target_counter = Counter(int(n['target_concept_id']) for n in network_list)
+        concept_ids = sorted(set(source_counter) | set(target_counter))
+
+        session.execute(text("""
+            UPDATE tb_concepts AS c
+               SET source_num = coalesce(c.source_num, 0) + v.source_num,
+                   target_num = coalesce(c.target_num, 0) + v.target_num
+              FROM (
+                    SELECT unnest(CAST(:ids AS integer[]))         AS id,
+                           unnest(CAST(:source_nums AS integer[])) AS source_num,
+                           unnest(CAST(:target_nums AS integer[])) AS target_num
+                   ) AS v
+             WHERE c.id = v.id
+        """), {
+            'ids': concept_ids,
+            'source_nums': [source_counter[i] for i in concept_ids],
+            'target_nums': [target_counter[i] for i in concept_ids],
+        })
+
     def read_tb_networks_all(self) -> list[Networks]:
         rtncd = 900
         rtnmsg = '실패'
@@ -60,14 +143,209 @@ class NetworksRepository():
 
         return rtndata
 
+    def read_tb_networks_stream(self, batch_size: int = 1000):
+        """
+        tb_networks 테이블을 서버측 커서로 batch_size개씩 읽어오는 제너레이터
+        """
+        session = self.db.get_session()
+        try:
+            result = session.execute(select(Networks.id, Networks.source_concept_id, Networks.target_concept_id)
+                                     .order_by(Networks.id)
+                                     .execution_options(yield_per=batch_size))
+            for row in result:
+                yield {"id": row[0], "source_concept_id": row[1], "target_concept_id": row[2]}
+        finally:
+            session.close()
+
+    def read_tb_networks_snapshot_stream(self, axes: list[str], scale: float, batch_size: int = 10000):
+        """
+        그래프 스냅샷용 노드 행을 서버측 커서로 batch_size개씩 읽어오는 제너레이터
+        - 각 행은 (id, title, keywords, summary, data_name, category, source_num, target_num, x, y, targets)
+        - x, y는 저장된 배치 좌표(pos_x, pos_y)를 쓰고, 없으면 개념 배치와 같은 식(layout_position_sql)으로 DB에서 계산하여 임베딩을 전송하지 않는다
+          - 가장 최근 배치(tb_layouts)가 있으면 그 투영식을 쓴다
+          - 없으면 투영축(axes, vector 문자열)과 scale, offset 0으로 계산한다
+        - targets는 해당 개념이 source인 연결의 target id 배열
+        """
+        session = self.db.get_session()
+        try:
+            result = session.execute(text(f"""
+                SELECT c.id, c.title, c.keywords, c.summary, c.data_name, c.category,
+                       coalesce(c.source_num, 0), coalesce(c.target_num, 0),
+                       coalesce(c.pos_x, {layout_position_sql('c.embedding', 'l.axis_x', 'l.offset_x', 'l.scale')}),
+                       coalesce(c.pos_y, {layout_position_sql('c.embedding', 'l.axis_y', 'l.offset_y', 'l.scale')}),
+                       coalesce(e.targets, '{{}}')
+                  FROM tb_concepts c
+                 CROSS JOIN (
+                        SELECT axis_x, axis_y, offset_x, offset_y, scale
+                          FROM (
+                                SELECT 0 AS priority, id, axis_x, axis_y, offset_x, offset_y, scale FROM tb_layouts
+                                UNION ALL
+                                SELECT 1, 0, CAST(:axis_x AS vector), CAST(:axis_y AS vector), 0, 0, :scale
+                               ) AS candidates
+                         ORDER BY priority, id DESC
+                         LIMIT 1
+                       ) AS l
+                  LEFT JOIN (
+                        SELECT source_concept_id, array_agg(target_concept_id ORDER BY target_concept_id) AS targets
+                          FROM tb_networks
+                         GROUP BY source_concept_id
+                       ) e ON e.source_concept_id = c.id
+                 ORDER BY c.id
+            """).execution_options(yield_per=batch_size), {'axis_x': axes[0], 'axis_y': axes[1], 'scale': scale})
+            for rows in result.partitions():
+                yield rows
+        finally:
+            session.close()
+
+    def read_tb_concepts_categories(self) -> list[str]:
+        """
+        tb_concepts의 카테고리 목록을 중복없이 읽어온다
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(text("SELECT DISTINCT category FROM tb_concepts WHERE category IS NOT NULL ORDER BY category"))
+            rtndata = [row[0] for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    def read_tb_networks_neighborhood(self, concept_id: int, hops: int, max_nodes: int) -> list[dict]:
+        """
+        재귀 CTE로 concept_id에서 hops 이내(무방향)에 있는 개념을 읽어온다
+        - 가까운 거리, 연결 수가 많은 순서로 max_nodes개까지 반환한다
+        - 각 행은 id, title, category, source_num, target_num, depth를 가진다
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(NEIGHBORHOOD_SQL, {'concept_id': concept_id, 'hops': hops, 'max_nodes': max_nodes})
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    async def read_tb_networks_neighborhood_async(self, concept_id: int, hops: int, max_nodes: int) -> list[dict]:
+        """
+        read_tb_networks_neighborhood의 비동기(asyncpg) 버전
+        """
+        session = self.async_db.get_session()
+        rtndata = []
+        try:
+            result = await session.execute(NEIGHBORHOOD_SQL, {'concept_id': concept_id, 'hops': hops, 'max_nodes': max_nodes})
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            await session.close()
+        return rtndata
+
+    def read_tb_networks_induced(self, concept_ids: list[int], max_edges: int) -> list[dict]:
+        """
+        concept_ids 사이의 연결만 골라 max_edges개까지 읽어온다 (유도 부분그래프)
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(INDUCED_SQL, {'ids': list(concept_ids), 'max_edges': max_edges})
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    async def read_tb_networks_induced_async(self, concept_ids: list[int], max_edges: int) -> list[dict]:
+        """
+        read_tb_networks_induced의 비동기(asyncpg) 버전
+        """
+        session = self.async_db.get_session()
+        rtndata = []
+        try:
+            result = await session.execute(INDUCED_SQL, {'ids': list(concept_ids), 'max_edges': max_edges})
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            await session.close()
+        return rtndata
+
+    def read_tb_concepts_brief_by_ids(self, concept_ids: list[int]) -> list[dict]:
+        """
+        부분그래프 노드 표시에 필요한 개념 컬럼만 읽어온다 (임베딩 제외)
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(CONCEPTS_BRIEF_SQL, {'ids': list(concept_ids)})
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    async def read_tb_concepts_brief_by_ids_async(self, concept_ids: list[int]) -> list[dict]:
+        """
+        read_tb_concepts_brief_by_ids의 비동기(asyncpg) 버전
+        """
+        session = self.async_db.get_session()
+        rtndata = []
+        try:
+            result = await session.execute(CONCEPTS_BRIEF_SQL, {'ids': list(concept_ids)})
+            rtndata = [dict(row._mapping) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            await session.close()
+        return rtndata
+
+    def read_tb_networks_edges_all(self) -> list[tuple[int, int]]:
+        """
+        tb_networks의 (source_concept_id, target_concept_id) 쌍만 읽어온다
+        """
+        session = self.db.get_session()
+        rtndata = []
+        try:
+            result = session.execute(text("SELECT source_concept_id, target_concept_id FROM tb_networks"))
+            rtndata = [(row[0], row[1]) for row in result]
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
     def delete_tb_networks_all(self) -> Tuple[bool, str]:
+        """
+        tb_networks 테이블을 비우고, 같은 트랜잭션에서 tb_concepts의 source_num, target_num을 0으로 되돌린다
+        """
         rtncd = 900
         rtnmsg = '실패'
 
         session = self.db.get_session()
         try:
             session.query(Networks).delete()
+            session.execute(text("""
+                UPDATE tb_concepts
+                   SET source_num = 0,
+                       target_num = 0
+                 WHERE source_num IS DISTINCT FROM 0
+                    OR target_num IS DISTINCT FROM 0
+            """))
             session.commit()
+            self.graph_version.increase_tb_graph_version(session)
             rtncd = 200
             rtnmsg = '성공'
         except Exception as e:
@@ -75,5 +353,7 @@ class NetworksRepository():
             session.rollback()
             rtncd = 900
             rtnmsg = '실패'
+        finally:
+            session.close()
 
-        return rtncd, rtnmsg
\ No newline at end of file
+        return rtncd, rtnmsg
@@ -2,19 +2,40 @@
 from networks.networksrepository import NetworksRepository
 from common.llmroute.llmrouter import LLMRouter
 from common.algebra.algebra import cosine_similarity
+from common.algebra.graph import rank_components_by_density
+from common.algebra.knngraph import nn_descent, knn_recall
+from common.algebra.projection import random_projection_axes, to_vector_literal, DEFAULT_PROJECTION_SEED, RANDOM_PROJECTION_SCALE
+from common.system.streaming import arrow_ipc_chunks
+from concepts.conceptsmodel import Concepts
+import pyarrow as pa
+import numpy as np
 import traceback
 
+# 그래프 스냅샷(Arrow IPC) 노드 스키마, targets는 해당 노드가 source인 연결의 target id 목록
+SNAPSHOT_SCHEMA = pa.schema([
+    ('id',         pa.int32()),
+    ('title',      pa.string()),
+    ('keywords',   pa.string()),
+    ('summary',    pa.string()),
+    ('data_name',  pa.string()),
+    ('category',   pa.dictionary(pa.int32(), pa.string())),
+    ('source_num', pa.int32()),
+    ('target_num', pa.int32()),
+    ('x',          pa.float32()),
+    ('y',          pa.float32()),
+    ('targets',    pa.list_(pa.int32())),
+])
+
 class NetworksService:
     #conceptService : ConceptsService
     repository : NetworksRepository
-    llmclients : dict
+    llmroute : LLMRouter
 
     def __init__(self):
         self.repository = NetworksRepository()
         #conceptService = ConceptsService()
 
-        llmrouter = LLMRouter()
-        self.llmclients = llmrouter.get_clients_all()
+        self.llmroute = LLMRouter.get_instance()
         pass
 
     def engage_keyconcepts_into_networks(self, options: dict):
@@ -26,6 +47,12 @@ class NetworksService:
                 - 'cosine_distance' : 코사인 거리를 이용한 유사도 측정
                 - 'max_inner_product' : 내적을 이용한 유사도 측정
                 - 'l1_distance' : L1 거리를 이용한 유사도 측정
+                - 'nn_descent' : NN-descent 근사 kNN 그래프 (코사인 유사도, 대량 데이터용)
+            - k : 개념별 연결 수 (기본 3)
+            - cosine_sim_check : "true"이면 코사인 유사도 0.7 초과인 경우만 연결
+            - batch_size : 연결 저장 배치 크기 (기본 1000)
+        - return
+            - dict : 연결 결과 요약 (nn_descent인 경우 반복정보, 재현율 포함)
         """
         from concepts.conceptsservice import ConceptsService
         conceptService = ConceptsService()
@@ -35,29 +62,269 @@ class NetworksService:
             operation = options['operation']
         else:
             operation = 'cosine_distance'
+        k = int(options['k']) if 'k' in options else 3
+        cosine_sim_check = options['cosine_sim_check'] if 'cosine_sim_check' in options else "false"
+        batch_size = int(options['batch_size']) if 'batch_size' in options else 1000
+
+        if operation == 'nn_descent':
+            return self.engage_keyconcepts_with_nn_descent(conceptService, options, k, cosine_sim_check, batch_size)
 
         # 네트워크 관계 저장
+        # 연결은 batch_size 단위로 모아 한 트랜잭션에서 저장하고, 개념별 연결 수도 함께 갱신한다
         result = conceptService.get_concepts()
-        cosine_sim_check = options['cosine_sim_check'] if 'cosine_sim_check' in options else "false"
+        edge_count = 0
         if result['status'] == 'success':
             keyconcepts = result['data']
+            network_list = []
             for c in keyconcepts:
                 try:
                     # TODO: 연관성을 검사하는 것은 아니고, 의미적 유사도를 측정하는 것임. 연관성, 찬/반을 따지려면 어떻게 해야할까??
-                    nearest_list = conceptService.read_concepts_nearest_by_embedding(c, operation, 3)
+                    nearest_list = conceptService.read_concepts_nearest_by_embedding(c, operation, k)
                     for nearest in nearest_list['data']:
                         if cosine_sim_check == "true" and cosine_similarity(c.embedding, nearest.embedding) > 0.7:
-                            self.repository.create_network_connections_tb_networks(str(c.id), str(nearest.id))
+                            network_list.append({'source_concept_id':str(c.id), 'target_concept_id':str(nearest.id)})
                         elif cosine_sim_check == "false":
-                            self.repository.create_network_connections_tb_networks(str(c.id), str(nearest.id))
+                            network_list.append({'source_concept_id':str(c.id), 'target_concept_id':str(nearest.id)})
                 except Exception as e:
                     traceback.print_exc()
                     continue
+
+                if len(network_list) >= batch_size:
+                    edge_count += self.create_networks_list(network_list)
+                    network_list = []
+            edge_count += self.create_networks_list(network_list)
         else:
             raise Exception('fail to get concepts')
 
+        return {'operation': operation, 'concept_count': len(keyconcepts), 'edge_count': edge_count}
+
+    def create_networks_list(self, network_list: list[dict]) -> int:
+        """
+        연결 리스트를 한 트랜잭션으로 저장하고 저장한 연결 수를 반환한다, 저장에 실패하면 예외를 던져 연결을 중단한다
+        """
+        rtncd, rtnmsg = self.repository.create_tb_networks_list(network_list)
+        if rtncd != 200:
+            print(f"LOG-ERROR: network save failed ({len(network_list)} edges) - {rtnmsg}")
+            raise Exception(f"network save failed - {rtnmsg}")
+        return len(network_list)
+
     def read_networks_all(self):
         return self.repository.read_tb_networks_all()
 
+    def engage_keyconcepts_with_nn_descent(self, conceptService, options: dict, k: int, cosine_sim_check: str, batch_size: int) -> dict:
+        """
+        NN-descent로 근사 kNN 그래프를 만들어 네트워크로 저장한다
+
+        - 정확한 전체쌍 탐색(O(N²)) 대신 이웃의 이웃을 반복 비교하여 대량 데이터에서도 빠르게 연결한다
+        - 임베딩의 0 패딩 차원은 잘라내고 계산한다
+        - options
+            - build_k : 그래프 구성시 노드별 이웃 수, 클수록 정확하고 느림 (기본 max(k, 15))
+            - max_iterations : 최대 반복 횟수 (기본 10)
+            - sample_rate : 반복마다 비교할 이웃의 이웃 비율, 클수록 정확하고 느림 (기본 0.3)
+            - delta : 갱신 비율이 이보다 작으면 조기 종료 (기본 0.001)
+            - recall_sample_size : 정확한 탐색과 비교할 표본 수, 0이면 생략 (기본 100)
+            - random_state : 난수 시드
+        """
+        build_k = int(options['build_k']) if 'build_k' in options else max(k, 15)
+        max_iterations = int(options['max_iterations']) if 'max_iterations' in options else 10
+        sample_rate = float(options['sample_rate']) if 'sample_rate' in options else 0.3
+        delta = float(options['delta']) if 'delta' in options else 0.001
+        recall_sample_size = int(options['recall_sample_size']) if 'recall_sample_size' in options else 100
+        random_state = options['random_state'] if 'random_state' in options else None
+
+        # 임베딩 행렬 구성 (0 패딩 제거)
+        concept_ids = []
+        embeddings = []
+        effective_dim = 0
+        for concept_id, embedding in conceptService.repository.read_tb_concepts_id_embedding_all():
+            embedding = np.asarray(embedding, dtype=np.float32)
+            nonzero = np.flatnonzero(embedding)
+            dim = int(nonzero[-1]) + 1 if len(nonzero) > 0 else 0
+            concept_ids.append(concept_id)
+            embeddings.append(embedding[:dim])
+            effective_dim = max(effective_dim, dim)
+        if len(concept_ids) < 2:
+            return {'operation': 'nn_descent', 'concept_count': len(concept_ids), 'edge_count': 0}
+
+        matrix = np.zeros((len(embeddings), effective_dim), dtype=np.float32)
+        for i, embedding in enumerate(embeddings):
+            matrix[i, :len(embedding)] = embedding
+        del embeddings
+
+        indices, similarities, stats = nn_descent(
+            matrix,
+            k = max(k, build_k),
+            max_iterations = max_iterations,
+            sample_rate = sample_rate,
+            delta = delta,
+            random_state = random_state
+        )
+        indices, similarities = indices[:, :k], similarities[:, :k]
+        recall = knn_recall(matrix, indices, recall_sample_size, random_state) if recall_sample_size > 0 else None
+
+        # 네트워크 관계 저장
+        edge_count = 0
+        network_list = []
+        for i in range(len(concept_ids)):
+            for j, similarity in zip(indices[i], similarities[i]):
+                if not np.isfinite(similarity):
+                    continue
+                if cosine_sim_check == "true" and similarity <= 0.7:
+                    continue
+                network_list.append({'source_concept_id':str(concept_ids[i]), 'target_concept_id':str(concept_ids[j])})
+            if len(network_list) >= batch_size:
+                edge_count += self.create_networks_list(network_list)
+                network_list = []
+        edge_count += self.create_networks_list(network_list)
+
+        return {
+            'operation': 'nn_descent',
+            'concept_count': len(concept_ids),
+            'edge_count': edge_count,
+            'dimension': effective_dim,
+            'build_k': max(k, build_k),
+            'iterations': stats['iterations'],
+            'updates': stats['updates'],
+            'elapsed_sec': stats['elapsed_sec'],
+            'recall': recall
+        }
+
+    def read_networks_snapshot(self, seed: int = DEFAULT_PROJECTION_SEED, batch_size: int = 10000):
+        """
+        시각화용 그래프 스냅샷을 Arrow IPC 스트림 바이트 청크로 반환한다
+
+        - 노드 속성, 2차원 좌표(x, y), 노드별 연결 목록(targets)을 한 테이블에 담는다
+        - 좌표는 저장된 배치 좌표(pos_x, pos_y)를 쓰고, 아직 배치되지 않은 개념은 가장 최근 배치의 투영식으로,
+          배치가 한 번도 없으면 seed로 고정한 무작위 투영(배치와 같은 표준편차 0.5)으로 DB에서 계산하므로 임베딩을 읽어오지 않는다
+        - category는 전체 카테고리 목록을 사전으로 하는 dictionary 컬럼이다
+        """
+        categories = self.repository.read_tb_concepts_categories()
+        category_index = {category: i for i, category in enumerate(categories)}
+        dictionary = pa.array(categories, type=pa.string())
+
+        dim = Concepts.__table__.c.embedding.type.dim
+        axes = [to_vector_literal(axis) for axis in random_projection_axes(dim, 2, seed)]
+
+        def batches():
+            for rows in self.repository.read_tb_networks_snapshot_stream(axes, RANDOM_PROJECTION_SCALE, batch_size):
+                columns = list(zip(*rows))
+                category = pa.DictionaryArray.from_arrays(
+                    pa.array([category_index.get(c) for c in columns[5]], type=pa.int32()), dictionary)
+                yield pa.record_batch([
+                    pa.array(columns[0], type=pa.int32()),
+                    pa.array(columns[1], type=pa.string()),
+                    pa.array(columns[2], type=pa.string()),
+                    pa.array(columns[3], type=pa.string()),
+                    pa.array(columns[4], type=pa.string()),
+                    category,
+                    pa.array(columns[6], type=pa.int32()),
+                    pa.array(columns[7], type=pa.int32()),
+                    pa.array(columns[8], type=pa.float32()),
+                    pa.array(columns[9], type=pa.float32()),
+                    pa.array(columns[10], type=pa.list_(pa.int32())),
+                ], schema=SNAPSHOT_SCHEMA)
+
+        return arrow_ipc_chunks(SNAPSHOT_SCHEMA, batches())
+
+    def read_networks_neighborhood(self, concept_id: int, hops: int, max_nodes: int, max_edges: int) -> dict:
+        """
+        concept_id를 중심으로 hops 이내의 이웃 부분그래프를 조회한다
+        - 노드는 거리, 연결 수 순으로 max_nodes개, 연결은 그 노드들 사이에서 max_edges개까지 반환한다
+        """
+        nodes = self.repository.read_tb_networks_neighborhood(concept_id, hops, max_nodes + 1)
+        truncated = len(nodes) > max_nodes
+        nodes = nodes[:max_nodes]
+
+        edges = self.repository.read_tb_networks_induced([n['id'] for n in nodes], max_edges + 1)
+        truncated = truncated or len(edges) > max_edges
+        return {
+            'nodes': nodes,
+            'edges': edges[:max_edges],
+            'truncated': truncated
+        }
+
+    async def read_networks_neighborhood_async(self, concept_id: int, hops: int, max_nodes: int, max_edges: int) -> dict:
+        """
+        read_networks_neighborhood의 비동기 버전
+        """
+        nodes = await self.repository.read_tb_networks_neighborhood_async(concept_id, hops, max_nodes + 1)
+        truncated = len(nodes) > max_nodes
+        nodes = nodes[:max_nodes]
+
+        edges = await self.repository.read_tb_networks_induced_async([n['id'] for n in nodes], max_edges + 1)
+        truncated = truncated or len(edges) > max_edges
+        return {
+            'nodes': nodes,
+            'edges': edges[:max_edges],
+            'truncated': truncated
+        }
+
+    def read_networks_subgraph(self, concept_ids: list[int], max_nodes: int, max_edges: int) -> dict:
+        """
+        concept_ids 사이의 유도 부분그래프를 조회한다
+        - 노드가 max_nodes개를 넘으면 연결 수가 많은 개념부터 남긴다
+        """
+        nodes = self.repository.read_tb_concepts_brief_by_ids(list(set(concept_ids)))
+        truncated = len(nodes) > max_nodes
+        nodes = nodes[:max_nodes]
+
+        edges = self.repository.read_tb_networks_induced([n['id'] for n in nodes], max_edges + 1)
+        truncated = truncated or len(edges) > max_edges
+        return {
+            'nodes': nodes,
+            'edges': edges[:max_edges],
+            'truncated': truncated
+        }
+
+    async def read_networks_subgraph_async(self, concept_ids: list[int], max_nodes: int, max_edges: int) -> dict:
+        """
+        read_networks_subgraph의 비동기 버전
+        """
+        nodes = await self.repository.read_tb_concepts_brief_by_ids_async(list(set(concept_ids)))
+        truncated = len(nodes) > max_nodes
+        nodes = nodes[:max_nodes]
+
+        edges = await self.repository.read_tb_networks_induced_async([n['id'] for n in nodes], max_edges + 1)
+        truncated = truncated or len(edges) > max_edges
+        return {
+            'nodes': nodes,
+            'edges': edges[:max_edges],
+            'truncated': truncated
+        }
+
+    def read_networks_densest_components(self, topn: int, max_nodes: int, max_edges: int) -> list[dict]:
+        """
+        평균차수(2E/V) 기준으로 가장 밀집된 연결요소 topn개를 조회한다
+        - max_nodes, max_edges는 응답 전체에 적용되며, 한도에 걸린 연결요소는 truncated로 표시한다
+        """
+        ranked = rank_components_by_density(self.repository.read_tb_networks_edges_all())
+
+        components = []
+        remain_nodes = max_nodes
+        remain_edges = max_edges
+        for rank, component in enumerate(ranked[:topn], start=1):
+            if remain_nodes <= 0:
+                break
+            subgraph = self.read_networks_subgraph(component['nodes'], remain_nodes, remain_edges)
+            remain_nodes -= len(subgraph['nodes'])
+            remain_edges -= len(subgraph['edges'])
+            components.append({
+                'rank': rank,
+                'node_count': component['node_count'],
+                'edge_count': component['edge_count'],
+                'density': component['density'],
+                **subgraph
+            })
+        return components
+
+    def read_graph_version(self) -> int:
+        """
+        개념/연결이 바뀔 때마다 올라가는 그래프 버전을 반환한다 (ETag, 응답 캐시 키)
+        """
+        return self.repository.graph_version.read_tb_graph_version()
+
+    def read_networks_stream(self):
+        return self.repository.read_tb_networks_stream()
+
     def delete_networks_all(self):
         return self.repository.delete_tb_networks_all()
\ No newline at end of file
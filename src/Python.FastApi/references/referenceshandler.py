@@ -1,9 +1,10 @@
 from typing import Annotated
 from starlette import status as status
 from fastapi import APIRouter, Depends, Body
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from references.referencesservice import ReferencesService
 from common.models.responseDTO import ResponseDTO
+from common.system.streaming import stream_chunks, prime_rows
 import json
 
 router = APIRouter(
@@ -46,16 +47,16 @@ def delete_refereces_all(
 @router.post(
     "/expand",
     summary="주요개념 확장을 위해 웹검색을 수행하고 저장한다.",
-    description="주요개념 확장을 위해 웹검색을 수행하고 저장한다.",
+    description="주요개념 확장을 위해 웹검색을 수행하고 저장한다. verify_mode가 batch(기본값)이면 검색결과 전체를 한 번의 LLM 호출로 검증하고, 응답을 해석할 수 없을 때만 검색결과별로 다시 검증한다. item이면 검색결과마다 호출한다. 응답에 검증 호출 수와 프롬프트 토큰 수(검색결과별 호출시의 값 포함)가 들어있다. 웹검색 응답은 캐시하며, force_refresh가 \"true\"이면 캐시를 무시하고 다시 검색한다. search_provider로 검색 제공자(naver, google_pse, local)를 고르거나, auto(한도가 남은 첫 제공자), all(모든 제공자 결과를 합침)을 쓸 수 있다. reason_model_name이 auto이면 LLMRouter가 부하를 보고 모델을 고른다. 개념별 진행상황을 기록하므로 중단된 확장을 다시 요청하면 이어서 처리한다. resume이 \"true\"(기본값)이면 REFERENCE_FRESH_SEC 안에 처리를 마친 개념을 건너뛰고, retry_failed가 \"true\"(기본값)이면 실패한 개념을 REFERENCE_MAX_ATTEMPTS번까지 다시 시도한다.",
     responses={
-        status.HTTP_200_OK:                     {"description":"웹검색 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data extracted", "data": "..." } } }, "model": ResponseDTO},
+        status.HTTP_200_OK:                     {"description":"웹검색 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data extracted", "data": { "run_id": "5f0c...", "concept_count": 1000, "skipped_count": 0, "expanded_count": 980, "checkpoints": { "succeeded": 950, "no_reference": 30, "failed": 20 }, "elapsed_sec": 300.0, "verification": { "mode": "batch", "calls": 1000, "calls_itemwise": 10000, "prompt_tokens": 900000, "prompt_tokens_itemwise": 3500000, "fallbacks": 0 } } } } }, "model": ResponseDTO},
         status.HTTP_400_BAD_REQUEST:            {"description":"웹검색 실패", "content":{ "application/json": { "example": { "status": "error", "message": "essential input missing", "data": "options" } } }, "model": ResponseDTO},
         status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"웹검색 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
     },
 )
 def expand_keyconcepts_with_websearch(
     options: Annotated[dict, Body(..., examples=[ 
-        { "action_type": "top", "action_limit": 10, "reason_model_name": "gemma2:9b-instruct-q5_K_M", "quorum_check" : "true" }, 
+        { "action_type": "top", "action_limit": 10, "reason_model_name": "gemma2:9b-instruct-q5_K_M", "quorum_check" : "true", "verify_mode": "batch", "force_refresh": "false", "search_provider": "naver", "resume": "true", "retry_failed": "true" }, 
         { "action_type": "all" } ])],
     service: Annotated[ReferencesService, Depends(get_service)] = get_service,
 ) -> ResponseDTO:
@@ -65,9 +66,9 @@ def expand_keyconcepts_with_websearch(
     status = 0
     content = None
     try:
-        service.expand_keyconcepts_with_websearch(options)
+        result = service.expand_keyconcepts_with_websearch(options)
         status = 200
-        content = ResponseDTO( status='success', message='data extracted', data='' )
+        content = ResponseDTO( status='success', message='data extracted', data=result )
     except Exception as e:
         status = 500
         content = ResponseDTO( status='error', message='internal server error', data=str(e) )
@@ -102,3 +103,113 @@ def get_references(
         content = ResponseDTO( status='error', message='internal server error', data=str(e) )
 
     return JSONResponse(status_code=status, content=dict(content))
+
+@router.get(
+    "/stream",
+    summary="레퍼런스 전체를 스트리밍으로 조회한다.",
+    description="서버측 커서로 tb_references를 id 순으로 읽으며 바로 내보낸다. format=ndjson이면 한 줄에 행 하나(application/x-ndjson), format=json이면 ResponseDTO 형태의 JSON을 청크 단위로 보낸다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"레퍼런스 조회 성공", "content":{ "application/x-ndjson": { "example": "{\"id\":1,\"concept_id\":\"1\",\"description\":\"...\"}\n" }, "application/json": { "example": { "status": "success", "message": "data extracted", "data": "..." } } }},
+        status.HTTP_400_BAD_REQUEST:            {"description":"레퍼런스 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "input validation error", "data": "format" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"레퍼런스 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_references_stream(
+    format: str = 'ndjson',
+    service: Annotated[ReferencesService, Depends(get_service)] = get_service,
+):
+    """
+    레퍼런스 테이블을 전체 결과를 메모리에 올리지 않고 스트리밍으로 조회한다.
+    """
+    if format not in ('ndjson', 'json'):
+        content = ResponseDTO( status='error', message='input validation error', data='format' )
+        return JSONResponse(status_code=400, content=dict(content))
+
+    try:
+        rows = prime_rows(service.read_references_stream())
+    except Exception as e:
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+        return JSONResponse(status_code=500, content=dict(content))
+    chunks, media_type = stream_chunks(rows, format, message='data extracted')
+    return StreamingResponse(chunks, media_type=media_type)
+
+@router.get(
+    "/checkpoints",
+    summary="웹검색 확장 진행상황을 조회한다.",
+    description="tb_reference_checkpoints의 상태별(processing, succeeded, no_reference, failed) 개념 수와 최근 실패한 개념의 사유를 조회한다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"진행상황 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": { "counts": { "succeeded": 950, "no_reference": 30, "failed": 20 }, "recent_failures": [ { "concept_id": 12, "run_id": "5f0c...", "reason": "TimeoutError: ...", "attempts": 1, "update_time": "2024-08-01T12:00:00" } ] } } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"진행상황 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_reference_checkpoints(
+    service: Annotated[ReferencesService, Depends(get_service)] = get_service,
+) -> ResponseDTO:
+    """
+    웹검색 확장 진행상황을 조회한다.
+    """
+    status = 0
+    content = None
+    try:
+        data = service.read_reference_checkpoints()
+        status = 200
+        content = ResponseDTO( status='success', message='data selected', data=data )
+    except Exception as e:
+        status = 500
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+
+    return JSONResponse(status_code=status, content=dict(content))
+
+@router.get(
+    "/websearch-cache",
+    summary="웹검색 캐시 현황을 조회한다.",
+    description="프로세스 시작 후 캐시 적중/실패/만료/강제갱신/만료응답 사용/저장/삭제 횟수와 적중률, 제공자별 캐시 행 수와 누적 적중 수를 조회한다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"캐시 현황 조회 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data selected", "data": { "counters": { "hits": 900, "misses": 100, "expired": 0, "refreshes": 0, "stale_served": 0, "puts": 100, "evictions": 0, "hit_ratio": 0.9 }, "providers": { "naver": { "rows": 100, "hits": 900 } }, "ttl_sec": 604800, "max_rows": 100000 } } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"캐시 현황 조회 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def get_websearch_cache_stats(
+    service: Annotated[ReferencesService, Depends(get_service)] = get_service,
+) -> ResponseDTO:
+    """
+    웹검색 캐시 현황을 조회한다.
+    """
+    status = 0
+    content = None
+    try:
+        data = service.read_websearch_cache_stats()
+        status = 200
+        content = ResponseDTO( status='success', message='data selected', data=data )
+    except Exception as e:
+        status = 500
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+
+    return JSONResponse(status_code=status, content=dict(content))
+
+@router.delete(
+    "/websearch-cache",
+    summary="웹검색 캐시를 비운다.",
+    description="tb_websearch_cache를 모두 삭제한다. 이후 확장시 모든 검색어를 다시 검색한다.",
+    responses={
+        status.HTTP_200_OK:                     {"description":"캐시 삭제 성공", "content":{ "application/json": { "example": { "status": "success", "message": "data deleted", "data": "" } } }, "model": ResponseDTO},
+        status.HTTP_500_INTERNAL_SERVER_ERROR:  {"description":"캐시 삭제 실패", "content":{ "application/json": { "example": { "status": "error", "message": "internal server error", "data": "XXXException occured during ..." } } }, "model": ResponseDTO}
+    },
+)
+def delete_websearch_cache_all(
+    service: Annotated[ReferencesService, Depends(get_service)] = get_service,
+) -> ResponseDTO:
+    """
+    웹검색 캐시를 비운다.
+    """
+    status = 0
+    content = None
+    try:
+        service.delete_websearch_cache_all()
+        status = 200
+        content = ResponseDTO( status='success', message='data deleted', data='' )
+    except Exception as e:
+        status = 500
+        content = ResponseDTO( status='error', message='internal server error', data=str(e) )
+
+    return JSONResponse(status_code=status, content=dict(content))
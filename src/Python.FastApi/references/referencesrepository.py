@@ -1,7 +1,8 @@
 from typing import Tuple
 import traceback
-from sqlalchemy import insert, select
+from sqlalchemy import insert, select, text
 from common.db.db import DB
+from common.db.asyncdb import AsyncDB
 from references.referencesmodel import References
 
 class ReferencesRepository:
@@ -10,6 +11,7 @@ class ReferencesRepository:
     """
     def __init__(self):
         self.db = DB.get_instance()
+        self.async_db = AsyncDB.get_instance()
         pass
 
     def create_reference_into_tb_references(self, reference_list: list[dict]) -> Tuple[int, str]:
@@ -52,6 +54,20 @@ class ReferencesRepository:
 
         return rtndata
 
+    def read_tb_references_stream(self, batch_size: int = 1000):
+        """
+        tb_references 테이블을 서버측 커서로 batch_size개씩 읽어오는 제너레이터
+        """
+        session = self.db.get_session()
+        try:
+            result = session.execute(select(References.id, References.concept_id, References.description)
+                                     .order_by(References.id)
+                                     .execution_options(yield_per=batch_size))
+            for row in result:
+                yield {"id": row[0], "concept_id": row[1], "description": row[2]}
+        finally:
+            session.close()
+
     def delete_tb_references_all(self) -> Tuple[int, str]:
         rtncd = 900
         rtnmsg = '실패'
@@ -59,6 +75,34 @@ class ReferencesRepository:
         session = self.db.get_session()
         try:
             session.query(References).delete()
+            session.execute(text("DELETE FROM tb_reference_checkpoints")) # 레퍼런스가 없어졌으므로 진행상황도 처음부터
+            session.commit()
+            rtncd = 200
+            rtnmsg = '성공'
+        except Exception as e:
+            traceback.print_exc()
+            session.rollback()
+            rtncd = 900
+            rtnmsg = '실패'
+        finally:
+            session.close()
+
+        return rtncd, rtnmsg
+
+    def create_tb_references_with_checkpoint(self, reference_list: list[dict], concept_id: int, run_id: str,
+                                             status: str, reason: str = None) -> Tuple[int, str]:
+        """
+        레퍼런스 저장과 개념의 진행상황 기록을 한 트랜잭션으로 처리한다
+        - 저장 도중 중단되어도 레퍼런스만 저장되고 진행상황이 남지 않는 경우가 없어, 재개시 중복 저장하지 않는다
+        """
+        rtncd = 900
+        rtnmsg = '실패'
+
+        session = self.db.get_session()
+        try:
+            if reference_list:
+                session.execute(insert(References), reference_list)
+            self.upsert_tb_reference_checkpoint(session, concept_id, run_id, status, reason)
             session.commit()
             rtncd = 200
             rtnmsg = '성공'
@@ -70,4 +114,87 @@ class ReferencesRepository:
         finally:
             session.close()
 
-        return rtncd, rtnmsg
\ No newline at end of file
+        return rtncd, rtnmsg
+
+    def update_tb_reference_checkpoint(self, concept_id: int, run_id: str, status: str, reason: str = None) -> Tuple[int, str]:
+        """
+        개념의 진행상황을 기록한다 (레퍼런스 저장 없이)
+        """
+        return self.create_tb_references_with_checkpoint([], concept_id, run_id, status, reason)
+
+    def upsert_tb_reference_checkpoint(self, session, concept_id: int, run_id: str, status: str, reason: str = None):
+        """
+        tb_reference_checkpoints에 개념의 진행상황을 쓴다
+        - 호출한 쪽의 세션/트랜잭션을 그대로 사용한다
+        - 'processing'으로 바뀔 때마다 attempts를 1 올린다
+        """
+        session.execute(text("""
+            INSERT INTO tb_reference_checkpoints (concept_id, run_id, status, reason, attempts, update_time)
+            VALUES (:concept_id, :run_id, :status, :reason, CASE WHEN :status = 'processing' THEN 1 ELSE 0 END, now())
+            ON CONFLICT (concept_id)
+            DO UPDATE SET run_id = EXCLUDED.run_id,
+                          status = EXCLUDED.status,
+                          reason = EXCLUDED.reason,
+                          attempts = tb_reference_checkpoints.attempts + EXCLUDED.attempts,
+                          update_time = EXCLUDED.update_time
+        """), {'concept_id': int(concept_id), 'run_id': run_id, 'status': status, 'reason': reason})
+
+    def read_tb_reference_checkpoints_skip_ids(self, fresh_sec: int, retry_failed: bool, max_attempts: int) -> set[int]:
+        """
+        웹검색 확장을 다시 하지 않아도 되는 개념 id를 읽어온다
+        - fresh_sec초 안에 처리를 마친 개념 (succeeded, no_reference)
+        - 진행상황 기록이 없지만 레퍼런스가 이미 있는 개념 (진행상황 기록 전에 확장한 개념)
+        - retry_failed가 아니면 실패한 개념, 맞으면 max_attempts번 이상 실패한 개념
+        - 중단되어 processing으로 남은 개념은 다시 처리한다
+        """
+        session = self.db.get_session()
+        rtndata = set()
+        try:
+            result = session.execute(text("""
+                SELECT concept_id
+                  FROM tb_reference_checkpoints
+                 WHERE (status IN ('succeeded', 'no_reference') AND update_time > now() - make_interval(secs => :fresh_sec))
+                    OR (status = 'failed' AND (NOT :retry_failed OR attempts >= :max_attempts))
+                 UNION
+                SELECT DISTINCT r.concept_id::integer
+                  FROM tb_references r
+                 WHERE NOT EXISTS (SELECT 1 FROM tb_reference_checkpoints c WHERE c.concept_id = r.concept_id::integer)
+            """), {'fresh_sec': fresh_sec, 'retry_failed': retry_failed, 'max_attempts': max_attempts})
+            rtndata = {row[0] for row in result}
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
+
+    def read_tb_reference_checkpoints_summary(self, failure_limit: int = 20) -> dict:
+        """
+        진행상황별 개념 수와 최근 실패 목록을 읽어온다
+        """
+        session = self.db.get_session()
+        rtndata = {}
+        try:
+            counts = session.execute(text("""
+                SELECT status, count(*) AS concept_count FROM tb_reference_checkpoints GROUP BY status
+            """))
+            failures = session.execute(text("""
+                SELECT concept_id, run_id, reason, attempts, update_time
+                  FROM tb_reference_checkpoints
+                 WHERE status = 'failed'
+                 ORDER BY update_time DESC
+                 LIMIT :limit
+            """), {'limit': failure_limit})
+            rtndata = {
+                'counts': {row.status: row.concept_count for row in counts},
+                'recent_failures': [
+                    {**dict(row._mapping), 'update_time': row.update_time.isoformat() if row.update_time else None}
+                    for row in failures
+                ]
+            }
+        except Exception as e:
+            traceback.print_exc()
+            raise
+        finally:
+            session.close()
+        return rtndata
@@ -1,16 +1,66 @@
 import traceback
-import urllib.request
-import certifi
-import json
+import threading
+import time
+import uuid
 from concepts.conceptsmodel import Concepts
 from references.referencesrepository import ReferencesRepository
 from common.llmroute.llmrouter import LLMRouter
 from common.llmroute.baseclient import BaseClient
 from common.system.constants import Constants
+from common.websearch.searchrouter import SearchRouter
+from common.db.websearchcache import WebSearchCacheRepository, normalize_search_query
 from concurrent.futures import ThreadPoolExecutor
 from common.llmroute.openaiclient import OpenAIClient
 from common.llmroute.ollamaclient import OllamaClient
 
+# 웹검색 캐시에 이만큼 저장할 때마다 한 번씩 용량 초과분을 지운다
+WEBSEARCH_CACHE_EVICT_EVERY = 100
+
+# 검색결과 하나의 검증 결과 구조화출력 스키마
+VERIFICATION_SCHEMA = {
+    "type" : "object",
+    "properties" : {
+        "persona" : {
+            "description" : "persona of the document writer",
+            "type" : "string"
+        },
+        "decision" : {
+            "description" : "True or False",
+            "type" : "string"
+        },
+        "detailed" : {
+            "description" : "detailed description of the decision",
+            "type" : "string"
+        },
+    },
+    "required" : ["persona", "decision", "detailed"],
+    "additionalProperties" : False
+}
+
+# 검색결과 전체를 한 번에 검증하는 구조화출력 스키마 (문서 번호 index를 붙인 검증 결과 배열)
+BATCH_VERIFICATION_SCHEMA = {
+    "type" : "object",
+    "properties" : {
+        "results" : {
+            "type" : "array",
+            "items" : {
+                "type" : "object",
+                "properties" : {
+                    "index" : {
+                        "description" : "document number",
+                        "type" : "integer"
+                    },
+                    **VERIFICATION_SCHEMA["properties"]
+                },
+                "required" : ["index", "persona", "decision", "detailed"],
+                "additionalProperties" : False
+            }
+        }
+    },
+    "required" : ["results"],
+    "additionalProperties" : False
+}
+
 class ReferencesService:
     """
     references 로직을 처리한다.
@@ -18,7 +68,15 @@ class ReferencesService:
     def __init__(self):
         self.repository = ReferencesRepository()
         self.constants = Constants.get_instance()
-        self.llmroute = LLMRouter()
+        self.llmroute = LLMRouter.get_instance()
+
+        # 웹검색은 SearchRouter의 이벤트 루프에서, LLM 호출은 LLMRouter의 이벤트 루프에서 실행하여 한쪽이 느려도 다른 쪽을 막지 않는다
+        self.search_router = SearchRouter.get_instance()
+        self.stats_lock = threading.Lock()
+
+        # 웹검색 응답 캐시 (tb_websearch_cache)와 프로세스 내 적중/실패 카운터
+        self.websearch_cache = WebSearchCacheRepository()
+        self.websearch_cache_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'refreshes': 0, 'stale_served': 0, 'puts': 0, 'evictions': 0}
 
     def delete_refereces_all(self):
         """
@@ -33,6 +91,12 @@ class ReferencesService:
         """
         return self.repository.read_tb_references_all()
 
+    def read_references_stream(self):
+        """
+        references를 하나씩 내보내는 제너레이터를 반환한다.
+        """
+        return self.repository.read_tb_references_stream()
+
     def expand_keyconcepts_with_websearch(self, options: dict):
         """
         주요개념 확장을 위해 웹검색을 수행하고 저장한다
@@ -42,6 +106,11 @@ class ReferencesService:
         action_type = options['action_type'] if 'action_type' in options else 'all'
         action_limit = options['action_limit'] if 'action_limit' in options else 10
         quorum_check = options['quorum_check'] if 'quorum_check' in options else 'true'
+        verify_mode = options['verify_mode'] if 'verify_mode' in options else 'batch'
+        force_refresh = (options['force_refresh'] if 'force_refresh' in options else 'false') == 'true'
+        search_provider = options['search_provider'] if 'search_provider' in options else 'naver'
+        resume = (options['resume'] if 'resume' in options else 'true') == 'true'
+        retry_failed = (options['retry_failed'] if 'retry_failed' in options else 'true') == 'true'
 
         concepts = []
         if action_type == 'top':
@@ -49,32 +118,165 @@ class ReferencesService:
         elif action_type == 'all':
             concepts.extend(conceptService.get_concepts()['data'])
 
-        # 검색 병렬 처리
+        # 이어하기 : 최근에 처리를 마친 개념(레퍼런스가 이미 있는 개념 포함)은 건너뛴다
+        run_id = uuid.uuid4().hex
+        concept_count = len(concepts)
+        if resume:
+            skip_ids = self.repository.read_tb_reference_checkpoints_skip_ids(
+                self.constants.reference_fresh_sec, retry_failed, self.constants.reference_max_attempts)
+            concepts = [concept for concept in concepts if concept.id not in skip_ids]
+        print(f"LOG-INFO : 웹검색 확장 {run_id} - 대상 {concept_count}건 중 {concept_count - len(concepts)}건 건너뜀")
+
+        # 개념 단위로 병렬 처리, 개념 안의 웹검색/LLM 호출은 각각의 풀에서 실행한다
         reason_model_name = options['reason_model_name'] if 'reason_model_name' in options else 'gemma2:9b-instruct-q5_K_M'
-        llmclient = self.llmroute.get_client_by_modelname(reason_model_name)
-        #TODO : 프로그레스바 추가
+        if reason_model_name == 'auto':
+            llmclient = self.llmroute.get_client_by_category('bulk')
+        else:
+            llmclient = self.llmroute.get_client_by_modelname(reason_model_name)
         #TODO : 비용추계 추가
-        results = []
-        for concept in concepts:
-            results.append(self.expand_one_concept_with_websearch(concept, llmclient, quorum_check))
-        #TODO : OpenAI의 경우 병렬호출, 그외에는 웹검색만 병렬호출
-        #pool = ThreadPoolExecutor(max_workers=self.constants.thread_global_thread_pool)
-        #results = list(
-        #        pool.map(
-        #            lambda concept: self.expand_one_concept_with_websearch(concept, llmclient), concepts
-        #        )
-        #    )
+        begin_time = time.perf_counter()
+        done_count = 0
+        done_lock = threading.Lock()
+        stats = {}
+
+        def expand(concept):
+            nonlocal done_count
+            result = self.expand_one_concept_with_websearch(concept, llmclient, quorum_check, verify_mode, stats, force_refresh, search_provider, run_id)
+            with done_lock:
+                done_count += 1
+                if done_count % 10 == 0 or done_count == len(concepts):
+                    print(f"LOG-INFO : 웹검색 확장 {done_count}/{len(concepts)} ({time.perf_counter() - begin_time:.1f}s)")
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.constants.reference_concept_parallel, len(concepts)))) as pool:
+            results = list(pool.map(expand, concepts))
 
         # 결과 확인
         successful_results = [result for result in results if result is not None]
         print(f"LOG-DEBUG {len(successful_results)}건 처리됨)")
+        print(f"LOG-INFO : 검증 호출 {stats.get('verification_calls', 0)}회 (검색결과별 호출시 {stats.get('verification_calls_itemwise', 0)}회), "
+              f"프롬프트 토큰 {stats.get('verification_prompt_tokens', 0)} (검색결과별 호출시 {stats.get('verification_prompt_tokens_itemwise', 0)})")
+        return {
+            'run_id': run_id,
+            'concept_count': concept_count,
+            'skipped_count': concept_count - len(concepts),
+            'expanded_count': len(successful_results),
+            'checkpoints': {status: stats.get(f'concepts_{status}', 0) for status in ('succeeded', 'no_reference', 'failed')},
+            'elapsed_sec': round(time.perf_counter() - begin_time, 3),
+            'websearch_cache': dict(self.websearch_cache_stats),
+            'verification': {
+                'mode': verify_mode,
+                'calls': stats.get('verification_calls', 0),
+                'calls_itemwise': stats.get('verification_calls_itemwise', 0),
+                'prompt_tokens': stats.get('verification_prompt_tokens', 0),
+                'prompt_tokens_itemwise': stats.get('verification_prompt_tokens_itemwise', 0),
+                'fallbacks': stats.get('verification_fallbacks', 0)
+            }
+        }
+
+    def generate(self, llmclient : BaseClient, prompt : str, options : dict):
+        """
+        LLMRouter의 이벤트 루프에서 llmclient.agenerate를 실행하고 Future를 반환한다
+        - 기다리는 LLM 호출이 스레드를 차지하지 않으므로 검증 호출을 한꺼번에 많이 띄울 수 있다
+        - Ollama 모델의 동시호출 제한은 OllamaClient가 OllamaScheduler로 처리한다 (대량 작업이므로 bulk 우선순위)
+        """
+        async def call():
+            with self.llmroute.track(llmclient):
+                return await llmclient.agenerate(prompt = prompt, options = options)
+        return self.llmroute.submit(call())
 
+    def get_data(self, future) -> dict:
+        """
+        generate가 반환한 Future의 응답 데이터, LLM 호출이 실패했으면(재시도 후에도) 예외
+        """
+        response = future.result()
+        if response.status != 100 or response.data is None:
+            raise Exception(f'LLM call failed - {response.message}')
+        return response.data
+
+    def search_websearch_cached(self, provider : str, search_keyword : str, force_refresh : bool = False) -> dict:
+        """
+        웹검색 응답을 캐시(tb_websearch_cache)에서 찾고, 없거나 WEBSEARCH_CACHE_TTL_SEC보다 오래되었으면 다시 검색한다
+        - provider : SearchRouter의 제공자 이름 또는 'auto', 'all' (캐시 키에도 그대로 쓴다)
+        - force_refresh이면 캐시를 읽지 않고 다시 검색하여 덮어쓴다
+        - 만료된 응답이 있는데 재검색이 실패하면 만료된 응답을 대신 반환한다
+        - 캐시 DB 오류는 캐시가 없는 것으로 보고 검색을 계속한다
+        - 저장할 때마다 WEBSEARCH_CACHE_EVICT_EVERY번에 한 번씩 WEBSEARCH_CACHE_MAX_ROWS를 넘는 행을 지운다
+        """
+        query = normalize_search_query(search_keyword)
+        cached = None
+        if force_refresh:
+            self.add_websearch_cache_stats('refreshes')
+        else:
+            try:
+                cached = self.websearch_cache.read_tb_websearch_cache(provider, query)
+            except Exception:
+                cached = None
+            if cached is not None and cached[1] <= self.constants.websearch_cache_ttl_sec:
+                self.add_websearch_cache_stats('hits')
+                return cached[0]
+            self.add_websearch_cache_stats('expired' if cached is not None else 'misses')
+
+        try:
+            response = self.search_router.search(search_keyword, provider)
+        except Exception as e:
+            if cached is None:
+                raise
+            print(f"LOG-ERROR : 재검색 실패, 만료된 캐시 응답을 사용합니다 - {str(e)}")
+            self.add_websearch_cache_stats('stale_served')
+            return cached[0]
+
+        rtncd, _ = self.websearch_cache.upsert_tb_websearch_cache(provider, query, response)
+        if rtncd == 200 and self.add_websearch_cache_stats('puts') % WEBSEARCH_CACHE_EVICT_EVERY == 0:
+            evicted = self.websearch_cache.delete_tb_websearch_cache_overflow(self.constants.websearch_cache_max_rows)
+            self.add_websearch_cache_stats('evictions', evicted)
+        return response
 
-    def expand_one_concept_with_websearch(self, concept : Concepts, llmclient : BaseClient, quorum_check : str):
+    def add_websearch_cache_stats(self, key : str, value : int = 1) -> int:
+        with self.stats_lock:
+            self.websearch_cache_stats[key] += value
+            return self.websearch_cache_stats[key]
+
+    def read_websearch_cache_stats(self) -> dict:
+        """
+        웹검색 캐시 현황, 프로세스 시작 후 카운터와 제공자별 행 수/누적 적중 수
+        """
+        with self.stats_lock:
+            counters = dict(self.websearch_cache_stats)
+        lookups = counters['hits'] + counters['misses'] + counters['expired']
+        counters['hit_ratio'] = round(counters['hits'] / lookups, 4) if lookups else None
+        return {
+            'counters': counters,
+            'providers': self.websearch_cache.read_tb_websearch_cache_summary(),
+            'quota': self.search_router.get_providers_status(),
+            'ttl_sec': self.constants.websearch_cache_ttl_sec,
+            'max_rows': self.constants.websearch_cache_max_rows
+        }
+
+    def read_reference_checkpoints(self) -> dict:
+        """
+        웹검색 확장 진행상황, 상태별 개념 수와 최근 실패 목록
+        """
+        return self.repository.read_tb_reference_checkpoints_summary()
+
+    def delete_websearch_cache_all(self):
+        """
+        웹검색 캐시를 비운다
+        """
+        rtncd, rtnmsg = self.websearch_cache.delete_tb_websearch_cache_all()
+        if rtncd != 200:
+            raise Exception(rtnmsg)
+
+    def expand_one_concept_with_websearch(self, concept : Concepts, llmclient : BaseClient, quorum_check : str,
+                                          verify_mode : str = 'batch', stats : dict = None, force_refresh : bool = False,
+                                          search_provider : str = 'naver', run_id : str = None):
         """
         주요개념 하나에 대해 웹검색을 수행하고 저장한다
+        - 진행상황을 tb_reference_checkpoints에 남긴다 (processing -> succeeded, no_reference, failed)
+        - 레퍼런스 저장과 succeeded 기록은 한 트랜잭션이다
         """
         try:
+            self.repository.update_tb_reference_checkpoint(concept.id, run_id, 'processing')
             #--------------------------------------------------------------------------------------------------------
             # 검색어 준비
             headless_format_keyword = {
@@ -104,7 +306,7 @@ class ReferencesService:
             elif isinstance(llmclient, OllamaClient):
                 format = headless_format_keyword
 
-            keyword_gen_results = llmclient.generate(
+            keyword_gen_results = self.get_data(self.generate(llmclient,
                 prompt = """
                         당신은 최고의 기술기업에서 기술의사결정을 책임지는 CTO입니다.
                         오늘은 주니어 엔지니어의 멘토링을 위해 '악마의 대변인' 역할을 맡았습니다.
@@ -124,7 +326,7 @@ class ReferencesService:
                 options = {
                     'format' : format
                 }
-            ).data
+            ))
 
             opposition : str
             search_keyword : str
@@ -132,102 +334,22 @@ class ReferencesService:
                 opposition = keyword_gen_results['opposition']
                 search_keyword = keyword_gen_results['keywords']
                 if opposition is None or search_keyword is None:
-                    return None
+                    return self.finish_checkpoint(concept, run_id, 'no_reference', 'no opposition or keywords generated', stats)
             else:
-                return None
+                return self.finish_checkpoint(concept, run_id, 'no_reference', 'no opposition or keywords generated', stats)
             print(f"LOG-DEBUG : 반대의견 및 검색어 생성결과 - {keyword_gen_results}")
 
             #--------------------------------------------------------------------------------------------------------
             # 웹 검색
-            client_id = self.constants.naver_client_id
-            client_secret = self.constants.naver_client_secret
-            encText = urllib.parse.quote(search_keyword)
-            url = self.constants.naver_webkr_url + encText
-
-            request = urllib.request.Request(url)
-            request.add_header("X-Naver-Client-Id",client_id)
-            request.add_header("X-Naver-Client-Secret",client_secret)
-            response = urllib.request.urlopen(request, cafile=certifi.where())
-            rescode = response.getcode()
-
-            if(rescode==200):
-                response_body = response.read()
-                #print(response_body.decode('utf-8'))
-                #with open('websearch_results.json', 'w', encoding="utf-8") as f:
-                #    f.write(response_body.decode('utf-8'))
-            else:
-                print(f"LOG-ERROR : {rescode} in expand_one_concept_with_websearch")
-            jsonobj = json.loads(response_body)
+            jsonobj = self.search_websearch_cached(search_provider, search_keyword, force_refresh)
 
             #--------------------------------------------------------------------------------------------------------
-            # 비교검증
-            comparison_list = []
-            for item in jsonobj['items']:
-                # 검색결과가 주장에 부합하는지
-                headless_format_compare = {
-                                    "type" : "object",
-                                    "properties" : {
-                                        "persona" : {
-                                            "description" : "persona of the document writer",
-                                            "type" : "string"
-                                        },
-                                        "decision" : {
-                                            "description" : "True or False",
-                                            "type" : "string"
-                                        },
-                                        "detailed" : {
-                                            "description" : "detailed description of the decision",
-                                            "type" : "string"
-                                        },
-                                    },
-                                    "required" : ["persona", "decision", "detailed"],
-                                    "additionalProperties" : False
-                                }
-                full_format_compare = {
-                            "type" : "json_schema",
-                            "json_schema" : {
-                                "name" : "response_schema",
-                                "schema" : headless_format_compare
-                            }
-                        }
-                if isinstance(llmclient, OpenAIClient):
-                    format = full_format_compare
-                elif isinstance(llmclient, OllamaClient):
-                    format = headless_format_compare
-
-                result = llmclient.generate(
-                    prompt = """
-                            당신은 최고의 기술기업에서 기술의사결정을 책임지는 CTO입니다.
-                            오늘은 주니어 엔지니어들의 타운홀 기술 토론회에서 중립적인 검증자로 참여합니다.
-                            주니어 엔지니어들의 기술 설명을 듣고,
-                            근거로 제시한 [DOCUMENT]가 [OPINITON]을 지지하는지 검증합니다.
-                            다음 제시된 형식에 맞춰
-                            [DOCUMENT]를 작성한 사람의 기술적 성향을 파악하고
-                            검증 결과 및 그 상세 내용을 기술합니다.
-                            {
-                                "persona"  : "[DOCUMENT]를 작성한 사람의 배경과 특성을 두 문장으로 기술"
-                                "decision" : "예시) True or False",
-                                "detailed" : "예시) 검증 결과에 대해 한 문단 이내로 상세히 기술"
-                            }
-                            [OPINION]
-                            """ + opposition + """
-                            [DOCUMENT]
-                            """ + item['title'] + " " + item['description'],
-                    options = {
-                        'format' : format
-                    }
-                ).data
-                comparison_list.append(
-                    {
-                        "persona"  : result['persona'],
-                        "decision" : result['decision'],
-                        "detailed" : result['detailed']
-                    }
-                )
+            # 비교검증 (검색결과가 주장에 부합하는지)
+            comparison_list = self.verify_search_items(llmclient, opposition, jsonobj['items'], verify_mode, stats)
             print(f"LOG-DEBUG : 검색결과/주장 부합여부 - {str(comparison_list)}")
 
             # 검색결과의 내용을 종합
-            final_result = llmclient.generate(
+            final_result = self.get_data(self.generate(llmclient,
                 prompt = """
                 당신은 최고의 기술기업에서 기술의사결정을 책임지는 CTO입니다.
                 격론이 오가는 기술 토론회에서 다수의 소프트웨어 엔지니어들이 각자의 의견을 제시하고 있습니다.
@@ -236,7 +358,7 @@ class ReferencesService:
                 [DOCUMENT]
                 """ + str(comparison_list),
                 options = {}
-            ).data['text']
+            ))['text']
             print(f"LOG-DEBUG : 검색결과 종합결과 - {final_result}")
 
             # 다수결 확인
@@ -255,15 +377,198 @@ class ReferencesService:
                     "concept_id" : concept.id,
                     "description" : f"악마의대변인 : {keyword_gen_results['opposition']} // 최종검토의견: {final_result} // 관련근거문서: {str(comparison_list)}"
                 })
-                self.repository.create_reference_into_tb_references(reference_list)
+                self.finish_checkpoint(concept, run_id, 'succeeded', None, stats, reference_list)
             elif quorum_check == 'false':
                 reference_list = []
                 reference_list.append({
                     "concept_id" : concept.id,
                     "description" : f"악마의대변인 : {keyword_gen_results['opposition']} // 최종검토의견: {final_result} / 관련근거문서: {str(comparison_list)}"
                 })
-                self.repository.create_reference_into_tb_references(reference_list)
+                self.finish_checkpoint(concept, run_id, 'succeeded', None, stats, reference_list)
+            else:
+                self.finish_checkpoint(concept, run_id, 'no_reference', f'quorum not met ({true_count}/{true_count + false_count})', stats)
 
             return final_result
         except Exception as e:
             traceback.print_exc()
+            try:
+                self.finish_checkpoint(concept, run_id, 'failed', f'{type(e).__name__}: {str(e)}'[:1000], stats)
+            except Exception:
+                traceback.print_exc()
+            return None
+
+    def finish_checkpoint(self, concept : Concepts, run_id : str, status : str, reason : str, stats : dict, reference_list : list[dict] = None):
+        """
+        개념의 처리 결과를 기록한다 (reference_list가 있으면 같은 트랜잭션으로 저장), 항상 None을 반환한다
+        """
+        rtncd, rtnmsg = self.repository.create_tb_references_with_checkpoint(reference_list or [], concept.id, run_id, status, reason)
+        if rtncd != 200:
+            raise Exception(f'reference save failed - {rtnmsg}')
+        self.add_run_stats(stats, f'concepts_{status}', 1)
+        return None
+
+    def verify_search_items(self, llmclient : BaseClient, opposition : str, items : list[dict], verify_mode : str, stats : dict = None) -> list[dict]:
+        """
+        검색결과 items 각각이 opposition을 지지하는지 LLM으로 검증한다
+        - verify_mode
+          - 'batch' : 모든 검색결과를 번호를 붙여 한 번의 구조화출력 호출로 검증한다
+                      응답을 해석할 수 없으면(개수 불일치, 필드 누락) 검색결과별 호출로 다시 검증한다
+          - 'item' : 검색결과마다 한 번씩 호출한다 (동시에 제출하고 순서대로 모은다)
+        - stats : 호출 수와 프롬프트 토큰 수를 누적한다 (검색결과별 호출시의 값도 함께 누적하여 절감량을 알 수 있다)
+        - return : [{"persona", "decision", "detailed"}, ...] (items 순서)
+        """
+        item_prompts = [self.build_item_verification_prompt(opposition, item) for item in items]
+        if len(items) == 0:
+            return []
+        self.add_run_stats(stats, 'verification_calls_itemwise', len(item_prompts))
+        self.add_run_stats(stats, 'verification_prompt_tokens_itemwise',
+                                    sum(self.count_prompt_tokens(llmclient, prompt) for prompt in item_prompts))
+
+        if verify_mode == 'batch':
+            batch_prompt = self.build_batch_verification_prompt(opposition, items)
+            self.add_run_stats(stats, 'verification_calls', 1)
+            self.add_run_stats(stats, 'verification_prompt_tokens', self.count_prompt_tokens(llmclient, batch_prompt))
+            result = self.get_data(self.generate(llmclient,
+                prompt = batch_prompt,
+                options = {
+                    'format' : self.get_response_format(llmclient, BATCH_VERIFICATION_SCHEMA)
+                }
+            ))
+            comparison_list = self.parse_batch_verification(result, len(items))
+            if comparison_list is not None:
+                return comparison_list
+            print(f"LOG-ERROR : 일괄검증 응답을 해석할 수 없어 검색결과별로 다시 검증합니다")
+            self.add_run_stats(stats, 'verification_fallbacks', 1)
+
+        self.add_run_stats(stats, 'verification_calls', len(item_prompts))
+        self.add_run_stats(stats, 'verification_prompt_tokens',
+                                    sum(self.count_prompt_tokens(llmclient, prompt) for prompt in item_prompts))
+        comparison_futures = [
+            self.generate(llmclient,
+                prompt = prompt,
+                options = {
+                    'format' : self.get_response_format(llmclient, VERIFICATION_SCHEMA)
+                }
+            )
+            for prompt in item_prompts
+        ]
+        comparison_list = []
+        for future in comparison_futures:
+            try:
+                result = self.get_data(future)
+            except Exception as e:
+                # 검색결과 하나의 검증 실패는 건너뛴다 (모두 실패하면 개념 처리 실패)
+                print(f"LOG-ERROR : 검색결과 검증 실패 - {str(e)}")
+                continue
+            comparison_list.append(
+                {
+                    "persona"  : result['persona'],
+                    "decision" : result['decision'],
+                    "detailed" : result['detailed']
+                }
+            )
+        if not comparison_list:
+            raise Exception('all verification calls failed')
+        return comparison_list
+
+    def build_item_verification_prompt(self, opposition : str, item : dict) -> str:
+        return """
+                            당신은 최고의 기술기업에서 기술의사결정을 책임지는 CTO입니다.
+                            오늘은 주니어 엔지니어들의 타운홀 기술 토론회에서 중립적인 검증자로 참여합니다.
+                            주니어 엔지니어들의 기술 설명을 듣고,
+                            근거로 제시한 [DOCUMENT]가 [OPINITON]을 지지하는지 검증합니다.
+                            다음 제시된 형식에 맞춰
+                            [DOCUMENT]를 작성한 사람의 기술적 성향을 파악하고
+                            검증 결과 및 그 상세 내용을 기술합니다.
+                            {
+                                "persona"  : "[DOCUMENT]를 작성한 사람의 배경과 특성을 두 문장으로 기술"
+                                "decision" : "예시) True or False",
+                                "detailed" : "예시) 검증 결과에 대해 한 문단 이내로 상세히 기술"
+                            }
+                            [OPINION]
+                            """ + opposition + """
+                            [DOCUMENT]
+                            """ + item['title'] + " " + item['description']
+
+    def build_batch_verification_prompt(self, opposition : str, items : list[dict]) -> str:
+        documents = "\n".join(
+            f"[DOCUMENT {i}] {item['title']} {item['description']}" for i, item in enumerate(items, start=1)
+        )
+        return """
+                            당신은 최고의 기술기업에서 기술의사결정을 책임지는 CTO입니다.
+                            오늘은 주니어 엔지니어들의 타운홀 기술 토론회에서 중립적인 검증자로 참여합니다.
+                            주니어 엔지니어들의 기술 설명을 듣고,
+                            근거로 제시한 [DOCUMENT 1] ~ [DOCUMENT """ + str(len(items)) + """] 각각이 [OPINION]을 지지하는지 검증합니다.
+                            각 [DOCUMENT]를 작성한 사람의 기술적 성향을 파악하고
+                            검증 결과 및 그 상세 내용을 기술합니다.
+                            results 배열에 [DOCUMENT]의 번호 순서대로 정확히 """ + str(len(items)) + """개의 결과를 다음 형식으로 작성합니다.
+                            {
+                                "results" : [
+                                    {
+                                        "index"    : 1,
+                                        "persona"  : "[DOCUMENT]를 작성한 사람의 배경과 특성을 두 문장으로 기술",
+                                        "decision" : "예시) True or False",
+                                        "detailed" : "예시) 검증 결과에 대해 한 문단 이내로 상세히 기술"
+                                    }
+                                ]
+                            }
+                            [OPINION]
+                            """ + opposition + """
+                            """ + documents
+
+    def parse_batch_verification(self, result, item_count : int):
+        """
+        일괄검증 응답을 검색결과 순서의 비교목록으로 바꾼다
+        - 결과 개수가 다르거나 필드가 빠져있으면 None을 반환한다
+        - index가 모두 있으면 index 순서로, 아니면 응답 순서대로 맞춘다
+        """
+        try:
+            results = result['results']
+            if not isinstance(results, list) or len(results) != item_count:
+                return None
+            indexes = [r.get('index') for r in results]
+            if sorted(indexes) == list(range(1, item_count + 1)):
+                results = sorted(results, key=lambda r: r['index'])
+            return [
+                {
+                    "persona"  : r['persona'],
+                    "decision" : r['decision'],
+                    "detailed" : r['detailed']
+                }
+                for r in results
+            ]
+        except (KeyError, TypeError, AttributeError):
+            return None
+
+    def get_response_format(self, llmclient : BaseClient, schema : dict):
+        """
+        구조화출력 스키마를 클라이언트에 맞는 format 옵션으로 바꾼다
+        - OpenAI는 json_schema로 감싸고, Ollama는 스키마를 그대로 넘긴다
+        """
+        if isinstance(llmclient, OpenAIClient):
+            return {
+                "type" : "json_schema",
+                "json_schema" : {
+                    "name" : "response_schema",
+                    "schema" : schema
+                }
+            }
+        return schema
+
+    def count_prompt_tokens(self, llmclient : BaseClient, text : str) -> int:
+        """
+        프롬프트 토큰 수, 토크나이저가 없는 모델은 글자 수로 어림한다
+        """
+        try:
+            count = llmclient.get_token_count(text)
+            if count is not None:
+                return count
+        except Exception:
+            pass
+        return len(text) // 2
+
+    def add_run_stats(self, stats : dict, key : str, value : int):
+        if stats is None:
+            return
+        with self.stats_lock:
+            stats[key] = stats.get(key, 0) + value
@@ -0,0 +1,80 @@
+"""
+Load test for the read endpoints.
+Usage: python tests/load/read_endpoints_loadtest.py --base-url http://localhost:8111 --concurrency 200 --requests 5000
+- Fires concurrent GET requests at a running server and reports throughput, latency percentiles and errors per path.
+- While it runs, a slow request (e.g. POST /api/extract or POST /api/networks/engage) can be started by hand
+  to check that read latency stays flat instead of queueing behind the threadpool.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/api/concepts?limit=100",
+    "/api/concepts/count",
+    "/api/concepts/1",
+    "/api/networks/neighborhood/1?hops=2&max_nodes=200",
+    "/api/concepts/spatial/viewport?x1=-2&y1=-2&x2=2&y2=2&grid=32",
+    "/api/references",
+]
+
+
+async def worker(client: httpx.AsyncClient, queue: asyncio.Queue, results: dict):
+    while True:
+        try:
+            path = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        begin_time = time.perf_counter()
+        try:
+            response = await client.get(path)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - begin_time
+        stats = results.setdefault(path, {'latencies': [], 'errors': 0})
+        stats['latencies'].append(elapsed)
+        if not ok:
+            stats['errors'] += 1
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def main(args):
+    paths = args.paths or DEFAULT_PATHS
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(paths[i % len(paths)])
+
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        begin_time = time.perf_counter()
+        await asyncio.gather(*[worker(client, queue, results) for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - begin_time
+
+    total = sum(len(s['latencies']) for s in results.values())
+    errors = sum(s['errors'] for s in results.values())
+    print(f"requests={total} concurrency={args.concurrency} elapsed={elapsed:.2f}s "
+          f"throughput={total / elapsed:.1f} req/s errors={errors}")
+    print(f"{'path':<64} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>5}")
+    for path, stats in results.items():
+        latencies = stats['latencies']
+        print(f"{path[:64]:<64} {len(latencies):>6} {statistics.median(latencies) * 1000:>8.1f} "
+              f"{percentile(latencies, 95) * 1000:>8.1f} {percentile(latencies, 99) * 1000:>8.1f} {stats['errors']:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="read endpoint load test")
+    parser.add_argument("--base-url", default="http://localhost:8111")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--paths", nargs="*", help="paths to request in round robin (default: main read endpoints)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,71 @@
+"""
+Startup benchmark: cold start to first served request.
+Usage: python tests/load/startup_benchmark.py --runs 5 --port 8112 --path /api/concepts/count
+- Starts a fresh uvicorn process per run (run from src/Python.FastApi with the same environment as the server)
+  and polls the path until it answers, reporting the time from process spawn to the first successful response.
+- Set OLLAMA_HOST to an unreachable address to check that startup no longer waits on model discovery.
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def measure_once(args) -> tuple[float, float]:
+    """
+    returns (seconds until the first request was served, seconds that first request took)
+    """
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+    begin_time = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=os.environ.copy())
+    try:
+        deadline = begin_time + args.timeout
+        with httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout) as client:
+            while time.perf_counter() < deadline:
+                if process.poll() is not None:
+                    raise RuntimeError(f"server exited with code {process.returncode}")
+                request_time = time.perf_counter()
+                try:
+                    response = client.get(args.path)
+                except httpx.TransportError:
+                    time.sleep(args.poll_interval)
+                    continue
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{args.path} returned {response.status_code}")
+                served_time = time.perf_counter()
+                return served_time - begin_time, served_time - request_time
+        raise TimeoutError(f"no response within {args.timeout}s")
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main(args):
+    cold_starts = []
+    first_requests = []
+    for run in range(args.runs):
+        cold_start, first_request = measure_once(args)
+        cold_starts.append(cold_start)
+        first_requests.append(first_request)
+        print(f"run {run + 1}: cold start to first response {cold_start * 1000:.0f} ms (first request {first_request * 1000:.0f} ms)")
+    print(f"runs={args.runs} path={args.path} median cold start {statistics.median(cold_starts) * 1000:.0f} ms, "
+          f"min {min(cold_starts) * 1000:.0f} ms, max {max(cold_starts) * 1000:.0f} ms, "
+          f"median first request {statistics.median(first_requests) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8112)
+    parser.add_argument("--path", default="/api/concepts/count")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--poll-interval", type=float, default=0.02)
+    main(parser.parse_args())
@@ -0,0 +1,139 @@
+"""
+Unit tests for the incremental JSON parser used by streaming generation.
+Contract: - top-level fields are emitted as soon as their value is complete, whatever the chunking.
+          - a malformed or truncated tail keeps the fields completed before it.
+          - read_json_stream stops a runaway stream at max_tokens and closes it.
+          - a stream that breaks mid-way keeps the completed fields, or raises if there are none.
+"""
+import sys
+import asyncio
+import json
+from pathlib import Path
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import pytest
+from common.llmroute.jsonstream import IncrementalJSONParser, StreamStats, read_json_stream
+
+
+DOCUMENT = {
+	'title': 'quotes "inside", {braces} and \\ slashes',
+	'keywords': ['a', 'b, c', {'nested': [1, 2]}],
+	'score': 0.5,
+	'summary': '요약: 끝'
+}
+
+
+def feed_in_chunks(parser: IncrementalJSONParser, text: str, size: int) -> list:
+	fields = []
+	for i in range(0, len(text), size):
+		fields.extend(parser.feed(text[i:i+size]))
+	return fields
+
+
+@pytest.mark.parametrize('size', [1, 3, 1000])
+def test_fields_are_emitted_in_order_for_any_chunking(size: int) -> None:
+	text = json.dumps(DOCUMENT, ensure_ascii=False, indent=2)
+	parser = IncrementalJSONParser()
+	fields = feed_in_chunks(parser, text, size)
+	assert fields == list(DOCUMENT.items())
+	assert parser.done
+	assert parser.close() == DOCUMENT
+	assert not parser.salvaged
+
+
+def test_field_is_emitted_before_the_object_closes() -> None:
+	parser = IncrementalJSONParser()
+	assert parser.feed('{"title": "t", "summ') == [('title', 't')]
+	assert not parser.done
+
+
+def test_truncated_tail_keeps_completed_fields() -> None:
+	parser = IncrementalJSONParser()
+	parser.feed('{"title": "t", "keywords": ["k"], "summary": "unfinish')
+	assert parser.close() == {'title': 't', 'keywords': ['k']}
+	assert parser.salvaged
+
+
+def test_truncated_without_fields_raises() -> None:
+	parser = IncrementalJSONParser()
+	parser.feed('{"title": "unfin')
+	with pytest.raises(ValueError):
+		parser.close()
+
+
+def test_trailing_text_after_object_is_ignored() -> None:
+	parser = IncrementalJSONParser()
+	parser.feed('{"a": 1}\n garbage')
+	assert parser.close() == {'a': 1}
+
+
+def test_top_level_array_is_parsed_without_fields() -> None:
+	parser = IncrementalJSONParser()
+	assert parser.feed('[{"a": 1}, 2]') == []
+	assert parser.close() == [{'a': 1}, 2]
+
+
+class Chunks:
+	def __init__(self, chunks: list[str], error: Exception = None):
+		self.chunks = iter(chunks)
+		self.error = error
+		self.closed = False
+
+	def __aiter__(self):
+		return self
+
+	async def __anext__(self):
+		try:
+			return next(self.chunks)
+		except StopIteration:
+			if self.error is not None:
+				raise self.error
+			raise StopAsyncIteration
+
+	async def aclose(self):
+		self.closed = True
+
+
+def test_read_json_stream_reports_fields_and_ttff() -> None:
+	chunks = Chunks(['{"title": "t",', ' "summary": "s"}'])
+	seen = []
+	result = asyncio.run(read_json_stream(chunks, lambda key, value: seen.append(key)))
+	assert result['data'] == {'title': 't', 'summary': 's'}
+	assert seen == ['title', 'summary']
+	assert result['ttff_sec'] is not None
+	assert result['tokens'] == 2
+	assert not result['aborted']
+	assert chunks.closed
+
+
+def test_read_json_stream_aborts_runaway_generation() -> None:
+	chunks = Chunks(['{"title": "t", "summary": "'] + ['x'] * 10000)
+	result = asyncio.run(read_json_stream(chunks, max_tokens=100))
+	assert result['aborted']
+	assert result['salvaged']
+	assert result['tokens'] == 100
+	assert result['data'] == {'title': 't'}
+	assert chunks.closed
+
+
+def test_read_json_stream_keeps_completed_fields_when_the_stream_breaks() -> None:
+	chunks = Chunks(['{"title": "t",', ' "summary": "cut'], ConnectionResetError('peer closed'))
+	result = asyncio.run(read_json_stream(chunks))
+	assert result['interrupted']
+	assert result['salvaged']
+	assert not result['aborted']
+	assert result['data'] == {'title': 't'}
+	assert chunks.closed
+
+	stats = StreamStats()
+	stats.record(result)
+	assert stats.get_stats()['interrupted'] == 1
+	assert stats.get_stats()['salvaged'] == 1
+
+
+def test_read_json_stream_raises_when_the_stream_breaks_before_any_field() -> None:
+	chunks = Chunks(['{"title": "cut'], ConnectionResetError('peer closed'))
+	with pytest.raises(ConnectionResetError):
+		asyncio.run(read_json_stream(chunks))
+	assert chunks.closed
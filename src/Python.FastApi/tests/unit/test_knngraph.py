@@ -0,0 +1,48 @@
+"""
+Unit tests for the NN-descent approximate kNN graph builder.
+Contract: - nn_descent returns k distinct neighbours per node, never the node itself.
+          - recall against exact search stays high on clustered data.
+"""
+import sys
+from pathlib import Path
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import numpy as np
+from common.algebra.knngraph import nn_descent, knn_recall, exact_knn
+
+
+def make_clusters(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+	rng = np.random.default_rng(seed)
+	centers = rng.normal(size=(clusters, dim))
+	return centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dim))
+
+
+def test_nn_descent_neighbours_are_distinct_and_exclude_self() -> None:
+	vectors = make_clusters(300, 16, 10)
+	indices, similarities, stats = nn_descent(vectors, k=5, random_state=1)
+	assert indices.shape == (300, 5)
+	assert stats['iterations'] >= 1
+	for row, neighbours in enumerate(indices):
+		assert row not in neighbours
+		assert len(set(neighbours.tolist())) == 5
+	# similarities are sorted in descending order
+	assert np.all(np.diff(similarities, axis=1) <= 1e-6)
+
+
+def test_nn_descent_recall_against_exact_search() -> None:
+	vectors = make_clusters(1000, 32, 20)
+	indices, _, _ = nn_descent(vectors, k=10, random_state=1)
+	report = knn_recall(vectors, indices, sample_size=200, random_state=2)
+	assert report['sample_size'] == 200
+	assert report['recall'] > 0.9
+
+
+def test_exact_knn_matches_brute_force() -> None:
+	vectors = make_clusters(200, 8, 5)
+	indices, _ = exact_knn(vectors, np.arange(10), 3)
+	normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+	sims = normalized[:10] @ normalized.T
+	sims[np.arange(10), np.arange(10)] = -np.inf
+	expected = np.argsort(-sims, axis=1)[:, :3]
+	assert np.array_equal(np.sort(indices, axis=1), np.sort(expected, axis=1))
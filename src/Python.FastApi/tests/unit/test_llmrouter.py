@@ -0,0 +1,177 @@
+"""
+Unit tests for the LLM router's client selection policy.
+Contract: - bulk work goes to the least loaded local model that still has a free slot.
+          - saturated or too-small local models fall back to the cheapest paid model within budget.
+          - with no paid model in budget, the least busy local model is used even when saturated.
+          - open circuits are skipped unless every candidate is open.
+          - interactive requests pick the lowest expected latency whatever the cost.
+          - budget estimates use the same cost formula as the clients' get_how_much_cost.
+          - routing costs each paid model with its own tokenizer's counts, the same counts check_budget uses.
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import pytest
+from common.llmroute.exchangerate import ExchangeRate
+from common.llmroute.llmrouter import LLMRouter, count_lazy_list_tokens
+from common.llmroute.ollamaclient import OllamaClient
+from common.llmroute.openaiclient import OpenAIClient
+from common.system.constants import Constants
+
+
+USD_KRW = 1000.0
+
+
+@pytest.fixture(autouse=True)
+def fixed_exchange_rate():
+	# a fresh rate keeps OpenAIClient from starting a background lookup
+	rate = ExchangeRate.get_instance()
+	with rate.lock:
+		rate.usd_krw, rate.fetch_time = USD_KRW, time.monotonic()
+	yield
+
+
+def make_ollama(model_name: str, context_length: int = 8192, cost_per_token: float = 0.0) -> OllamaClient:
+	client = OllamaClient(model_name=model_name, options={'cost_per_token': cost_per_token})
+	# model info is normally fetched with ollama.show on first use
+	client.model_details = {'general.architecture': 'llama', 'llama.context_length': context_length}
+	return client
+
+
+def make_openai(model_name: str, cost_per_token: float, context_length: int = 128000) -> OpenAIClient:
+	return OpenAIClient(model_name=model_name, options={
+		'api_key': 'test', 'context_length': context_length, 'cost_per_token': cost_per_token})
+
+
+def make_router(*clients) -> LLMRouter:
+	# bypass the singleton so no llm-loop thread or model discovery is started
+	router = object.__new__(LLMRouter)
+	router.constants = Constants.get_instance()
+	router.lock = threading.Lock()
+	router.clients = {client.model_name: client for client in clients}
+	router.discover_time = time.monotonic()
+	router.loads = {}
+	router.loads_lock = threading.Lock()
+	return router
+
+
+def set_load(router: LLMRouter, client, inflight: int = 0, latency: float = None) -> None:
+	load = router.get_load(client)
+	load['inflight'], load['latency_ewma'] = inflight, latency
+
+
+def saturate(router: LLMRouter, client) -> None:
+	set_load(router, client, inflight=router.constants.ollama_num_parallel, latency=1.0)
+
+
+def markdown_file(tmp_path: Path, text: str) -> list:
+	path = tmp_path / 'doc.md'
+	path.write_text(text, encoding='utf-8')
+	return [(str(path), lambda: path.read_text(encoding='utf-8'))]
+
+
+def test_bulk_prefers_the_fastest_local_model_with_a_free_slot() -> None:
+	slow, fast = make_ollama('slow'), make_ollama('fast')
+	router = make_router(slow, fast, make_openai('gpt-4o-mini', 0.0))
+	set_load(router, slow, latency=3.0)
+	set_load(router, fast, latency=1.0)
+	assert router.get_client_by_category('bulk') is fast
+	# a busy model's expected latency grows with its in-flight requests
+	set_load(router, fast, inflight=router.constants.ollama_num_parallel - 1, latency=2.0)
+	assert router.get_client_by_category('bulk') is slow
+
+
+def test_saturated_local_models_fall_back_to_a_paid_model_in_budget(tmp_path: Path) -> None:
+	local = make_ollama('local')
+	paid = make_openai('gpt-4o-mini', 1e-6)
+	router = make_router(local, paid)
+	saturate(router, local)
+	lazy_list = markdown_file(tmp_path, 'hello world ' * 1000)
+	assert router.estimate_cost(paid, 1000) == pytest.approx(1000 * 1e-6 * USD_KRW * 2)
+	assert router.get_client_by_budget(10.0, lazy_list) is paid
+
+
+def test_saturated_local_model_is_used_when_no_paid_model_fits_the_budget(tmp_path: Path) -> None:
+	busy, busier = make_ollama('busy'), make_ollama('busier')
+	router = make_router(busy, busier, make_openai('gpt-4o-mini', 1e-3))
+	saturate(router, busy)
+	saturate(router, busier)
+	set_load(router, busier, inflight=router.constants.ollama_num_parallel * 2, latency=1.0)
+	assert router.get_client_by_budget(0.01, markdown_file(tmp_path, 'hello world ' * 1000)) is busy
+
+
+def test_routing_costs_paid_models_with_their_tokenizer_counts(tmp_path: Path) -> None:
+	local = make_ollama('local')
+	paid = make_openai('gpt-4o-mini', 1e-6)
+	router = make_router(local, paid)
+	saturate(router, local)
+	text = '한국어 문서와 English words가 섞인 문장입니다. ' * 200
+	lazy_list = markdown_file(tmp_path, text) + [('missing.md', lambda: open('missing.md').read())]
+	# unreadable files are skipped, the rest is counted with the model's own tokenizer
+	tokens = count_lazy_list_tokens(paid, lazy_list)
+	assert tokens == sum(paid.get_token_counts([text]))
+	cost = router.estimate_cost(paid, tokens)
+	assert router.get_client_by_budget(cost, lazy_list) is paid
+	assert router.get_client_by_budget(cost * 0.99, lazy_list) is local
+
+
+def test_local_models_without_enough_context_are_skipped() -> None:
+	small = make_ollama('small', context_length=2048)
+	paid = make_openai('gpt-4o-mini', 1e-6)
+	router = make_router(small, paid)
+	assert router.get_client_by_budget(float('inf'), [], required_context=1000) is small
+	assert router.get_client_by_budget(float('inf'), [], required_context=4096) is paid
+	with pytest.raises(Exception):
+		router.get_client_by_budget(float('inf'), [], required_context=200000)
+
+
+def test_operation_filters_generate_and_embed_models() -> None:
+	generator, embedder = make_ollama('llama3.2'), make_ollama('nomic-embed-text')
+	router = make_router(generator, embedder, make_openai('text-embedding-3-small', 0.0))
+	set_load(router, embedder, latency=0.1)
+	set_load(router, generator, latency=5.0)
+	assert router.get_client_by_budget(float('inf'), [], operation='generate') is generator
+	assert router.get_client_by_budget(float('inf'), [], operation='embed') is embedder
+
+
+def test_open_circuits_are_skipped_unless_every_candidate_is_open() -> None:
+	first, second = make_ollama('first'), make_ollama('second')
+	router = make_router(first, second)
+	set_load(router, first, latency=1.0)
+	set_load(router, second, latency=2.0)
+	for _ in range(first.guard.breaker.threshold):
+		first.guard.breaker.on_failure()
+	assert router.get_client_by_category('bulk') is second
+	for _ in range(second.guard.breaker.threshold):
+		second.guard.breaker.on_failure()
+	assert router.get_client_by_category('bulk') is first
+
+
+def test_interactive_picks_the_lowest_expected_latency_regardless_of_cost() -> None:
+	local = make_ollama('local')
+	paid = make_openai('gpt-4o-mini', 1e-3)
+	router = make_router(local, paid)
+	set_load(router, local, latency=4.0)
+	set_load(router, paid, latency=0.5)
+	assert router.get_client_by_category('interactive') is paid
+	assert router.get_client_by_category('bulk') is local
+
+
+def test_estimate_cost_uses_the_client_cost_formula() -> None:
+	free, metered = make_ollama('free'), make_ollama('metered', cost_per_token=0.01)
+	paid = make_openai('gpt-4o-mini', 1e-6)
+	router = make_router(free, metered, paid)
+	assert router.estimate_cost(free, 1000) == 0.0
+	assert router.estimate_cost(metered, 1000) == pytest.approx(1000 * 0.01 * 2)
+	assert router.estimate_cost(paid, 1000) == pytest.approx(1000 * 1e-6 * USD_KRW * 2)
+	text = '토큰 수로 비용을 계산한다' * 100
+	assert metered.get_how_much_cost(text) == pytest.approx(router.estimate_cost(metered, metered.get_token_count(text)))
+
+
+def test_unknown_category_is_rejected() -> None:
+	with pytest.raises(ValueError):
+		make_router(make_ollama('local')).get_client_by_category('batch')
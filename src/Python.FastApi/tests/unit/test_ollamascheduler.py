@@ -0,0 +1,119 @@
+"""
+Unit tests for the per-model Ollama request queue.
+Contract: - at most `slots` requests run at once, the rest wait up to `max_queue` and beyond that are rejected.
+          - a freed slot is handed to the waiter with the best priority, then the earliest arrival.
+          - a waiter that times out or is cancelled leaves the queue without leaking a slot.
+"""
+import sys
+import asyncio
+import threading
+import time
+from pathlib import Path
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import pytest
+from common.llmroute.ollamascheduler import ModelQueue, QueueFullError
+
+
+def wait_until(condition: callable, timeout: float = 2.0) -> None:
+	deadline = time.monotonic() + timeout
+	while not condition():
+		assert time.monotonic() < deadline, 'condition not reached'
+		time.sleep(0.005)
+
+
+def start_waiter(queue: ModelQueue, priority: str, name: str, order: list) -> threading.Thread:
+	def run():
+		queue.acquire(priority, timeout=2.0)
+		order.append(name)
+	waiting = len(queue.waiting)
+	thread = threading.Thread(target=run, daemon=True)
+	thread.start()
+	# enqueue one at a time so arrival order is deterministic
+	wait_until(lambda: len(queue.waiting) == waiting + 1)
+	return thread
+
+
+def test_slots_are_taken_immediately_then_the_queue_fills_then_rejects() -> None:
+	queue = ModelQueue(slots=2, max_queue=1)
+	assert queue.acquire('bulk') == 0.0
+	assert queue.acquire('bulk') == 0.0
+	order = []
+	waiter = start_waiter(queue, 'bulk', 'waiter', order)
+	with pytest.raises(QueueFullError):
+		queue.acquire('interactive', timeout=0.1)
+	stats = queue.get_stats()
+	assert (stats['active'], stats['waiting']) == (2, 1)
+	assert stats['priorities']['interactive']['rejected'] == 1
+
+	queue.release()
+	waiter.join(2.0)
+	assert order == ['waiter']
+	# the slot was handed over, not returned
+	assert queue.get_stats()['active'] == 2
+
+
+def test_freed_slots_go_to_interactive_first_then_in_arrival_order() -> None:
+	queue = ModelQueue(slots=1, max_queue=10)
+	queue.acquire('bulk')
+	order = []
+	threads = [start_waiter(queue, 'bulk', 'bulk-1', order),
+	           start_waiter(queue, 'interactive', 'interactive-1', order),
+	           start_waiter(queue, 'bulk', 'bulk-2', order),
+	           start_waiter(queue, 'interactive', 'interactive-2', order)]
+	for admitted in range(1, len(threads) + 1):
+		queue.release()
+		wait_until(lambda: len(order) == admitted)
+	assert order == ['interactive-1', 'interactive-2', 'bulk-1', 'bulk-2']
+	queue.release()
+	assert queue.get_stats()['active'] == 0
+
+
+def test_new_requests_do_not_jump_ahead_of_waiters() -> None:
+	queue = ModelQueue(slots=1, max_queue=10)
+	queue.acquire('bulk')
+	order = []
+	start_waiter(queue, 'bulk', 'waiter', order)
+	queue.release()
+	wait_until(lambda: order == ['waiter'])
+	# the slot is now held by the waiter, so a newcomer has to queue
+	with pytest.raises(TimeoutError):
+		queue.acquire('interactive', timeout=0.05)
+
+
+def test_timed_out_waiter_leaves_the_queue() -> None:
+	queue = ModelQueue(slots=1, max_queue=1)
+	queue.acquire('bulk')
+	with pytest.raises(TimeoutError):
+		queue.acquire('bulk', timeout=0.05)
+	stats = queue.get_stats()
+	assert stats['waiting'] == 0
+	assert stats['priorities']['bulk']['timeouts'] == 1
+	queue.release()
+	assert queue.acquire('bulk') == 0.0
+
+
+def test_cancelled_async_waiter_leaves_the_queue_without_leaking_a_slot() -> None:
+	async def scenario():
+		queue = ModelQueue(slots=1, max_queue=5)
+		await queue.acquire_async('bulk')
+		waiter = asyncio.ensure_future(queue.acquire_async('interactive'))
+		await asyncio.sleep(0.01)
+		assert queue.get_stats()['waiting'] == 1
+		waiter.cancel()
+		with pytest.raises(asyncio.CancelledError):
+			await waiter
+		assert queue.get_stats()['waiting'] == 0
+		queue.release()
+		assert queue.get_stats()['active'] == 0
+
+		# admitted waiters report how long they waited
+		await queue.acquire_async('bulk')
+		waiter = asyncio.ensure_future(queue.acquire_async('interactive'))
+		await asyncio.sleep(0.01)
+		queue.release()
+		assert await asyncio.wait_for(waiter, 1.0) > 0.0
+		assert queue.get_stats()['priorities']['interactive']['admitted'] == 1
+
+	asyncio.run(scenario())
@@ -0,0 +1,154 @@
+"""
+Unit tests for the circuit breaker and the provider guard around LLM calls.
+Contract: - the breaker opens after `threshold` consecutive failures, rejects during the cooldown,
+            then lets a single trial call decide between closed and open.
+          - a logical guarded call reports to the breaker once, however many times it retried.
+          - 429 only throttles and backs off, it never counts as a breaker failure.
+          - a 5xx or connection error counts once, only after the retries run out.
+"""
+import sys
+import asyncio
+from pathlib import Path
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import httpx
+import pytest
+from common.llmroute.providerguard import CircuitBreaker, CircuitOpenError, ProviderGuard
+
+
+def status_error(status_code: int) -> httpx.HTTPStatusError:
+	request = httpx.Request('POST', 'http://llm.test/api/generate')
+	return httpx.HTTPStatusError('error', request=request, response=httpx.Response(status_code, request=request))
+
+
+def make_guard(retry_max: int = 2, threshold: int = 3, cooldown_sec: float = 60.0) -> ProviderGuard:
+	guard = ProviderGuard('test')
+	guard.retry_max, guard.retry_base_sec, guard.retry_max_sec = retry_max, 0.0, 0.0
+	guard.breaker = CircuitBreaker(threshold, cooldown_sec)
+	return guard
+
+
+class Backend:
+	"""
+	Raises the queued errors in order, then returns 'ok'.
+	"""
+	def __init__(self, *errors):
+		self.errors = list(errors)
+		self.calls = 0
+
+	def __call__(self):
+		self.calls += 1
+		if self.errors:
+			raise self.errors.pop(0)
+		return 'ok'
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_one_trial() -> None:
+	breaker = CircuitBreaker(threshold=2, cooldown_sec=60.0)
+	breaker.on_failure()
+	assert breaker.get_status() == {'state': 'closed', 'failures': 1}
+	breaker.on_failure()
+	assert breaker.is_open()
+	with pytest.raises(CircuitOpenError):
+		breaker.before_call()
+
+	breaker.cooldown_sec = 0.0
+	breaker.before_call()
+	assert breaker.get_status()['state'] == 'half_open'
+	# only one trial call at a time
+	with pytest.raises(CircuitOpenError):
+		breaker.before_call()
+	breaker.on_success()
+	assert breaker.get_status() == {'state': 'closed', 'failures': 0}
+
+
+def test_failed_trial_reopens_and_abandoned_trial_frees_the_slot() -> None:
+	breaker = CircuitBreaker(threshold=1, cooldown_sec=0.0)
+	breaker.on_failure()
+	breaker.before_call()
+	breaker.on_failure()
+	assert breaker.get_status()['state'] == 'open'
+
+	breaker.before_call()
+	breaker.on_abandon()
+	assert breaker.get_status()['state'] == 'half_open'
+	breaker.before_call()
+
+
+def test_retried_server_error_that_recovers_leaves_the_breaker_closed() -> None:
+	guard = make_guard()
+	backend = Backend(status_error(503), ConnectionError('reset'))
+	assert guard.call(backend) == 'ok'
+	assert backend.calls == 3
+	assert guard.breaker.get_status() == {'state': 'closed', 'failures': 0}
+	status = guard.get_status()
+	assert (status['calls'], status['retries'], status['failures']) == (1, 2, 2)
+
+
+def test_exhausted_server_errors_count_one_failure_per_call() -> None:
+	guard = make_guard(retry_max=2, threshold=3)
+	for call in range(1, 4):
+		backend = Backend(*[status_error(500)] * 3)
+		with pytest.raises(httpx.HTTPStatusError):
+			guard.call(backend)
+		assert backend.calls == 3
+		assert guard.breaker.get_status()['failures'] == call
+	assert guard.breaker.is_open()
+
+	backend = Backend()
+	with pytest.raises(CircuitOpenError):
+		guard.call(backend)
+	assert backend.calls == 0
+	assert guard.get_status()['rejected'] == 1
+
+
+def test_rate_limits_throttle_without_touching_the_breaker() -> None:
+	guard = make_guard(retry_max=2, threshold=1)
+	backend = Backend(*[status_error(429)] * 3)
+	with pytest.raises(httpx.HTTPStatusError):
+		guard.call(backend)
+	assert guard.breaker.get_status() == {'state': 'closed', 'failures': 0}
+	status = guard.get_status()
+	assert status['throttled'] == 3
+	assert status['failures'] == 0
+	assert status['rate_scale'] < 1.0
+	assert guard.call(Backend()) == 'ok'
+
+
+def test_non_retryable_errors_raise_at_once_and_count_as_alive() -> None:
+	guard = make_guard(threshold=2)
+	guard.breaker.on_failure()
+	backend = Backend(status_error(400))
+	with pytest.raises(httpx.HTTPStatusError):
+		guard.call(backend)
+	assert backend.calls == 1
+	assert guard.breaker.get_status() == {'state': 'closed', 'failures': 0}
+
+
+def test_half_open_trial_keeps_its_slot_across_retries() -> None:
+	guard = make_guard(threshold=1, cooldown_sec=0.0)
+	guard.breaker.on_failure()
+	assert guard.call(Backend(status_error(502))) == 'ok'
+	assert guard.breaker.get_status()['state'] == 'closed'
+
+
+def test_cancelled_async_trial_frees_the_slot() -> None:
+	async def scenario():
+		guard = make_guard(threshold=1, cooldown_sec=0.0)
+		guard.breaker.on_failure()
+		started = asyncio.Event()
+		async def hang():
+			started.set()
+			await asyncio.sleep(10)
+		task = asyncio.ensure_future(guard.call_async(hang))
+		await started.wait()
+		task.cancel()
+		with pytest.raises(asyncio.CancelledError):
+			await task
+		async def ok():
+			return 'ok'
+		assert await guard.call_async(ok) == 'ok'
+		assert guard.breaker.get_status()['state'] == 'closed'
+
+	asyncio.run(scenario())
@@ -0,0 +1,153 @@
+"""
+Unit tests for coalescing identical in-flight LLM requests.
+Contract: - concurrent identical requests make one backend call and all callers get its result.
+          - a failing backend call raises the same error in every caller.
+          - finished calls are not cached, and different requests are never merged.
+          - an async backend call is cancelled only when every caller has been cancelled.
+"""
+import sys
+import asyncio
+import threading
+import time
+from pathlib import Path
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import pytest
+from common.llmroute.singleflight import SingleFlight, get_request_key
+
+
+REQUEST = {'model': 'llama3.2', 'prompt': 'hello', 'options': {'temperature': 0}}
+
+
+@pytest.fixture
+def flights() -> SingleFlight:
+	# a fresh instance per test, bypassing the process-wide singleton
+	flights = object.__new__(SingleFlight)
+	flights.enabled = True
+	flights.lock = threading.Lock()
+	flights.flights, flights.tasks, flights.stats = {}, {}, {}
+	return flights
+
+
+def start_callers(flights: SingleFlight, request: dict, call: callable, count: int) -> tuple:
+	"""
+	Starts `count` identical callers, returns their threads and the list their results (or errors) go to.
+	"""
+	results = []
+	def caller():
+		try:
+			results.append(flights.do('generate', request, call))
+		except Exception as e:
+			results.append(e)
+	threads = [threading.Thread(target=caller, daemon=True) for _ in range(count)]
+	for thread in threads:
+		thread.start()
+	return threads, results
+
+
+def wait_for_followers(flights: SingleFlight, count: int, timeout: float = 2.0) -> None:
+	deadline = time.monotonic() + timeout
+	while flights.get_stats()['operations'].get('generate', {}).get('coalesced', 0) < count:
+		assert time.monotonic() < deadline, 'followers did not join the flight'
+		time.sleep(0.005)
+
+
+def test_request_key_ignores_key_order() -> None:
+	assert get_request_key({'a': 1, 'b': [1, 2]}) == get_request_key({'b': [1, 2], 'a': 1})
+	assert get_request_key({'a': 1}) != get_request_key({'a': 2})
+
+
+def test_concurrent_identical_calls_share_one_backend_call(flights: SingleFlight) -> None:
+	release = threading.Event()
+	calls = []
+	def call():
+		calls.append(1)
+		release.wait(2.0)
+		return {'title': 'shared'}
+
+	threads, results = start_callers(flights, REQUEST, call, 5)
+	wait_for_followers(flights, 4)
+	release.set()
+	for thread in threads:
+		thread.join(2.0)
+	assert len(calls) == 1
+	assert results == [{'title': 'shared'}] * 5
+	assert flights.get_stats()['operations']['generate'] == {'calls': 1, 'coalesced': 4}
+	assert flights.get_stats()['inflight'] == 0
+
+	# finished calls are not cached
+	assert flights.do('generate', REQUEST, lambda: 'again') == 'again'
+
+
+def test_leader_error_is_raised_in_every_follower(flights: SingleFlight) -> None:
+	release = threading.Event()
+	error = RuntimeError('backend down')
+	def call():
+		release.wait(2.0)
+		raise error
+
+	threads, results = start_callers(flights, REQUEST, call, 3)
+	wait_for_followers(flights, 2)
+	release.set()
+	for thread in threads:
+		thread.join(2.0)
+	assert results == [error] * 3
+	assert flights.get_stats()['inflight'] == 0
+
+
+def test_different_requests_and_disabled_flights_are_not_merged(flights: SingleFlight) -> None:
+	assert flights.do('generate', REQUEST, lambda: 1) == 1
+	assert flights.do('generate', dict(REQUEST, prompt='other'), lambda: 2) == 2
+	flights.enabled = False
+	assert flights.do('generate', REQUEST, lambda: 3) == 3
+	assert flights.get_stats()['operations']['generate'] == {'calls': 2, 'coalesced': 0}
+
+
+def test_async_callers_share_the_result_and_the_error(flights: SingleFlight) -> None:
+	async def scenario():
+		calls = []
+		async def call():
+			calls.append(1)
+			await asyncio.sleep(0.01)
+			return 'shared'
+		results = await asyncio.gather(*[flights.do_async('embed', REQUEST, call) for _ in range(4)])
+		assert results == ['shared'] * 4
+		assert len(calls) == 1
+
+		async def fail():
+			await asyncio.sleep(0.01)
+			raise RuntimeError('backend down')
+		results = await asyncio.gather(*[flights.do_async('embed', REQUEST, fail) for _ in range(3)], return_exceptions=True)
+		assert all(isinstance(result, RuntimeError) for result in results)
+		assert results[0] is results[1] is results[2]
+		assert flights.get_stats()['operations']['embed'] == {'calls': 2, 'coalesced': 5}
+
+	asyncio.run(scenario())
+	assert flights.get_stats()['inflight'] == 0
+
+
+def test_async_backend_call_is_cancelled_only_with_its_last_caller(flights: SingleFlight) -> None:
+	async def scenario():
+		started, cancelled = asyncio.Event(), asyncio.Event()
+		async def call():
+			started.set()
+			try:
+				await asyncio.sleep(10)
+			except asyncio.CancelledError:
+				cancelled.set()
+				raise
+
+		first = asyncio.ensure_future(flights.do_async('generate', REQUEST, call))
+		second = asyncio.ensure_future(flights.do_async('generate', REQUEST, call))
+		await started.wait()
+		first.cancel()
+		await asyncio.sleep(0.01)
+		assert not cancelled.is_set()
+		second.cancel()
+		await asyncio.wait_for(cancelled.wait(), 1.0)
+		for task in (first, second):
+			with pytest.raises(asyncio.CancelledError):
+				await task
+
+	asyncio.run(scenario())
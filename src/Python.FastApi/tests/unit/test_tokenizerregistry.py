@@ -0,0 +1,129 @@
+"""
+Unit tests for tokenizer lookup, token estimates and token-aware splitting.
+Contract: - model names resolve to the longest matching family, unknown families resolve to none.
+          - a file named after the model wins over the family file, missing files fall back to the estimator.
+          - a tokenizer that fails to load is replaced by the estimator once and never reloaded.
+          - split_by_tokens cuts on token boundaries, loses no text and keeps every piece within max_tokens.
+"""
+import sys
+import threading
+from pathlib import Path
+# Add the project root to the Python path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import pytest
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from common.llmroute.tokenizerregistry import (TokenizerRegistry, EstimateTokenizer, OLLAMA_TOKENIZER_FILES,
+                                               OPENAI_ENCODINGS, find_family, split_by_tokens)
+
+
+@pytest.fixture
+def registry(tmp_path: Path) -> TokenizerRegistry:
+	# a fresh registry per test reading tokenizer files from tmp_path, bypassing the process-wide singleton
+	registry = object.__new__(TokenizerRegistry)
+	registry.tokenizer_dir = str(tmp_path)
+	registry.lock = threading.Lock()
+	registry.tokenizers = {}
+	return registry
+
+
+def save_word_tokenizer(path: Path) -> None:
+	tokenizer = Tokenizer(WordLevel({'[UNK]': 0, 'hello': 1, 'world': 2}, unk_token='[UNK]'))
+	tokenizer.pre_tokenizer = Whitespace()
+	tokenizer.save(str(path))
+
+
+@pytest.mark.parametrize('name, family', [
+	('llama3.2', 'llama'),
+	('llama3.1:8b-instruct-q4_K_M', 'llama'),
+	('gemma2:9b', 'gemma2'),
+	('gemma3:4b', 'gemma3'),
+	('Qwen2.5:7b', 'qwen2'),
+	('phi4', None),
+	('phi4:14b', None),
+	('', None),
+	(None, None),
+])
+def test_find_family_picks_the_longest_prefix(name: str, family: str) -> None:
+	assert find_family(name, OLLAMA_TOKENIZER_FILES) == family
+
+
+def test_find_family_for_openai_models() -> None:
+	assert OPENAI_ENCODINGS[find_family('gpt-4o-mini', OPENAI_ENCODINGS)] == 'o200k_base'
+	assert OPENAI_ENCODINGS[find_family('text-embedding-3-small', OPENAI_ENCODINGS)] == 'cl100k_base'
+
+
+def test_missing_files_fall_back_to_the_estimator(registry: TokenizerRegistry) -> None:
+	llama = registry.get_ollama_tokenizer('llama3.2')
+	assert (llama.kind, llama.name) == ('estimate', 'llama3.json')
+	# no family: estimate under the model's own file name
+	phi = registry.get_ollama_tokenizer('phi4:14b')
+	assert (phi.kind, phi.name) == ('estimate', 'phi4_14b.json')
+	# the architecture from ollama show wins over the model name
+	assert registry.get_ollama_tokenizer('my-finetune', 'gemma2').name == 'gemma.json'
+
+
+def test_model_file_wins_over_family_file(registry: TokenizerRegistry, tmp_path: Path) -> None:
+	save_word_tokenizer(tmp_path / 'llama3.json')
+	family = registry.get_ollama_tokenizer('llama3.2')
+	assert (family.kind, family.name) == ('tokenizers', 'llama3.json')
+	assert family.count_batch(['hello world', 'hello']) == [2, 1]
+
+	save_word_tokenizer(tmp_path / 'llama3.2_1b.json')
+	own = registry.get_ollama_tokenizer('llama3.2:1b')
+	assert (own.kind, own.name) == ('tokenizers', 'llama3.2_1b.json')
+	# loaded once and reused
+	assert registry.get_ollama_tokenizer('llama3.2') is family
+
+
+def test_load_failure_falls_back_once_and_is_remembered(registry: TokenizerRegistry, tmp_path: Path) -> None:
+	(tmp_path / 'llama3.json').write_text('not a tokenizer')
+	first = registry.get_ollama_tokenizer('llama3.2')
+	assert (first.kind, first.name) == ('estimate', 'llama3.json')
+	assert registry.get_ollama_tokenizer('llama3.1') is first
+
+	loads = []
+	def load():
+		loads.append(1)
+		raise OSError('encoding download failed')
+	fallback = registry.get_or_load('tiktoken:test', load, lambda: EstimateTokenizer('cl100k_base'))
+	assert registry.get_or_load('tiktoken:test', load, lambda: EstimateTokenizer('cl100k_base')) is fallback
+	assert len(loads) == 1
+	assert registry.get_loaded()['tiktoken:test'] == 'estimate'
+
+	with pytest.raises(OSError):
+		registry.get_or_load('no-fallback', load)
+	assert 'no-fallback' not in registry.get_loaded()
+
+
+def test_estimator_counts_by_script() -> None:
+	default = EstimateTokenizer('default')
+	assert default.count_batch(['', '가나다', 'abcd', 'ab cd', '漢字', '가 abcd']) == [0, 3, 1, 1, 2, 2]
+	assert EstimateTokenizer('cl100k_base').count_one('가나다라') == 6
+	assert EstimateTokenizer('gemma.json').count_one('가나다라마바사아자차') == 7
+	# unknown encodings use the default ratios
+	assert EstimateTokenizer('phi4_14b.json').ratios == default.ratios
+
+
+@pytest.mark.parametrize('text, max_tokens', [
+	('가나다라마바사아자차카타파하', 4),
+	('the quick brown fox jumps over the lazy dog', 3),
+	('한국어 문장과 English words 가 섞인 문서입니다.', 5),
+	('짧다', 100),
+])
+def test_split_by_tokens_keeps_all_text_within_the_limit(text: str, max_tokens: int) -> None:
+	tokenizer = EstimateTokenizer('default')
+	pieces = split_by_tokens(tokenizer, text, max_tokens)
+	assert ''.join(pieces) == text
+	assert all(len(tokenizer.get_offsets(piece)) <= max_tokens for piece in pieces)
+	assert len(pieces) == -(-len(tokenizer.get_offsets(text)) // max_tokens)
+
+
+def test_split_by_tokens_cuts_on_token_starts(registry: TokenizerRegistry, tmp_path: Path) -> None:
+	assert split_by_tokens(EstimateTokenizer('default'), '', 10) == []
+	assert split_by_tokens(EstimateTokenizer('default'), '가나다라마', 2) == ['가나', '다라', '마']
+	save_word_tokenizer(tmp_path / 'words.json')
+	words = registry.get_ollama_tokenizer('words')
+	assert split_by_tokens(words, 'hello world hello world hello', 2) == ['hello world ', 'hello world ', 'hello']